@@ -6,7 +6,8 @@ from config import settings
 
 async_engine = create_async_engine(settings.db_url, future=True)
 
-AsyncSessionLocal = sessionmaker(async_engine, autocommit=False, autoflush=False, class_=AsyncSession)  # noqa
+AsyncSessionLocal = sessionmaker(async_engine, autocommit=False, autoflush=False, expire_on_commit=False,
+                                 class_=AsyncSession)  # noqa
 
 
 # Dependency
@@ -1,13 +1,16 @@
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, func, UniqueConstraint
+from sqlalchemy import ForeignKey, func, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 
 from .base import Base
 from .users import User
 
+if TYPE_CHECKING:
+    from .images import Image
+
 
 class ImageFormat(Base):
     __tablename__ = "image_formats"
@@ -15,11 +18,14 @@ class ImageFormat(Base):
         UniqueConstraint('format', 'image_id', name='unique_format_image'),
     )
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True)
     format: Mapped[dict] = mapped_column(JSONB)
+    transformation: Mapped[str] = mapped_column(String(255), server_default='')
+    url: Mapped[str] = mapped_column(String(1024))
     user_id: Mapped[str] = mapped_column(ForeignKey(User.id, ondelete="CASCADE", onupdate="CASCADE"), index=True)
     image_id: Mapped[str] = mapped_column(ForeignKey("images.id", ondelete="CASCADE", onupdate="CASCADE"), index=True)
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     updated_at: Mapped[Optional[datetime]] = mapped_column(onupdate=func.now())
 
     user: Mapped[User] = relationship(backref="formats")
+    image: Mapped["Image"] = relationship(back_populates="formats")
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import ForeignKey, CheckConstraint, UniqueConstraint, func
+from sqlalchemy import ForeignKey, CheckConstraint, UniqueConstraint, DDL, event, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database.models.base import Base
@@ -19,6 +19,34 @@ class ImageRating(Base):
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     updated_at: Mapped[Optional[datetime]] = mapped_column(onupdate=func.now())
     user_id: Mapped[int] = mapped_column(ForeignKey(User.id, ondelete="CASCADE", onupdate="CASCADE"))
-    image_id: Mapped[int] = mapped_column(ForeignKey("images.id", ondelete="CASCADE", onupdate="CASCADE"))
+    image_id: Mapped[int] = mapped_column(
+        ForeignKey("images.id", ondelete="CASCADE", onupdate="CASCADE"), index=True
+    )
 
     user: Mapped[User] = relationship("User", backref="image_ratings")
+
+
+RATING_AGGREGATES_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION image_ratings_aggregates() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE images SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+        WHERE id = OLD.image_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE images SET rating_count = rating_count + 1, rating_sum = rating_sum + NEW.rating
+        WHERE id = NEW.image_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+RATING_AGGREGATES_TRIGGER = DDL("""
+CREATE TRIGGER image_ratings_aggregates
+AFTER INSERT OR DELETE OR UPDATE OF rating, image_id ON image_ratings
+FOR EACH ROW EXECUTE FUNCTION image_ratings_aggregates()
+""")
+
+# images.rating_count and images.rating_sum are maintained by the trigger, in the same transaction as the rating
+event.listen(ImageRating.__table__, 'after_create', RATING_AGGREGATES_FUNCTION)
+event.listen(ImageRating.__table__, 'after_create', RATING_AGGREGATES_TRIGGER)
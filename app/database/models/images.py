@@ -8,8 +8,13 @@ from sqlalchemy import (
     Integer,
     Table,
     Column,
+    Index,
+    Computed,
+    Float,
 )
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 from .tags import Tag
 from .base import Base
@@ -22,24 +27,54 @@ from .image_raiting import ImageRating
 image_m2m_tag = Table(
     "image_m2m_tag",
     Base.metadata,
-    Column("id", Integer, primary_key=True),
-    Column("image_id", Integer, ForeignKey("images.id", ondelete="CASCADE")),
-    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE")),
+    Column("image_id", Integer, ForeignKey("images.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_image_m2m_tag_tag_id_image_id", "tag_id", "image_id"),
 )
 
 
 class Image(Base):
     __tablename__ = 'images'
+    __table_args__ = (
+        Index('ix_images_created_at_id', 'created_at', 'id'),
+        Index('ix_images_description_search', 'description_search', postgresql_using='gin'),
+    )
+    SEARCH_CONFIG = 'simple'
+    """Text search configuration of description_search, 'simple' since descriptions are not in one language."""
 
     id: Mapped[int] = mapped_column(primary_key=True)
     public_id: Mapped[str] = mapped_column(String(255))
     description: Mapped[str] = mapped_column(String(1200))
+    description_search: Mapped[str] = mapped_column(
+        TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', description)", persisted=True), deferred=True
+    )
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     updated_at: Mapped[Optional[datetime]] = mapped_column(onupdate=func.now())
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    rating_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    rating_sum: Mapped[int] = mapped_column(default=0, server_default='0')
 
     user: Mapped[User] = relationship(backref="images")
-    tags: Mapped[Tag] = relationship("Tag", secondary=image_m2m_tag, backref="images", lazy='joined')
+    tags: Mapped[list[Tag]] = relationship("Tag", secondary=image_m2m_tag, backref="images", lazy="selectin")
     comments: Mapped[ImageComment] = relationship(backref="image", cascade="all, delete-orphan")
-    formats: Mapped[ImageFormat] = relationship(backref="image", cascade="all, delete-orphan")
+    formats: Mapped[ImageFormat] = relationship(back_populates="image", cascade="all, delete-orphan")
     ratings: Mapped[ImageRating] = relationship(backref="image", cascade="all, delete-orphan")
+
+    @hybrid_property
+    def rating_average(self) -> Optional[float]:
+        """
+        The rating_average function returns the average rating of the image from the aggregates kept by the
+        image_ratings trigger, None if the image is not rated.
+
+        :param self: Represent the instance of the object itself
+        :return: The average rating or None
+        """
+        if not self.rating_count:
+            return None
+
+        return self.rating_sum / self.rating_count
+
+    @rating_average.inplace.expression
+    @classmethod
+    def _rating_average_expression(cls):
+        return cls.rating_sum.cast(Float) / func.nullif(cls.rating_count, 0, type_=Float)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import String, func
+from sqlalchemy import String, Index, DDL, event, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -9,8 +9,16 @@ from .base import Base
 
 class Tag(Base):
     __tablename__ = "tags"
+    __table_args__ = (
+        Index('ix_tags_created_at_id', 'created_at', 'id'),
+        Index('ix_tags_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True)
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     updated_at: Mapped[Optional[datetime]] = mapped_column(onupdate=func.now())
+
+
+# The trigram index needs pg_trgm, migrated databases get it from the migration and create_all from this hook
+event.listen(Tag.__table__, 'before_create', DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
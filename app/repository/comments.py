@@ -4,6 +4,7 @@ from sqlalchemy import update, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.models.image_comments import ImageComment
+from app.utils.pagination import Cursor, paginate
 
 
 async def create_comment(user_id: int, image_id: int, data: str, db: AsyncSession) -> ImageComment:
@@ -30,15 +31,17 @@ async def create_comment(user_id: int, image_id: int, data: str, db: AsyncSessio
 
 
 async def get_comments_by_image_or_user_id(user_id: int, image_id: int, skip: int, limit: int,
-                                           db: AsyncSession) -> list[ImageComment]:
+                                           db: AsyncSession, cursor: Optional[Cursor] = None) -> list[ImageComment]:
     """
     The get_comments_by_image_or_user_id function returns a list of comments for the given image and user.
+    Comments are ordered by (created_at, id), with a cursor the page starts after it and skip is ignored.
 
     :param user_id: int: Get the comments of a specific user
     :param image_id: int: Specify the image id of the comment
     :param skip: int: Skip the first n comments
     :param limit: int: Limit the number of comments returned
     :param db: AsyncSession: Pass in the database session to use
+    :param cursor: Optional[Cursor]: Position after the last comment of the previous page
     :return: A list of comments that match the image_id and user_id
     """
     query = select(ImageComment)
@@ -48,7 +51,7 @@ async def get_comments_by_image_or_user_id(user_id: int, image_id: int, skip: in
     if user_id:
         query = query.filter(ImageComment.user_id == user_id)
 
-    comments = await db.scalars(query.offset(skip).limit(limit))
+    comments = await db.scalars(paginate(query, ImageComment, skip, limit, cursor))
 
     return comments.all()  # noqa
 
@@ -3,23 +3,30 @@ from typing import Optional
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 
 from app.database.models import ImageFormat, Image
 
 
-async def create_image_format(user_id: int, image_id: int, format_: dict, db: AsyncSession) -> Optional[ImageFormat]:
+async def create_image_format(user_id: int, image_id: int, format_: dict, url: str, transformation: str,
+                              db: AsyncSession) -> Optional[ImageFormat]:
     """
     The create_image_format function creates a new image format in the database.
+    The delivery url and the transformation string are stored with the format, so reads don't rebuild them.
 
     :param user_id: int: Identify the user that is creating the image format
     :param image_id: int: Specify the image that the format is for
     :param format_: dict: Pass the format of the image
+    :param url: str: The Cloudinary url of the formatted image
+    :param transformation: str: The canonical transformation string of the format, from the storage backend
     :param db: AsyncSession: Pass the database session to the function
     :return: An imageformat object
     """
     try:
         format_ = ImageFormat(
             format=format_,
+            transformation=transformation,
+            url=url,
             user_id=user_id,
             image_id=image_id,
         )
@@ -66,6 +73,25 @@ async def get_image_format_by_id(image_format_id: int, db: AsyncSession) -> Imag
     )
 
 
+async def get_image_formats_by_ids(image_format_ids: list[int], db: AsyncSession) -> list[ImageFormat]:
+    """
+    The get_image_formats_by_ids function returns the image formats with their parent images in a single query.
+    The tags of the images are not loaded.
+
+    :param image_format_ids: list[int]: Specify the image format ids
+    :param db: AsyncSession: Pass in the database session
+    :return: A list of image format objects with the image loaded, in no particular order
+    """
+    image_formats = await db.scalars(
+        select(ImageFormat)
+        .join(ImageFormat.image)
+        .options(contains_eager(ImageFormat.image).raiseload(Image.tags))
+        .filter(ImageFormat.id.in_(image_format_ids))
+    )
+
+    return image_formats.all()  # noqa
+
+
 async def remove_image_format(image_format: ImageFormat, db: AsyncSession) -> None:
     """
     The remove_image_format function removes an image format from the database.
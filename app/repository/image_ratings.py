@@ -1,46 +1,116 @@
 from typing import Optional
 
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, update, func, or_, literal, literal_column
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.models import Image
 from app.database.models.image_raiting import ImageRating
+from app.services.cache import RatingSummaryCache
+from app.utils.pagination import Cursor, paginate
 
+RATING_VALUES = range(1, 6)
 
-async def create_rating(user_id: int, rating: int, image_id: int, db: AsyncSession) -> ImageRating:
+
+async def upsert_rating(user_id: int, rating: int, image_id: int,
+                        db: AsyncSession) -> tuple[Optional[ImageRating], bool]:
     """
-    The create function creates a new ImageRating object and adds it to the database.
+    The upsert_rating function creates the rating of the user for the image, or updates it if it exists,
+    with a single INSERT ... SELECT ... ON CONFLICT statement. The SELECT only yields a row if the image exists and
+    belongs to another user, so the ownership check and the write can't race, neither can concurrent ratings.
 
     :param user_id: int: Specify the user_id of the rating
-    :param rating: int: Create a new rating object
+    :param rating: int: The rating value
     :param image_id: int: Specify the image_id of the rating
     :param db: AsyncSession: Pass the database session to the function
-    :return: The new rating object
+    :return: The rating and whether it was created, or (None, False) if the image is missing or owned by the user
     """
-    rating = ImageRating(rating=rating, image_id=image_id, user_id=user_id)
+    table = ImageRating.__table__
+    query = insert(table).from_select(
+        ['user_id', 'image_id', 'rating', 'created_at'],
+        select(literal(user_id), Image.id, literal(rating), func.now())
+        .filter(Image.id == image_id, Image.user_id != user_id)
+    )
+    query = query.on_conflict_do_update(
+        constraint='unique_user_image_rating',
+        set_={'rating': query.excluded.rating, 'updated_at': func.now()},
+    ).returning(*table.columns, literal_column('xmax = 0').label('created'))
 
-    db.add(rating)
+    row = (await db.execute(query)).mappings().first()
     await db.commit()
-    await db.refresh(rating)
 
-    return rating
+    if row is None:
+        return None, False
+
+    await RatingSummaryCache.invalidate(image_id)
+    row = dict(row)
+    created = row.pop('created')
 
+    return ImageRating(**row), created
 
-async def get_all_image_ratings(image_id: int, db: AsyncSession) -> list[ImageRating]:
+
+async def get_all_image_ratings(image_id: int, skip: int, limit: int, db: AsyncSession,
+                                cursor: Optional[Cursor] = None) -> list[ImageRating]:
     """
-    The get_all_ratings function returns all ratings for a given image.
+    The get_all_ratings function returns a page of the ratings for a given image.
+    Ratings are ordered by (created_at, id), with a cursor the page starts after it and skip is ignored.
 
     :param image_id: int: Specify the image_id of the image we want to get all ratings for
+    :param skip: int: Skip the first n ratings
+    :param limit: int: Limit the number of ratings returned
     :param db: AsyncSession: Pass in the database session
+    :param cursor: Optional[Cursor]: Position after the last rating of the previous page
     :return: A list of dictionaries
     """
     ratings = await db.scalars(
-        select(ImageRating)
-        .filter(ImageRating.image_id == image_id)
+        paginate(select(ImageRating).filter(ImageRating.image_id == image_id), ImageRating, skip, limit, cursor)
     )
 
     return ratings.all()  # noqa
 
 
+async def get_rating_summary(image_id: int, db: AsyncSession) -> dict:
+    """
+    The get_rating_summary function returns the number of ratings, the average rating and the number of ratings
+    of every value for a given image, counted by a single GROUP BY query and cached until the next rating write.
+    A cached summary is checked against the rating aggregates of the image, which is a primary key lookup.
+
+    :param image_id: int: Specify the image to summarize
+    :param db: AsyncSession: Pass in the database session
+    :return: A dictionary with the image_id, count, average and histogram keys
+    """
+    row = (await db.execute(
+        select(Image.rating_count, Image.rating_sum)
+        .filter(Image.id == image_id)
+    )).first()
+    aggregates = tuple(row) if row is not None else (0, 0)
+
+    summary = await RatingSummaryCache.get(image_id, aggregates)
+    if summary is not None:
+        summary['histogram'] = {int(value): number for value, number in summary['histogram'].items()}
+        return summary
+
+    rows = await db.execute(
+        select(ImageRating.rating, func.count())
+        .filter(ImageRating.image_id == image_id)
+        .group_by(ImageRating.rating)
+    )
+    histogram = dict.fromkeys(RATING_VALUES, 0)
+    histogram.update(rows.all())
+
+    count = sum(histogram.values())
+    summary = {
+        "image_id": image_id,
+        "count": count,
+        "average": round(sum(value * number for value, number in histogram.items()) / count, 2) if count else None,
+        "histogram": histogram,
+    }
+
+    await RatingSummaryCache.set(image_id, summary, aggregates)
+
+    return summary
+
+
 async def get_rating_by_id(rating_id: int, db: AsyncSession) -> Optional[ImageRating]:
     """
     The get_rating_by_id function takes in a rating_id and an AsyncSession object.
@@ -79,8 +149,11 @@ async def remove_rating(rating: ImageRating, db: AsyncSession) -> None:
     :param db: AsyncSession: Pass the database session to the function
     :return: None
     """
+    image_id = rating.image_id
+
     await db.delete(rating)
     await db.commit()
+    await RatingSummaryCache.invalidate(image_id)
 
 
 async def update_rating(rating: ImageRating, new_rating: int, db: AsyncSession) -> ImageRating:
@@ -96,5 +169,42 @@ async def update_rating(rating: ImageRating, new_rating: int, db: AsyncSession)
     await db.commit()
 
     await db.refresh(rating)
+    await RatingSummaryCache.invalidate(rating.image_id)
 
     return rating
+
+
+async def recompute_rating_aggregates(db: AsyncSession, image_id: Optional[int] = None) -> int:
+    """
+    The recompute_rating_aggregates function repairs images.rating_count and images.rating_sum from the
+    image_ratings table, e.g. after ratings were changed with the trigger disabled. Only drifted rows are written,
+    and their updated_at is kept since the image itself did not change.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param image_id: Optional[int]: Repair a single image, all images if not provided
+    :return: The number of repaired images
+    """
+    count = (
+        select(func.count(ImageRating.id))
+        .filter(ImageRating.image_id == Image.id)
+        .scalar_subquery()
+    )
+    total = (
+        select(func.coalesce(func.sum(ImageRating.rating), 0))
+        .filter(ImageRating.image_id == Image.id)
+        .scalar_subquery()
+    )
+
+    query = (
+        update(Image)
+        .values(rating_count=count, rating_sum=total, updated_at=Image.updated_at)
+        .filter(or_(Image.rating_count.is_distinct_from(count), Image.rating_sum.is_distinct_from(total)))
+        .execution_options(synchronize_session=False)
+    )
+    if image_id is not None:
+        query = query.filter(Image.id == image_id)
+
+    result = await db.execute(query)
+    await db.commit()
+
+    return result.rowcount
@@ -1,9 +1,18 @@
-from sqlalchemy import select
+import re
+
+from sqlalchemy import select, func, literal, and_, exists
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.models import Image, Tag
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from app.database.models import Image
+from app.database.models.images import image_m2m_tag
+from app.schemas.image import DescriptionMatch, ImageSort
+from app.schemas.tag import TagMatch, TagMode
+from app.services.cache import RatingSummaryCache
+from app.utils.pagination import Cursor, paginate
 from typing import Optional
 
-from .tags import get_or_create_tags
+from .tags import get_or_create_tags, resolve_tag_patterns
 
 
 async def get_image_by_id(image_id: int, db: AsyncSession) -> Image:
@@ -20,15 +29,20 @@ async def get_image_by_id(image_id: int, db: AsyncSession) -> Image:
     )
 
 
-async def create_image(user_id: int, description: str, tags: list[str], public_id: str, db: AsyncSession) -> Image:
+async def create_image(user_id: int, description: str, tags: list[str], public_id: str, db: AsyncSession,
+                       commit: bool = True) -> Image:
     """
     The create_image function creates a new image in the database.
+    With commit=False the image is only flushed (so it gets its id), several images can then be committed at once.
+    The image is inserted under the lock of its public_id, a caller that commits itself restores the stored file
+    with storage.restore first, in case the delete of an image with the same content has just removed it.
 
     :param user_id: int: Specify the user who uploaded the image
     :param description: str: Describe the image
     :param tags: list[str]: Specify that the tags parameter is a list of strings
     :param public_id: str: Store the public id of the image in cloudinary
     :param db: AsyncSession: Pass in the database session
+    :param commit: bool: Commit the session, or leave it to the caller
     :return: An image object
     """
     image = Image(
@@ -38,10 +52,15 @@ async def create_image(user_id: int, description: str, tags: list[str], public_i
     )
 
     if tags:
-        image.tags = await get_or_create_tags(tags, db)
+        image.tags = await get_or_create_tags(tags, db, commit)
 
+    await lock_public_id(public_id, db)
     db.add(image)
 
+    if not commit:
+        await db.flush()
+        return image
+
     await db.commit()
 
     await db.refresh(image)
@@ -79,8 +98,83 @@ async def delete_image(image: Image, db: AsyncSession) -> None:
     :param db: AsyncSession: Pass in the database session
     :return: None, which is the default return value for a function that doesn't explicitly return anything
     """
+    image_id = image.id
+
     await db.delete(image)
     await db.commit()
+    # The ratings are removed by the cascade, not by the rating routes
+    await RatingSummaryCache.invalidate(image_id)
+
+
+async def lock_public_id(public_id: str, db: AsyncSession) -> None:
+    """
+    The lock_public_id function takes a lock on the public_id until the end of the transaction. The delete of
+    an image holds it while it checks that no other image refers to the stored file and removes the file, so
+    an upload of the same content can't commit its image in between.
+
+    :param public_id: str: The public_id of the stored image
+    :param db: AsyncSession: Pass in the database session
+    :return: None
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(public_id))))
+
+
+async def public_id_in_use(public_id: str, db: AsyncSession) -> bool:
+    """
+    The public_id_in_use function checks whether an image still refers to the stored image, local images with the
+    same content share it.
+
+    :param public_id: str: The public_id of the stored image
+    :param db: AsyncSession: Pass in the database session
+    :return: True if an image has the public_id
+    """
+    return await db.scalar(select(exists().where(Image.public_id == public_id)))
+
+
+def description_query(description: str, match: DescriptionMatch):
+    """
+    The description_query function builds the full text query matched against Image.description_search.
+
+    :param description: str: The search text
+    :param match: DescriptionMatch: How the words of the text are matched
+    :return: A tsquery expression, or None if the text has no words to search for
+    """
+    config = literal(Image.SEARCH_CONFIG, REGCONFIG)
+
+    if match == DescriptionMatch.prefix:
+        # Only word characters are kept, so the user can't inject tsquery operators
+        words = re.findall(r'\w+', description)
+        if not words:
+            return None
+        return func.to_tsquery(config, ' & '.join(f'{word}:*' for word in words))
+
+    if match == DescriptionMatch.phrase:
+        return func.phraseto_tsquery(config, description)
+
+    return func.websearch_to_tsquery(config, description)
+
+
+def tags_filter(tag_ids: list[list[int]], mode: TagMode):
+    """
+    The tags_filter function builds the condition on the image id from the resolved tag ids,
+    a single lookup in image_m2m_tag whatever the number of tags of the filter.
+
+    :param tag_ids: list[list[int]]: For every tag of the filter, the ids of the matching tags
+    :param mode: TagMode: How the tags of the filter are combined
+    :return: The condition, or None if no image can match
+    """
+    if not any(tag_ids) or (mode == TagMode.all and not all(tag_ids)):
+        return None
+
+    all_ids = sorted({tag_id for ids in tag_ids for tag_id in ids})
+    image_ids = select(image_m2m_tag.c.image_id).filter(image_m2m_tag.c.tag_id.in_(all_ids))
+
+    if mode == TagMode.all and len(tag_ids) > 1:
+        image_ids = image_ids.group_by(image_m2m_tag.c.image_id).having(
+            and_(*(func.bool_or(image_m2m_tag.c.tag_id.in_(ids)) for ids in tag_ids))
+        )
+
+    return Image.id.in_(image_ids)
 
 
 async def get_images(
@@ -90,7 +184,12 @@ async def get_images(
         tags: list[str],
         image_id: int,
         user_id: int,
-        db: AsyncSession
+        db: AsyncSession,
+        cursor: Optional[Cursor] = None,
+        match: DescriptionMatch = DescriptionMatch.substring,
+        tags_match: TagMatch = TagMatch.contains,
+        tags_mode: TagMode = TagMode.all,
+        sort: ImageSort = ImageSort.created
 ) -> list[Image]:
     """
     The get_images function is used to retrieve images from the database.
@@ -99,6 +198,13 @@ async def get_images(
     The limit parameter determines how many results should be returned after skipping the specified number of images.
     If no value for either of these parameters are provided then they default to 0 and 10 respectively (i.e., return all).
     The description parameter allows you to search for an image by its description field using SQL LIKE syntax (e.g., %description% will match any image with
+    The page of image ids is selected first, then the images and their tags are loaded in one batch each,
+    so a page is never shortened by joined tag rows and the number of queries does not depend on the tags.
+    Images are ordered by (created_at, id), with a cursor the page starts after it and skip is ignored.
+    Full text matches of the description (every match except substring) use the GIN index of description_search
+    and are ordered by rank instead, they only support offset pagination.
+    The tags of the filter are resolved to tag ids first, then the images are filtered by one lookup of those ids.
+    Sorting by rating uses the aggregates kept on the images table, it only supports offset pagination too.
 
     :param skip: int: Skip the first n images
     :param limit: int: Limit the number of images returned
@@ -107,20 +213,53 @@ async def get_images(
     :param image_id: int: Filter the images by their id
     :param user_id: int: Filter images by user_id
     :param db: AsyncSession: Pass the database connection
+    :param cursor: Optional[Cursor]: Position after the last image of the previous page
+    :param match: DescriptionMatch: How the description is matched
+    :param tags_match: TagMatch: How the tags of the filter are compared with the tag names
+    :param tags_mode: TagMode: Whether all or any of the tags of the filter have to match
+    :param sort: ImageSort: Order of the images
     :return: A list of image objects
     """
-    query = select(Image)
+    query = select(Image.id)
+    rank = None
 
-    if description:
+    if description and match == DescriptionMatch.substring:
         query = query.filter(Image.description.like(f'%{description}%'))
+    elif description:
+        ts_query = description_query(description, match)
+        if ts_query is None:
+            return []
+        rank = func.ts_rank_cd(Image.description_search, ts_query)
+        query = query.filter(Image.description_search.bool_op('@@')(ts_query))
     if tags:
-        for tag in tags:
-            query = query.filter(Image.tags.any(Tag.name.ilike(f'%{tag}%')))
+        condition = tags_filter(await resolve_tag_patterns(tags, tags_match, db), tags_mode)
+        if condition is None:
+            return []
+        query = query.filter(condition)
     if user_id:
         query = query.filter(Image.user_id == user_id)
     if image_id:
         query = query.filter(Image.id == image_id)
 
-    image = await db.scalars(query.offset(skip).limit(limit))
+    # The page is selected by id only, so joined rows can't shorten it, then the tags are loaded in one batch
+    if sort == ImageSort.rating:
+        query = query.order_by(
+            Image.rating_average.desc().nulls_last(), Image.rating_count.desc(), Image.id
+        ).offset(skip).limit(limit)
+    elif rank is not None:
+        query = query.order_by(rank.desc(), Image.id).offset(skip).limit(limit)
+    else:
+        query = paginate(query, Image, skip, limit, cursor)
+
+    image_ids = (await db.scalars(query)).all()
+    if not image_ids:
+        return []
+
+    images = await db.scalars(
+        select(Image)
+        .filter(Image.id.in_(image_ids))
+        .options(selectinload(Image.tags))
+    )
+    positions = {image_id: position for position, image_id in enumerate(image_ids)}
 
-    return image.unique().all()  # noqa
+    return sorted(images.all(), key=lambda image: positions[image.id])
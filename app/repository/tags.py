@@ -1,26 +1,49 @@
 from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, or_
+from sqlalchemy.dialects.postgresql import insert
 
 from app.database.models import Tag
-from app.schemas.tag import TagBase
+from app.schemas.tag import TagBase, TagMatch
+from app.services.cache import LocalCache
+from app.utils.pagination import Cursor, paginate
+from config import settings
 
 
-async def get_tags(skip: int, limit: int, db: AsyncSession) -> list[Tag]:
+tag_ids = LocalCache(maxsize=settings.tag_cache_size, ttl=settings.tag_cache_ttl)
+"""Ids of recently used tags by name, a known tag is then loaded by primary key without trying to insert it."""
+
+TAG_RESOLVE_ATTEMPTS = 3
+
+
+class TagConflictError(Exception):
+    """Raised when tags keep being removed while they are resolved, the request can be retried"""
+
+
+def normalize_tag_name(name: str) -> str:
+    """
+    The normalize_tag_name function returns the stored form of a tag name: trimmed, single spaced and lowercase,
+    so "Sunset " and "sunset" are the same tag.
+
+    :param name: str: The tag name as entered by the user
+    :return: The normalized tag name
+    """
+    return ' '.join(name.split()).lower()
+
+
+async def get_tags(skip: int, limit: int, db: AsyncSession, cursor: Optional[Cursor] = None) -> list[Tag]:
     """
     The get_tags function returns a list of tags.
+    Tags are ordered by (created_at, id), with a cursor the page starts after it and skip is ignored.
 
     :param skip: int: Skip a number of records
     :param limit: int: Limit the number of tags returned
     :param db: AsyncSession: Pass the database session to the function
+    :param cursor: Optional[Cursor]: Position after the last tag of the previous page
     :return: A list of tag objects
     """
-    tags = await db.scalars(
-        select(Tag)
-        .offset(skip)
-        .limit(limit)
-    )
+    tags = await db.scalars(paginate(select(Tag), Tag, skip, limit, cursor))
 
     return tags.all()  # noqa
 
@@ -41,6 +64,37 @@ async def get_tags_by_list_values(values: list[str], db: AsyncSession) -> list[T
     return tags.all()  # noqa
 
 
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+async def resolve_tag_patterns(values: list[str], match: TagMatch, db: AsyncSession) -> list[list[int]]:
+    """
+    The resolve_tag_patterns function finds the ids of the tags matching each value with a single query,
+    so the images can then be filtered by tag id instead of comparing tag names for every image.
+
+    :param values: list[str]: The tags of the filter
+    :param match: TagMatch: How a value is compared with the tag names
+    :param db: AsyncSession: Pass the database session to the function
+    :return: For every value, the ids of the matching tags (an empty list if no tag matches)
+    """
+    if match == TagMatch.exact:
+        values = [normalize_tag_name(value) for value in values]
+        condition = Tag.name.in_(values)
+
+        def matches(value: str, name: str) -> bool:
+            return value == name
+    else:
+        condition = or_(*(Tag.name.ilike(f'%{_escape_like(value)}%', escape='\\') for value in values))
+
+        def matches(value: str, name: str) -> bool:
+            return value.lower() in name.lower()
+
+    tags = (await db.execute(select(Tag.id, Tag.name).filter(condition))).all()
+
+    return [[tag_id for tag_id, name in tags if matches(value, name)] for value in values]
+
+
 async def get_tag_by_id(tag_id: int, db: AsyncSession) -> Optional[Tag]:
     """
     The get_tag_by_id function returns a Tag object from the database.
@@ -55,35 +109,65 @@ async def get_tag_by_id(tag_id: int, db: AsyncSession) -> Optional[Tag]:
     )
 
 
-async def get_or_create_tags(values: list[str], db: AsyncSession) -> list[Tag]:
+async def get_or_create_tags(values: list[str], db: AsyncSession, commit: bool = True) -> list[Tag]:
     """
     The get_or_create_tags function takes a list of strings and an async database session.
-    It returns a list of Tag objects.
-    If the tag already exists in the database, it is returned as-is. If not, it is created and then returned.
+    It returns a list of Tag objects, one per distinct normalized name, in the order of the values.
+    Missing tags are created by a single INSERT ... ON CONFLICT (name) DO NOTHING, so concurrent uploads of the same
+    new tag can't fail on the unique name, then all the tags are loaded by one select.
+    With commit=False the new tags are left in the transaction of the caller.
 
     :param values: list[str]: Pass in a list of strings
     :param db: AsyncSession: Pass the database session to the function
+    :param commit: bool: Commit the new tags, or leave it to the caller
     :return: A list of tag objects
+    :raises TagConflictError: If the tags are still missing after TAG_RESOLVE_ATTEMPTS inserts
     """
-    tags = await get_tags_by_list_values(values, db)
-    new_tags = []
+    names = list(dict.fromkeys(name for name in map(normalize_tag_name, values or []) if name))
+    if not names:
+        return []
+
+    tags = await _load_tags(names, db, commit)
+
+    # A cached id of a renamed or removed tag is dropped and the name is resolved again, as is a tag removed
+    # by another request between the insert and the select
+    for _ in range(TAG_RESOLVE_ATTEMPTS):
+        missing = [name for name in names if name not in tags]
+        if not missing:
+            return [tags[name] for name in names]
+        for name in missing:
+            tag_ids.pop(name)
+        tags.update(await _load_tags(missing, db, commit))
+
+    missing = [name for name in names if name not in tags]
+    if missing:
+        raise TagConflictError(f"Tags {', '.join(missing)} were removed while they were added, try again")
+
+    return [tags[name] for name in names]
+
 
-    for value in values:
-        for tag in tags:
-            if value == tag.name:
-                break
-        else:
-            new_tags.append(Tag(name=value.strip()))
+async def _load_tags(names: list[str], db: AsyncSession, commit: bool) -> dict[str, Tag]:
+    cached = {name: tag_ids.get(name) for name in names}
+    unknown = [name for name, tag_id in cached.items() if tag_id is None]
 
-    db.add_all(new_tags)
+    if unknown:
+        await db.execute(insert(Tag).values([{"name": name} for name in unknown]).on_conflict_do_nothing(
+            index_elements=[Tag.name]
+        ))
+        if commit:
+            await db.commit()
 
-    await db.commit()
-    for new_tag in new_tags:
-        await db.refresh(new_tag)
+    known_ids = [tag_id for tag_id in cached.values() if tag_id is not None]
+    tags = await db.scalars(select(Tag).filter(or_(Tag.id.in_(known_ids), Tag.name.in_(unknown))))
 
-    tags.extend(new_tags)
+    result = {}
+    for tag in tags.all():
+        # The id of a tag created in a transaction that may still roll back is not shared yet
+        if commit or tag.name not in unknown:
+            tag_ids.set(tag.name, tag.id)
+        result[tag.name] = tag
 
-    return tags
+    return result
 
 
 async def update_tag(tag_id: int, body: TagBase, db: AsyncSession) -> Optional[Tag]:
@@ -98,7 +182,8 @@ async def update_tag(tag_id: int, body: TagBase, db: AsyncSession) -> Optional[T
     tag = await get_tag_by_id(tag_id, db)
 
     if tag:
-        tag.name = body.name
+        tag_ids.pop(tag.name)
+        tag.name = normalize_tag_name(body.name)
         await db.commit()
         await db.refresh(tag)
 
@@ -116,6 +201,7 @@ async def remove_tag(tag_id: int, db: AsyncSession) -> Optional[Tag]:
     tag = await get_tag_by_id(tag_id, db)
 
     if tag:
+        tag_ids.pop(tag.name)
         await db.delete(tag)
         await db.commit()
 
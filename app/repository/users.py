@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.models import User, UserRole, Image
 from app.schemas.user import UserCreate, ProfileUpdate
+from app.services.cache import UserCache, TokenGeneration
 from app.services.gravatar import get_gravatar
 
 
@@ -98,6 +99,11 @@ async def update_token(user: User, token: Optional[str], db: AsyncSession) -> No
     :return: None
     """
     user.refresh_token = token
+    await db.execute(
+        update(User)
+        .values(refresh_token=token)
+        .filter(User.id == user.id)
+    )
     await db.commit()
 
 
@@ -120,6 +126,7 @@ async def update_avatar(user_id: int, url: str, db: AsyncSession) -> User:
     await db.commit()
 
     await db.refresh(user)
+    await UserCache.invalidate(user.email)
 
     return user
 
@@ -142,6 +149,8 @@ async def update_password(user_id: int, password: str, db: AsyncSession) -> User
     await db.commit()
 
     await db.refresh(user)
+    await UserCache.invalidate(user.email)
+    await TokenGeneration.bump(user.id)
 
     return user
 
@@ -155,6 +164,11 @@ async def update_email(user_id: int, email: str, db: AsyncSession) -> Optional[U
     :param db: AsyncSession: Pass the database session to the function
     :return: The updated user object
     """
+    old_email = await db.scalar(
+        select(User.email)
+        .filter(User.id == user_id)
+    )
+
     try:
         user = await db.scalar(
             update(User)
@@ -167,6 +181,9 @@ async def update_email(user_id: int, email: str, db: AsyncSession) -> Optional[U
         return
 
     await db.refresh(user)
+    await UserCache.invalidate(old_email, user.email)
+    # Stateless tokens carry the old email, they must not authenticate any more
+    await TokenGeneration.bump(user.id)
 
     return user
 
@@ -182,6 +199,8 @@ async def confirmed_email(user: User, db: AsyncSession) -> None:
     user.email_verified = True
     await db.commit()
 
+    await UserCache.invalidate(user.email)
+
 
 async def update_user_profile(user_id: int, body: ProfileUpdate, db: AsyncSession) -> User:
     """
@@ -204,6 +223,7 @@ async def update_user_profile(user_id: int, body: ProfileUpdate, db: AsyncSessio
     await db.commit()
 
     await db.refresh(user)
+    await UserCache.invalidate(user.email)
 
     return user
 
@@ -221,6 +241,9 @@ async def user_update_role(user: User, role: UserRole, db: AsyncSession) -> User
     await db.commit()
     await db.refresh(user)
 
+    await UserCache.invalidate(user.email)
+    await TokenGeneration.bump(user.id)
+
     return user
 
 
@@ -238,6 +261,9 @@ async def user_update_is_active(user: User, is_active: bool, db: AsyncSession) -
     await db.commit()
     await db.refresh(user)
 
+    await UserCache.invalidate(user.email)
+    await TokenGeneration.bump(user.id)
+
     return user
 
 
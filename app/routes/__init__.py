@@ -7,6 +7,8 @@ from . import image_formats
 from . import image_comments
 from . import image_ratings
 from . import tags
+from . import stats
+from . import media
 
 
 
@@ -19,9 +21,11 @@ router.include_router(image_formats.router)
 router.include_router(image_comments.router)
 router.include_router(image_ratings.router)
 router.include_router(tags.router)
+router.include_router(stats.router)
 
 
 
 __all__ = (
     'router',
+    'media',
 )
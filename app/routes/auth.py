@@ -44,7 +44,7 @@ async def signup(
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail="An account with the same email address or username already exists")
 
-    body.password = AuthService.get_password_hash(body.password)
+    body.password = await AuthService.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
 
     background_tasks.add_task(send_email_confirmed, new_user.email, new_user.username, request.base_url)
@@ -71,11 +71,11 @@ async def login(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.email_verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not AuthService.verify_password(body.password, user.password):
+    if not await AuthService.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
 
     # Generate JWT
-    access_token = await AuthService.create_access_token(data={"sub": user.email})
+    access_token = await AuthService.create_access_token(data={"sub": user.email}, user=user)
     refresh_token = await AuthService.create_refresh_token(data={"sub": user.email})
 
     await repository_users.update_token(user, refresh_token, db)
@@ -130,7 +130,7 @@ async def refresh_token(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
     # Generate JWT
-    access_token = await AuthService.create_access_token(data={"sub": email})
+    access_token = await AuthService.create_access_token(data={"sub": email}, user=user)
     refresh_token = await AuthService.create_refresh_token(data={"sub": email})
 
     await repository_users.update_token(user, refresh_token, db)
@@ -214,7 +214,7 @@ async def reset_password_template(
     """
     email = await AuthService.get_email_from_token(token)
 
-    if await AuthService.token_is_blacklist(email, token):
+    if await AuthService.token_is_blacklist(token):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The link is no longer active")
 
     user = await repository_users.get_user_by_email(email, db)
@@ -250,7 +250,7 @@ async def new_password(
     if not user.email_verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
 
-    password = AuthService.get_password_hash(password)
+    password = await AuthService.get_password_hash(password)
     await repository_users.update_password(user.id, password, db)
 
     await AuthService.add_token_to_blacklist(token)
@@ -1,6 +1,6 @@
 from typing import List, Optional, Any
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Response
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -10,6 +10,7 @@ from app.schemas.image_comments import CommentBase, CommentPublic, CommentUpdate
 from app.repository import comments as repository_comments
 from app.repository import images as repository_images
 from app.utils.filters import UserRoleFilter
+from app.utils.pagination import Cursor, NEXT_CURSOR_HEADER, get_cursor, next_cursor
 from app.services.auth import get_current_active_user
 
 
@@ -46,10 +47,13 @@ async def create_comment(
     dependencies=[Depends(RateLimiter(times=10, seconds=60))]
 )
 async def get_comments_by_image_or_user_id(
+        response: Response,
         image_id: Optional[int] = None,
         user_id: Optional[int] = None,
         skip: int = 0,
-        limit: int = 10, db: AsyncSession = Depends(get_db),
+        limit: int = 10,
+        cursor: Optional[Cursor] = Depends(get_cursor),
+        db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
@@ -57,11 +61,14 @@ async def get_comments_by_image_or_user_id(
         Args:
             image_id (int): The id of the image that you want to retrieve comments for.
             user_id (int): The id of the user that you want to retrieve comments for.
+        The cursor of the next page is returned in the X-Next-Cursor header.
 
+    :param response: Response: Set the X-Next-Cursor header
     :param image_id: Optional[int]: Specify the image id
     :param user_id: Optional[int]: Specify the user_id of the comment to be deleted
     :param skip: int: Skip the first n comments
     :param limit: int: Limit the number of comments that are returned
+    :param cursor: Optional[Cursor]: Continue the listing after the previous page
     :param db: AsyncSession: Get the database connection
     :param current_user: User: Get the current user from the database
     :return: A list of comments
@@ -70,10 +77,15 @@ async def get_comments_by_image_or_user_id(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Both user_id or image_id must be provided")
 
-    return await repository_comments.get_comments_by_image_or_user_id(
-        user_id, image_id, skip, limit, db
+    comments = await repository_comments.get_comments_by_image_or_user_id(
+        user_id, image_id, skip, limit, db, cursor
     )
 
+    if cursor_value := next_cursor(comments, limit):
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
+
+    return comments
+
 
 @router.get("/{comment_id}", response_model=CommentPublic)
 async def get_comment(
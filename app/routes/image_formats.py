@@ -1,8 +1,7 @@
-import asyncio
+import zipfile
 from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -10,16 +9,17 @@ from app.database.connect import get_db
 from app.database.models import User, UserRole
 from app.repository import images as repository_images
 from app.repository import image_formats as repository_image_formats
-from app.repository.images import get_image_by_id
 from app.schemas.image_formats import (
     ImageTransformation,
     FormattedImageCreateResponse,
     ImageFormatsResponse,
     ImageFormatRemoveResponse,
+    QRCodeBatch,
 )
-from app.services import cloudinary
 from app.services.auth import get_current_active_user
-from app.services.qr_code import create_qr_for_url
+from app.services.qr_code import QRCodeCache, QRCodeFormat, qr_code_generator
+from app.services.storage import storage
+from app.utils.responses import ZipStreamResponse, etag_matches
 
 router = APIRouter(prefix="/images/formats", tags=["Image formats"])
 
@@ -31,6 +31,7 @@ router = APIRouter(prefix="/images/formats", tags=["Image formats"])
     dependencies=[Depends(RateLimiter(times=10, seconds=60))])
 async def formatting_image(
         body: ImageTransformation,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_db)
 ) -> Any:
@@ -43,6 +44,7 @@ async def formatting_image(
                 access can make requests on their own images. If no user is found, then we raise a HTTPException with status code 401 (Unauthorized) and detail &quot;
 
     :param body: ImageTransformation: Get the image_id and transformation parameters
+    :param background_tasks: BackgroundTasks: Render the default qr code of the formatted image ahead
     :param current_user: User: Get the user's id
     :param db: AsyncSession: Pass the database session to the repository layer
     :return: A formatted image
@@ -53,15 +55,19 @@ async def formatting_image(
     if image.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="You can't format someone else's image")
 
-    format_image = cloudinary.formatting_image_url(image.public_id, body.transformation)
+    try:
+        format_image = await storage.transform(image.public_id, body.transformation)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
     formatted_image = await repository_image_formats.create_image_format(
-        current_user.id, body.image_id, format_image['format'], db
+        current_user.id, body.image_id, format_image['format'], format_image['url'],
+        storage.transformation_string(format_image['format']), db
     )
     if formatted_image is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="This image already has this formatting")
 
-    formatted_image.url = format_image['url']
+    background_tasks.add_task(qr_code_generator.precompute, formatted_image.url)
 
     return {
         "parent_image_id": body.image_id,
@@ -92,9 +98,6 @@ async def get_image_formats(
 
     image_formats = await repository_image_formats.get_image_formats_by_image_id(current_user.id, image_id, db)
 
-    for image_format in image_formats:
-        image_format.public_id = image.public_id
-
     return {"parent_image": image, "formatted_images": image_formats}
 
 
@@ -129,21 +132,26 @@ async def delete_image_format(
 @router.get('/qr-code/{image_format_id}')
 async def get_image_format_qrcode(
         image_format_id: int,
-        version: Optional[int] = 1,
-        box_size: Optional[int] = 10,
-        border: Optional[int] = 5,
+        request: Request,
+        version: Optional[int] = Query(1, ge=1, le=40),
+        box_size: Optional[int] = Query(10, ge=1, le=50),
+        border: Optional[int] = Query(5, ge=0, le=20),
         fit: Optional[bool] = True,
+        image_format: QRCodeFormat = Query(QRCodeFormat.PNG, alias="format"),
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_db)
 ) -> Any:
     """
     The get_image_format_qrcode function is used to generate a QR code for the specified image format.
+    QR codes are cached, the ETag is a digest of the url and the parameters, so clients revalidate without a render.
 
     :param image_format_id: int: Get the image format by id
+    :param request: Request: Get the conditional request headers
     :param version: Optional[int]: Specify the version of the qr code
     :param box_size: Optional[int]: Specify the size of each box in pixels
     :param border: Optional[int]: Specify the width of the border that will be added around
     :param fit: Optional[bool]: Determine whether the qr code should be resized to fit the size of
+    :param image_format: QRCodeFormat: Get the qr code as png or svg
     :param current_user: User: Get the current user from the request
     :param db: AsyncSession: Get the database session
     :return: A qr code for the image format
@@ -154,17 +162,57 @@ async def get_image_format_qrcode(
     if current_user.id != formatted_image.user_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The image does not belong to you")
 
-    image = await get_image_by_id(formatted_image.image_id, db)
-
-    loop = asyncio.get_event_loop()
-    qr_image = await loop.run_in_executor(
-        None,
-        create_qr_for_url,
-        cloudinary.formatting_image_url(image.public_id, formatted_image.format)['url'],
-        version,
-        box_size,
-        border,
-        fit
+    digest = QRCodeCache.digest(formatted_image.url, version, box_size, border, fit, image_format)
+    # Private: the qr code is only served to the owner of the image
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, max-age=86400"}
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    qr_image = await qr_code_generator.get(formatted_image.url, version, box_size, border, fit, image_format)
+
+    return Response(qr_image, media_type=image_format.media_type, headers=headers)
+
+
+@router.post('/qr-codes', dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def get_image_formats_qrcodes(
+        body: QRCodeBatch,
+        current_user: User = Depends(get_current_active_user),
+        db: AsyncSession = Depends(get_db)
+) -> Any:
+    """
+    The get_image_formats_qrcodes function returns the QR codes of several image formats in a zip archive,
+    named image-{image_id}/format-{image_format_id}.{format}. The image formats are loaded in one query
+    and the QR codes that are not cached are rendered in parallel.
+
+    :param body: QRCodeBatch: Get the image format ids and the qr code parameters
+    :param current_user: User: Get the current user from the request
+    :param db: AsyncSession: Get the database session
+    :return: A zip archive of the qr codes
+    """
+    image_format_ids = list(dict.fromkeys(body.image_format_ids))
+    image_formats = {
+        image_format.id: image_format
+        for image_format in await repository_image_formats.get_image_formats_by_ids(image_format_ids, db)
+    }
+
+    missing = [image_format_id for image_format_id in image_format_ids if image_format_id not in image_formats]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Not found formatted images: {', '.join(map(str, missing))}")
+    if any(image_format.user_id != current_user.id for image_format in image_formats.values()):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The image does not belong to you")
+
+    image_formats = [image_formats[image_format_id] for image_format_id in image_format_ids]
+    qr_images = await qr_code_generator.get_many(
+        [image_format.url for image_format in image_formats],
+        body.version, body.box_size, body.border, body.fit, body.image_format
     )
 
-    return StreamingResponse(qr_image, media_type="image/png")
+    files = [
+        (f"image-{image_format.image.id}/format-{image_format.id}.{body.image_format}", qr_image)
+        for image_format, qr_image in zip(image_formats, qr_images)
+    ]
+    compression = zipfile.ZIP_DEFLATED if body.image_format == QRCodeFormat.SVG else zipfile.ZIP_STORED
+
+    return ZipStreamResponse(files, "qr-codes.zip", compression)
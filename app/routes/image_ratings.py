@@ -1,14 +1,16 @@
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.connect import get_db
 from app.database.models import User, UserRole
-from app.schemas.image_raitings import ImageRatingCreate, ImageRatingUpdate, ImageRatingResponse
+from app.schemas.image_raitings import ImageRatingCreate, ImageRatingUpdate, ImageRatingResponse, ImageRatingSummary
 from app.services.auth import get_current_active_user
 from app.repository import image_ratings as repo_image_ratings
 from app.repository import images as repository_images
+from app.utils.filters import UserRoleFilter
+from app.utils.pagination import Cursor, NEXT_CURSOR_HEADER, get_cursor, next_cursor
 
 router = APIRouter(prefix="/images/ratings", tags=["Image ratings"])
 
@@ -16,31 +18,36 @@ router = APIRouter(prefix="/images/ratings", tags=["Image ratings"])
 @router.post("/", response_model=ImageRatingResponse, status_code=status.HTTP_201_CREATED)
 async def create_image_rating(
         body: ImageRatingCreate,
+        response: Response,
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_db)
-) -> AsyncSession:
+) -> Any:
     """
-    The create_image_rating function creates a new image rating.
+    The create_image_rating function creates a new image rating, or changes the rating if the user has already
+    rated the image (200 instead of 201). The ownership check and the write are a single statement,
+    the image is only looked up again to explain a rejected rating.
 
     :param body: ImageRatingCreate: Get the rating and image_id from the request body
+    :param response: Response: Set the status code when the rating is updated
     :param current_user: User: Get the user that is currently logged in
     :param db: AsyncSession: Get the database session
-    :return: An async session object
+    :return: The image rating
     """
     if not 1 <= body.rating <= 5:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Maximum rating is 5, minimum rating 0")
 
-    image = await repository_images.get_image_by_id(body.image_id, db)
-    if not image:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
-    if image.user_id == current_user.id:
+    rating, created = await repo_image_ratings.upsert_rating(current_user.id, body.rating, body.image_id, db)
+
+    if rating is None:
+        image = await repository_images.get_image_by_id(body.image_id, db)
+        if not image:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot rate own image")
 
-    rating_exist = await repo_image_ratings.get_rating_by_image_id_and_user(current_user.id, body.image_id, db)
-    if rating_exist:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="You have already rated this image.")
+    if not created:
+        response.status_code = status.HTTP_200_OK
 
-    return await repo_image_ratings.create_rating(current_user.id, body.rating, body.image_id, db)
+    return rating
 
 
 @router.put("/", response_model=ImageRatingResponse)
@@ -95,22 +102,78 @@ async def delete_image_rating(
 
 @router.get("/{image_id}/ratings")
 async def get_all_image_ratings(
+        response: Response,
         image_id: int,
+        skip: int = 0,
+        limit: int = Query(default=20, ge=1, le=100),
+        cursor: Optional[Cursor] = Depends(get_cursor),
         db_session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
-    The get_all_image_ratings function returns all ratings for a given image.
+    The get_all_image_ratings function returns a page of the ratings for a given image.
         The function takes in an image_id and returns the list of ratings associated with that id.
+        The cursor of the next page is returned in the X-Next-Cursor header, use the summary endpoint
+        for the number of ratings and the average.
 
+    :param response: Response: Set the X-Next-Cursor header
     :param image_id: int: Get the image id from the url
+    :param skip: int: Skip the first n ratings
+    :param limit: int: Limit the number of ratings returned
+    :param cursor: Optional[Cursor]: Continue the listing after the previous page
     :param db_session: AsyncSession: Get the database session from the dependency injection container
     :param current_user: User: Get the current user who is logged in
-    :return: A list of all ratings for a given image
+    :return: A list of ratings for a given image
     """
-    ratings = await repo_image_ratings.get_all_image_ratings(image_id, db_session)
+    ratings = await repo_image_ratings.get_all_image_ratings(image_id, skip, limit, db_session, cursor)
 
     if not ratings:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ratings not found")
 
+    if cursor_value := next_cursor(ratings, limit):
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
+
     return ratings
+
+
+@router.get("/{image_id}/summary", response_model=ImageRatingSummary)
+async def get_image_rating_summary(
+        image_id: int,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_active_user)
+) -> Any:
+    """
+    The get_image_rating_summary function returns the number of ratings, the average rating
+    and the number of ratings of every value from 1 to 5 for a given image.
+
+    :param image_id: int: Get the image id from the url
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user who is logged in
+    :return: The rating summary of the image
+    """
+    summary = await repo_image_ratings.get_rating_summary(image_id, db)
+
+    if not summary["count"] and await repository_images.get_image_by_id(image_id, db) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    return summary
+
+
+@router.post("/repair", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def repair_rating_aggregates(
+        image_id: Optional[int] = Query(default=None, ge=1),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_active_user)
+) -> Any:
+    """
+    The repair_rating_aggregates function recomputes the rating count and sum stored on the images
+    from the ratings table.
+
+    :param image_id: Optional[int]: Repair a single image, all images if not provided
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
+    :return: A dictionary with the number of repaired images
+    """
+    repaired = await repo_image_ratings.recompute_rating_aggregates(db, image_id)
+
+    return {"message": "Rating aggregates repaired", "repaired": repaired}
@@ -1,16 +1,30 @@
-import asyncio
 from typing import Optional, Any
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, Query, Body, Response, Path
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi_limiter.depends import RateLimiter
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.connect import get_db
 from app.database.models import User, UserRole
 from app.repository import images as repository_images
-from app.schemas.image import ImageCreateResponse, ImagePublic, ImageRemoveResponse
-from app.services import cloudinary
+from app.schemas.image import (
+    ImageCreateResponse,
+    ImagePublic,
+    ImageRemoveResponse,
+    DescriptionMatch,
+    ImageSort,
+    UploadJobResponse,
+    UploadJobStatus,
+)
+from app.schemas.tag import TagMatch, TagMode
+from app.services.storage import storage
 from app.services.auth import get_current_active_user
+from app.services.upload_jobs import UploadJobQueue, stage_file
+from app.services.uploads import image_uploader, validate_image
+from app.utils.pagination import Cursor, NEXT_CURSOR_HEADER, get_cursor, next_cursor
 from .docs import images as docs
 
 router = APIRouter(prefix="/images", tags=["Images"])
@@ -19,16 +33,18 @@ router = APIRouter(prefix="/images", tags=["Images"])
 @router.post(
     "/", response_model=ImageCreateResponse, response_model_by_alias=False, status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(RateLimiter(times=10, seconds=60))],
-    description=docs.UPLOAD_IMAGE
+    description=docs.UPLOAD_IMAGE,
+    responses={status.HTTP_202_ACCEPTED: {"model": UploadJobResponse}},
 )
 async def upload_image(
         file: UploadFile = File(), description: str = Form(min_length=10, max_length=1200),
         tags: Optional[list[str]] = Form(None),
+        async_: bool = Query(False, alias="async", description="Upload in the background and return the job"),
         db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    The upload_image function is used to upload an image file to the cloudinary server.
+    The upload_image function is used to upload an image file to the storage.
     The function takes in a file, description and tags as parameters. The file parameter is of type UploadFile which
     is a FastAPI class that represents uploaded files. The description parameter is of type str and has minimum length
     of 10 characters and maximum length of 1200 characters while the tags parameter is optional with each tag having
@@ -37,10 +53,11 @@ async def upload_image(
     :param file: UploadFile: Receive the image file from the client
     :param description: str: Get the description of the image from the request body
     :param tags: Optional[list[str]]: Validate the tag list
+    :param async_: bool: Stage the file and return the upload job (202) instead of waiting for Cloudinary
     :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user that is logged in
     :param : Get the image id from the url
-    :return: A dictionary with the image and detail keys
+    :return: A dictionary with the image and detail keys, or the upload job
     """
     if tags and len(tags) > 5:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -52,26 +69,70 @@ async def upload_image(
                 raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                     detail=f'Invalid length tag: {tag}')
 
-    loop = asyncio.get_event_loop()
-    image = await loop.run_in_executor(None, cloudinary.upload_image, file.file)
+    await validate_image(file)
+
+    if async_:
+        path = await image_uploader.run(stage_file, file.file)
+        try:
+            job_id = await UploadJobQueue.enqueue(current_user.id, description.strip(), tags, path)
+        except RedisError as e:
+            print(e)
+            path.unlink(missing_ok=True)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Upload queue is unavailable")
+
+        job = UploadJobResponse(id=job_id, status=UploadJobStatus.queued)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(job))
+
+    image = await storage.upload(file.file)
 
     if image is None:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid image file")
 
-    image = await repository_images.create_image(current_user.id, description.strip(), tags, image['public_id'], db)
+    image = await repository_images.create_image(current_user.id, description.strip(), tags, image['public_id'], db,
+                                                 commit=False)
+    await storage.restore(file.file, image.public_id)
+    await db.commit()
+    await db.refresh(image)
 
     return {"image": image, "message": "Image successfully uploaded"}
 
 
+@router.get("/jobs/{job_id}", response_model=UploadJobResponse)
+async def get_upload_job(
+        job_id: str = Path(max_length=32),
+        current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    The get_upload_job function returns the status of an asynchronous upload,
+    with the id of the image once it is done.
+
+    :param job_id: str: The id of the upload job
+    :param current_user: User: Get the current user that is logged in
+    :return: The upload job
+    """
+    job = await UploadJobQueue.get(job_id)
+    if job is None or job['user_id'] != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found upload job")
+
+    return job
+
+
 @router.get("/", response_model=list[ImagePublic], description="Get all images",
             dependencies=[Depends(RateLimiter(times=30, seconds=60))])
 async def get_images(
+        response: Response,
         skip: int = 0,
         limit: int = Query(default=10, ge=1, le=100),
         description: Optional[str] = Query(default=None, min_length=3, max_length=1200),
+        match: DescriptionMatch = Query(default=DescriptionMatch.substring),
         tags: Optional[list[str]] = Query(default=None, max_length=50),
+        tags_match: TagMatch = Query(default=TagMatch.contains),
+        tags_mode: TagMode = Query(default=TagMode.all),
         image_id: Optional[int] = Query(default=None, ge=1),
         user_id: Optional[int] = Query(default=None, ge=1),
+        sort: ImageSort = Query(default=ImageSort.created),
+        cursor: Optional[Cursor] = Depends(get_cursor),
         db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_active_user)
 ) -> Any:
@@ -81,18 +142,40 @@ async def get_images(
         The skip parameter is used to determine how many images should be skipped before returning results.
         The limit parameter determines how many results should be returned after skipping the specified number of images.
         If no value for limit is provided then 10 will be assumed by default (max 100).
+        The cursor of the next page is returned in the X-Next-Cursor header, passing it back as the cursor
+        parameter continues the listing without the cost of skipping rows.
+        Any match other than substring searches the indexed words of the description and returns the best matches
+        first, such results are paged with skip only, as are the images sorted by rating.
 
+    :param response: Response: Set the X-Next-Cursor header
     :param skip: int: Skip a number of images when returning the list
     :param limit: int: Limit the number of images returned
     :param description: Optional[str]: Filter the images by description
+    :param match: DescriptionMatch: Choose how the description is matched
     :param tags: Optional[list[str]]: Filter the images by tags
+    :param tags_match: TagMatch: Choose how a tag is compared with the tag names
+    :param tags_mode: TagMode: Choose whether all or any of the tags have to match
     :param image_id: Optional[int]: Get the image by id
     :param user_id: Optional[int]: Filter the images by user_id
+    :param sort: ImageSort: Choose the order of the images
+    :param cursor: Optional[Cursor]: Continue the listing after the previous page
     :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user from the database
     :return: A list of images
     """
-    return await repository_images.get_images(skip, limit, description, tags, image_id, user_id, db)
+    ranked = sort != ImageSort.created or (description is not None and match != DescriptionMatch.substring)
+    if ranked and cursor is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Cursor is not supported when searching by words or sorting by rating, use skip")
+
+    images = await repository_images.get_images(
+        skip, limit, description, tags, image_id, user_id, db, cursor, match, tags_match, tags_mode, sort
+    )
+
+    if not ranked and (cursor_value := next_cursor(images, limit)):
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
+
+    return images
 
 
 @router.get("/{image_id}", response_model=ImagePublic)
@@ -159,7 +242,7 @@ async def delete_image(
         current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
-    The delete_image function deletes an image from the database and cloudinary.
+    The delete_image function deletes an image from the database and the storage.
 
     :param image_id: int: Get the image id from the url
     :param db: AsyncSession: Get the database session
@@ -174,8 +257,13 @@ async def delete_image(
     if current_user.role != UserRole.admin and image.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, cloudinary.remove_image, image.public_id)
+    public_id = image.public_id
     await repository_images.delete_image(image, db)
+    # With the local storage, images with the same content share the stored file, the lock is held until
+    # the file is removed
+    await repository_images.lock_public_id(public_id, db)
+    if not await repository_images.public_id_in_use(public_id, db):
+        await storage.delete(public_id)
+    await db.commit()
 
     return {"message": "Image successfully deleted"}
@@ -0,0 +1,65 @@
+import asyncio
+import mimetypes
+import os
+from typing import Any, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+
+from app.services.derivatives import variant_key
+from app.services.storage import local_storage
+from app.utils.responses import ZeroCopyFileResponse, etag_matches
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+
+@router.get("/{key}")
+async def get_media(key: str, request: Request,
+                    crop: Optional[str] = Query(None, alias="c"),
+                    gravity: Optional[str] = Query(None, alias="g"),
+                    height: Optional[int] = Query(None, alias="h"),
+                    width: Optional[int] = Query(None, alias="w"),
+                    signature: Optional[str] = Query(None, alias="s")) -> Any:
+    """
+    The get_media function serves a file of the local media store, or a transformed image from the derivative cache
+    when the url has the transformation and its signature, as returned by LocalStorage.transform.
+    Files never change, so they are cached forever and revalidated with their key as the ETag.
+
+    :param key: str: The content key of the file
+    :param request: Request: Get the conditional request headers
+    :param crop: Optional[str]: The crop or resize mode of the transformation
+    :param gravity: Optional[str]: The gravity of the transformation
+    :param height: Optional[int]: The height of the transformation
+    :param width: Optional[int]: The width of the transformation
+    :param signature: Optional[str]: The signature of the transformation
+    :return: The file
+    """
+    transformation = {'crop': crop, 'gravity': gravity, 'height': height, 'width': width}
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+    if signature is None:
+        headers["ETag"] = f'"{key}"'
+        try:
+            path = local_storage.store.path(key)
+            stat_result = await asyncio.to_thread(os.stat, path)
+        except (ValueError, FileNotFoundError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    else:
+        if not local_storage.verify(key, transformation, signature):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        headers["ETag"] = f'"{variant_key(key, transformation)}"'
+        stat_result = None
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if stat_result is None:
+        try:
+            path = await local_storage.derivative(key, transformation)
+            stat_result = await asyncio.to_thread(os.stat, path)
+        except (ValueError, FileNotFoundError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    return ZeroCopyFileResponse(
+        path, headers=headers, stat_result=stat_result, method=request.method,
+        media_type=mimetypes.guess_type(key)[0] or "application/octet-stream",
+    )
@@ -0,0 +1,89 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends
+
+from app.database.models import UserRole
+from app.repository.tags import tag_ids
+from app.services.auth import AuthService
+from app.services.cache import PrincipalCache
+from app.services.cloudinary import url_cache_stats
+from app.services.derivatives import derivative_cache
+from app.services.imaging import image_engine
+from app.services.passwords import password_hasher
+from app.services.qr_code import QRCodeCache, qr_code_generator
+from app.services.upload_jobs import UploadJobQueue
+from app.services.uploads import image_uploader
+from app.utils.filters import UserRoleFilter
+
+
+router = APIRouter(prefix='/stats', tags=["Stats"])
+
+
+@router.get("/caches", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def get_cache_stats() -> Any:
+    """
+    The get_cache_stats function returns the counters of the in-process caches of the current worker.
+    Every uvicorn worker keeps its own caches, so the numbers are per process.
+
+    :return: A dictionary with the stats of every cache
+    """
+    return {
+        "principals": PrincipalCache.local.stats(),
+        "jwt_payloads": AuthService.payload_cache.stats(),
+        "tag_ids": tag_ids.stats(),
+        "cloudinary_urls": url_cache_stats(),
+        "derivatives": derivative_cache.stats(),
+        "qr_codes": QRCodeCache.stats(),
+    }
+
+
+@router.get("/password-hasher", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def get_password_hasher_stats() -> Any:
+    """
+    The get_password_hasher_stats function returns the counters of the password hashing pool of the current worker,
+    including the number of rejected jobs and the time jobs waited in the queue.
+
+    :return: A dictionary with the pool counters
+    """
+    return password_hasher.stats()
+
+
+@router.get("/uploads", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def get_upload_stats() -> Any:
+    """
+    The get_upload_stats function returns the counters of the image upload pool of the current worker.
+
+    :return: A dictionary with the pool counters
+    """
+    return image_uploader.stats()
+
+
+@router.get("/upload-workers", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def get_upload_worker_stats() -> Any:
+    """
+    The get_upload_worker_stats function returns the counters of the upload pools of the upload workers,
+    as last reported by every worker after a batch.
+
+    :return: A dictionary of the pool counters by worker id
+    """
+    return await UploadJobQueue.workers()
+
+
+@router.get("/image-engine", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def get_image_engine_stats() -> Any:
+    """
+    The get_image_engine_stats function returns the counters of the local image processing pool of the current worker.
+
+    :return: A dictionary with the pool counters
+    """
+    return image_engine.stats()
+
+
+@router.get("/qr-codes", dependencies=[Depends(UserRoleFilter(UserRole.admin))])
+async def get_qr_code_stats() -> Any:
+    """
+    The get_qr_code_stats function returns the counters of the QR code rendering pool of the current worker.
+
+    :return: A dictionary with the pool counters
+    """
+    return qr_code_generator.stats()
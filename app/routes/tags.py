@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, status, Body
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.models import UserRole, User
@@ -10,6 +10,7 @@ from app.schemas.tag import TagUpdate, TagResponse
 from app.repository import tags as repository_tags
 
 from app.utils.filters import UserRoleFilter
+from app.utils.pagination import Cursor, NEXT_CURSOR_HEADER, get_cursor, next_cursor
 from app.services.auth import get_current_active_user
 
 router = APIRouter(prefix='/tags', tags=["tags"])
@@ -35,21 +36,31 @@ async def get_or_create_tags(
 
 @router.get("/", response_model=list[TagResponse])
 async def read_tags(
+        response: Response,
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[Cursor] = Depends(get_cursor),
         db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """
     The read_tags function returns a list of tags.
+    The cursor of the next page is returned in the X-Next-Cursor header.
 
+    :param response: Response: Set the X-Next-Cursor header
     :param skip: int: Skip the first n tags
     :param limit: int: Limit the number of tags returned
+    :param cursor: Optional[Cursor]: Continue the listing after the previous page
     :param db: AsyncSession: Pass the database connection to the function
     :param current_user: User: Get the current user
     :return: A list of tag objects
     """
-    return await repository_tags.get_tags(skip, limit, db)
+    tags = await repository_tags.get_tags(skip, limit, db, cursor)
+
+    if cursor_value := next_cursor(tags, limit):
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
+
+    return tags
 
 
 @router.get("/{tag_id}", response_model=TagResponse)
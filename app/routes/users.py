@@ -1,4 +1,3 @@
-import asyncio
 from typing import Any
 
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
@@ -11,8 +10,10 @@ from app.repository import users as repository_users
 from app.schemas.user import UserPublic, ProfileUpdate
 
 from app.schemas import user as user_schemas
-from app.services import cloudinary
-from app.services.auth import AuthService, get_current_active_user
+from app.services.cloudinary import FORMAT_AVATAR
+from app.services.auth import AuthService, get_current_active_user, get_current_active_user_profile
+from app.services.storage import storage
+from app.services.uploads import validate_image
 from app.utils.filters import UserRoleFilter
 from config import settings
 
@@ -21,7 +22,7 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 @router.get("/me/", response_model=user_schemas.UserPublic, dependencies=[Depends(RateLimiter(times=30, seconds=60))])
 async def get_me(
-        current_user: User = Depends(get_current_active_user)
+        current_user: User = Depends(get_current_active_user_profile)
 ) -> Any:
     """
     The get_me function returns the current user.
@@ -37,7 +38,7 @@ async def get_me(
 async def update_avatar(
         file: UploadFile = File(),
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_active_user)
+        current_user: User = Depends(get_current_active_user_profile)
 ) -> Any:
     """
     The update_avatar function updates the avatar of a user.
@@ -51,15 +52,13 @@ async def update_avatar(
     if not link.endswith(settings.cloudinary_folder):
         public_id = None
 
-    loop = asyncio.get_event_loop()
-    image = await loop.run_in_executor(
-        None, cloudinary.upload_image, file.file, public_id
-    )
+    await validate_image(file)
+    image = await storage.upload(file.file, public_id)
 
     if image is None:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid image file")
 
-    avatar = cloudinary.formatting_image_url(image['public_id'], cloudinary.FORMAT_AVATAR, image['version'])
+    avatar = await storage.transform(image['public_id'], FORMAT_AVATAR, image['version'])
 
     return await repository_users.update_avatar(current_user.id, avatar['url'], db)
 
@@ -101,13 +100,15 @@ async def update_password(
 
     :param body: UserPasswordUpdate: Get the old and new password from the request body
     :param db: AsyncSession: Get the database session
-    :param current_user: User: Get the user object from the database
+    :param current_user: User: Get the current user, the password hash is not cached so it is read from the database
     :return: A json response with the updated user
     """
-    if not AuthService.verify_password(body.old_password, current_user.password):
+    user = await repository_users.get_user_by_id(current_user.id, db)
+
+    if not await AuthService.verify_password(body.old_password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid old password")
 
-    password = AuthService.get_password_hash(body.new_password)
+    password = await AuthService.get_password_hash(body.new_password)
 
     return await repository_users.update_password(current_user.id, password, db)
 
@@ -1,8 +1,45 @@
+from enum import StrEnum, auto
+from typing import Optional
+
 from pydantic import utils, root_validator
 
 from .core import CoreModel, IDModelMixin, DateTimeModelMixin
 from .tag import TagResponse
-from app.services.cloudinary import formatting_image_url
+from app.services.storage import storage
+
+
+class DescriptionMatch(StrEnum):
+    """
+    How the description filter of the image listing matches
+    """
+    substring = auto()
+    """Case sensitive substring (LIKE), not indexed, kept for compatibility"""
+    words = auto()
+    """All words, web search syntax ("quoted phrase", or, -word) is supported"""
+    prefix = auto()
+    """Every word matched as a prefix, for search as you type"""
+    phrase = auto()
+    """The words next to each other in the given order"""
+
+
+class ImageSort(StrEnum):
+    """
+    Order of the image listing
+    """
+    created = auto()
+    """Oldest first, the order of cursor pagination"""
+    rating = auto()
+    """Highest average rating first, then the most rated"""
+
+
+class UploadJobStatus(StrEnum):
+    """
+    State of an asynchronous image upload
+    """
+    queued = auto()
+    processing = auto()
+    done = auto()
+    failed = auto()
 
 
 class ImageBase(CoreModel):
@@ -22,10 +59,13 @@ class ImageBase(CoreModel):
 
     @staticmethod
     def format_url(public_id: str):
-        return formatting_image_url(public_id)['url']
+        return storage.url(public_id)
 
 
 class ImagePublic(DateTimeModelMixin, ImageBase, IDModelMixin):
+    rating_count: int = 0
+    rating_average: Optional[float]
+
     class Config:
         orm_mode = True
 
@@ -37,3 +77,10 @@ class ImageCreateResponse(CoreModel):
 
 class ImageRemoveResponse(CoreModel):
     message: str = "Image successfully deleted"
+
+
+class UploadJobResponse(CoreModel):
+    id: str
+    status: UploadJobStatus
+    image_id: Optional[int] = None
+    detail: Optional[str] = None
@@ -1,8 +1,9 @@
 from typing import Optional
 
-from pydantic import root_validator, utils
+from pydantic import Field, conlist
 
-from app.services.cloudinary import CroppingOrResizingTransformation, formatting_image_url
+from app.services.cloudinary import CroppingOrResizingTransformation
+from app.services.qr_code import QRCodeFormat
 from .core import CoreModel, IDModelMixin, DateTimeModelMixin
 from .image import ImagePublic
 
@@ -24,16 +25,7 @@ class FormattedImageBase(CoreModel):
     Leaving salt from base model
     """
     url: str
-
-    @root_validator(pre=True)
-    def update_model(cls, values: utils.GetterDict):
-        if 'url' not in values.keys():
-            values._obj.url = cls.format_url(values._obj.public_id, values._obj.format)  # noqa
-        return values
-
-    @staticmethod
-    def format_url(public_id: str, format_: dict):
-        return formatting_image_url(public_id, format_)['url']
+    transformation: str
 
 
 class FormattedImagePublic(DateTimeModelMixin, FormattedImageBase, IDModelMixin):
@@ -59,3 +51,15 @@ class ImageTransformationResponse(CoreModel):
 
 class ImageFormatRemoveResponse(CoreModel):
     message: str = "Image format successfully deleted"
+
+
+class QRCodeBatch(CoreModel):
+    """
+    Model representing a batch of QR codes, rendered with the same parameters for every image format
+    """
+    image_format_ids: conlist(int, min_items=1, max_items=100)
+    version: int = Field(1, ge=1, le=40)
+    box_size: int = Field(10, ge=1, le=50)
+    border: int = Field(5, ge=0, le=20)
+    fit: bool = True
+    image_format: QRCodeFormat = Field(QRCodeFormat.PNG, alias="format")
@@ -17,3 +17,10 @@ class ImageRatingResponse(DateTimeModelMixin, ImageRatingCreate, IDModelMixin):
 
     class Config:
         orm_mode = True
+
+
+class ImageRatingSummary(CoreModel):
+    image_id: int
+    count: int
+    average: Optional[float]
+    histogram: dict[int, int]
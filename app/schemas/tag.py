@@ -1,3 +1,5 @@
+from enum import StrEnum, auto
+
 from .core import CoreModel, IDModelMixin, DateTimeModelMixin
 
 
@@ -13,3 +15,23 @@ class TagResponse(DateTimeModelMixin, TagBase, IDModelMixin):
 
     class Config:
         orm_mode = True
+
+
+class TagMatch(StrEnum):
+    """
+    How a tag of the image filter is compared with the tag names
+    """
+    contains = auto()
+    """Case insensitive substring of the name, served by the trigram index"""
+    exact = auto()
+    """The exact name, served by the unique index"""
+
+
+class TagMode(StrEnum):
+    """
+    How the tags of the image filter are combined
+    """
+    all = auto()
+    """The image has a matching tag for every tag of the filter"""
+    any = auto()
+    """The image has a matching tag for at least one tag of the filter"""
@@ -1,33 +1,37 @@
-import pickle
+import time
 from calendar import timegm
 from datetime import datetime, timedelta
+from hashlib import sha256
 from typing import Optional
+from uuid import uuid4
 
-import redis as redis_db
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.connect import get_db
 from app.repository import users as repository_users
-from app.database.models import User
+from app.database.models import User, UserRole
+from app.services.cache import redis_client, LocalCache, UserCache, PrincipalCache, TokenGeneration
+from app.services.passwords import pwd_context, password_hasher
+from app.services.revocation import RevocationStore
 from config import settings
 
 
 class AuthService:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
     SECRET_KEY = settings.secret_key_jwt
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    redis = redis_db.Redis(host=settings.redis_host, port=settings.redis_port, db=0, password=settings.redis_password)
+    redis = redis_client
+    payload_cache = LocalCache(maxsize=settings.jwt_cache_size, ttl=settings.jwt_cache_ttl)
 
     @classmethod
-    def verify_password(cls, plain_password, hashed_password) -> bool:
+    async def verify_password(cls, plain_password, hashed_password) -> bool:
         """
         The verify_password function takes a plain-text password and hashed password as arguments.
-        It then uses the verify method of the pwd_context object to check if they match.
+        It then checks if they match on the password hashing pool, so bcrypt does not block the event loop.
         The result is returned as a boolean value.
 
         :param cls: Represent the class itself
@@ -35,38 +39,47 @@ class AuthService:
         :param hashed_password: Check if the password is hashed
         :return: True if the plain_password matches the hashed_password
         """
-        return cls.pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
 
     @classmethod
-    def get_password_hash(cls, password: str) -> str:
+    async def get_password_hash(cls, password: str) -> str:
         """
         The get_password_hash function takes a password as input and returns the hashed version of that password.
-        The hashing algorithm used is PBKDF2, which is considered secure for most applications.
+        The hashing algorithm used is bcrypt, it runs on the password hashing pool.
 
         :param cls: Represent the class itself
         :param password: str: Pass in the password that is being hashed
         :return: A hashed password
         """
-        return cls.pwd_context.hash(password)
+        return await password_hasher.hash(password)
 
     @classmethod
     def __decode_jwt(cls, token: str) -> dict:
         """
         The __decode_jwt function takes a token as an argument and returns the decoded payload.
         The decode function from the jwt library is used to decode the token, using our SECRET_KEY and ALGORITHM.
+        Verified payloads are cached by the digest of the token until the token expires, so a client reusing
+        its token skips the signature verification and json parsing.
 
         :param cls: Represent the class itself
         :param token: str: Pass the token to the function
         :return: A dictionary with the following keys:
         """
-        return jwt.decode(token, cls.SECRET_KEY, algorithms=[cls.ALGORITHM])
+        key = sha256(token.encode('utf-8')).digest()
+
+        payload = cls.payload_cache.get(key)
+        if payload is None:
+            payload = jwt.decode(token, cls.SECRET_KEY, algorithms=[cls.ALGORITHM])
+            cls.payload_cache.set(key, payload, payload.get('exp', 0) - time.time())
+
+        return payload.copy()
 
     @classmethod
     def __encode_jwt(cls, data: dict, iat: datetime, exp: datetime, scope: str) -> str:
         """
         The __encode_jwt function takes in a dictionary of data, an issued at time (iat),
         an expiration time (exp), and a scope. It then creates a copy of the data dictionary
-        and adds the iat, exp, and scope to it. Finally it returns the encoded JWT.
+        and adds the iat, exp, scope and a unique token identifier (jti) to it. Finally it returns the encoded JWT.
 
         :param cls: Represent the class itself
         :param data: dict: Pass in the data that will be encoded into the jwt
@@ -76,23 +89,35 @@ class AuthService:
         :return: A string containing the encoded jwt
         """
         to_encode = data.copy()
-        to_encode.update({"iat": iat, "exp": exp, "scope": scope})
+        to_encode.update({"iat": iat, "exp": exp, "scope": scope, "jti": uuid4().hex})
 
         return jwt.encode(to_encode, cls.SECRET_KEY, algorithm=cls.ALGORITHM)
 
     @classmethod
-    async def create_access_token(cls, data: dict, expires_delta: Optional[float] = None) -> str:
+    async def create_access_token(cls, data: dict, expires_delta: Optional[float] = None,
+                                  user: Optional[User] = None) -> str:
         """
         The create_access_token function creates a new access token.
             Args:
                 data (dict): A dictionary of key-value pairs to be stored in the JWT payload.
                 expires_delta (Optional[float]): An optional expiration time for the token, in seconds. Defaults to 15 minutes if not provided.
+                user (Optional[User]): The owner of the token, in the stateless mode its claims are embedded.
 
         :param cls: Represent the class itself
         :param data: dict: Pass the data to be encoded into the jwt
         :param expires_delta: Optional[float]: Set the expiration time of the token
+        :param user: Optional[User]: Embed the user id, role, active flag and token generation into the jwt
         :return: A string that is the access token
         """
+        if settings.auth_stateless_tokens and user is not None:
+            data = {
+                **data,
+                "uid": user.id,
+                "role": user.role,
+                "act": user.is_active,
+                "gen": await TokenGeneration.get(user.id),
+            }
+
         expire = datetime.utcnow() + timedelta(seconds=expires_delta or 15 * 60)
         return cls.__encode_jwt(data, datetime.utcnow(), expire, "access_token")
 
@@ -170,34 +195,86 @@ class AuthService:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+        user = PrincipalCache.get(token)
+        if user is not None:
+            return user
+
         try:
             # Decode JWT
             payload = cls.__decode_jwt(token)
 
             if payload.get('scope') == 'access_token':
                 email = payload.get("sub")
-                if email is None or await cls.token_is_blacklist(email, token):
+                if email is None:
                     raise credentials_exception
             else:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
 
-        user = cls.redis.get(f"user:{email}")
+        jti = RevocationStore.token_id(payload, token)
+        if RevocationStore.may_be_revoked(jti):
+            # Revocation state and cached user in a single round trip
+            revoked, cached_user = await cls.redis.mget(RevocationStore.key(jti), UserCache.key(email))
+            if revoked is not None:
+                raise credentials_exception
+        else:
+            cached_user = await cls.redis.get(UserCache.key(email))
+
+        user = None if cached_user is None else UserCache.loads(cached_user)
         if user is None:
 
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
 
-            cls.redis.set(f"user:{email}", pickle.dumps(user))
-            cls.redis.expire(f"user:{email}", 900)
+            await UserCache.set(user)
 
-        else:
-            user = pickle.loads(user)
+        PrincipalCache.set(token, user, payload['exp'] - timegm(datetime.utcnow().utctimetuple()))
 
         return user
 
+    @classmethod
+    async def get_current_principal(cls, token: str = Depends(oauth2_scheme),
+                                    db: AsyncSession = Depends(get_db)) -> User:
+        """
+        The get_current_principal function is a dependency that returns the user who owns the access token,
+        with only the attributes needed for authorization (id, email, role and is_active).
+        In the stateless mode they are read from the token claims: the only state checked is the revocation
+        of the token and the token generation of the user, both usually answered in-process.
+        Tokens without claims and the default mode fall back to get_current_user.
+
+        :param cls: Represent the class itself
+        :param token: str: Get the token from the request header
+        :param db: AsyncSession: Get the database session
+        :return: A user object, not attached to any session in the stateless mode
+        """
+        if not settings.auth_stateless_tokens:
+            return await cls.get_current_user(token, db)
+
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+        try:
+            payload = cls.__decode_jwt(token)
+        except JWTError as e:
+            raise credentials_exception
+
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
+            raise credentials_exception
+        if 'uid' not in payload:
+            return await cls.get_current_user(token, db)
+
+        if await RevocationStore.is_revoked(RevocationStore.token_id(payload, token)):
+            raise credentials_exception
+        if payload['gen'] != await TokenGeneration.get(payload['uid']):
+            raise credentials_exception
+
+        return User(id=payload['uid'], email=payload['sub'], role=UserRole(payload['role']), is_active=payload['act'])
+
     @classmethod
     async def get_email_from_token(cls, token: str) -> str:
         """
@@ -223,53 +300,60 @@ class AuthService:
                                 detail="Invalid token for email verification")
 
     @classmethod
-    async def token_is_blacklist(cls, email: str, jwt_token: str) -> bool:
+    async def token_is_blacklist(cls, jwt_token: str) -> bool:
         """
-        The token_is_blacklist function checks if the access token is in the blacklist.
-            Args:
-                email (str): The user's email address.
-                token (str): The user's access token.
+        The token_is_blacklist function checks if the token was revoked.
+        The token is identified by its jti claim, so any number of tokens of the same user can be revoked.
 
         :param cls: Represent the class itself
-        :param email: str: Get the token from redis, and the token: str parameter is used to check if it matches
         :param jwt_token: str: Check if the token is blacklisted
         :return: A boolean value
         """
-        rd_token = cls.redis.get(f"black-list:{email}")
-
-        if rd_token and jwt_token == rd_token.decode('utf-8'):
-            return True
+        payload = cls.__decode_jwt(jwt_token)
 
-        return False
+        return await RevocationStore.is_revoked(RevocationStore.token_id(payload, jwt_token))
 
     @classmethod
     async def add_token_to_blacklist(cls, jwt_token: str) -> None:
         """
-        The logout function takes an access token and adds it to the black list.
-        The function first decodes the JWT, then gets the email from it.
-        It also calculates how many seconds are left until expiration of that token.
-        Then, we add a key-value pair to Redis where the key is "black-list:{email}" and
-        the value is "access_token". We set an expiration time on this key equal to
-        the number of seconds remaining until expiration.
+        The add_token_to_blacklist function revokes the token until it expires.
+        The function first decodes the JWT, then calculates how many seconds are left until expiration of that token
+        and stores the token identifier in the revocation store for that time.
+        The in-process principal caches of all workers drop the token as well.
 
         :param cls: Represent the class itself
-        :param jwt_token: str: Get the email from the token
+        :param jwt_token: str: The token to revoke
         :return: None
         """
         payload = cls.__decode_jwt(jwt_token)
 
-        email: str = payload.get('sub')
         expire_seconds = payload.get('exp') - timegm(datetime.utcnow().utctimetuple())
 
-        cls.redis.set(f"black-list:{email}", jwt_token.encode('utf-8'))
-        cls.redis.expire(f"black-list:{email}", expire_seconds)
-        
+        await RevocationStore.revoke(RevocationStore.token_id(payload, jwt_token), expire_seconds)
+        await PrincipalCache.invalidate_token(jwt_token)
 
-async def get_current_active_user(current_user: User = Depends(AuthService.get_current_user)) -> User:
+
+async def get_current_active_user(current_user: User = Depends(AuthService.get_current_principal)) -> User:
     """
     The get_current_active_user function is a dependency that returns the current user,
     if it exists and is active. If not, an HTTPException with status code 400 (Bad Request)
     is raised.
+    In the stateless mode only id, email, role and is_active of the user are loaded,
+    endpoints that return the profile use get_current_active_user_profile.
+
+    :param current_user: User: Pass the user object to the function
+    :return: The current_user if it is active
+    """
+    if not current_user.is_active:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
+
+    return current_user
+
+
+async def get_current_active_user_profile(current_user: User = Depends(AuthService.get_current_user)) -> User:
+    """
+    The get_current_active_user_profile function is a dependency that returns the current user with the whole profile,
+    if it exists and is active. If not, an HTTPException with status code 400 (Bad Request) is raised.
 
     :param current_user: User: Pass the user object to the function
     :return: The current_user if it is active
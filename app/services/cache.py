@@ -0,0 +1,462 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import sha256
+from typing import Optional, Any, Callable
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.database.models import User, UserRole
+from config import settings
+
+
+redis_client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, password=settings.redis_password)
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with a per-entry time to live
+
+    Not shared between uvicorn workers, every worker keeps its own copy.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        """
+        The __init__ function sets the capacity and the default time to live of the cache.
+
+        :param self: Represent the instance of the object itself
+        :param maxsize: int: Maximum number of entries, the least recently used entry is evicted first
+        :param ttl: float: Default time to live of an entry in seconds
+        :return: Nothing
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any) -> Any:
+        """
+        The get function returns the cached value or None if the key is missing or expired.
+
+        :param self: Represent the instance of the object itself
+        :param key: Any: Key of the entry
+        :return: The cached value or None
+        """
+        item = self._data.get(key)
+
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+
+        return item[1]
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        The set function stores the value, evicting the least recently used entry when the cache is full.
+
+        :param self: Represent the instance of the object itself
+        :param key: Any: Key of the entry
+        :param value: Any: Value to store
+        :param ttl: Optional[float]: Time to live of the entry, the default ttl is used if not provided
+        :return: None
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Any) -> Any:
+        """
+        The pop function removes the entry from the cache.
+
+        :param self: Represent the instance of the object itself
+        :param key: Any: Key of the entry
+        :return: The removed value or None
+        """
+        item = self._data.pop(key, None)
+
+        return None if item is None else item[1]
+
+    def pop_where(self, predicate: Callable[[Any, Any], bool]) -> None:
+        """
+        The pop_where function removes every entry whose key and value match the predicate.
+
+        :param self: Represent the instance of the object itself
+        :param predicate: Callable[[Any, Any], bool]: Called with the key and the value of every entry
+        :return: None
+        """
+        for key in [key for key, (_, value) in self._data.items() if predicate(key, value)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters used to size the cache.
+
+        :param self: Represent the instance of the object itself
+        :return: A dictionary with the size, capacity, hits, misses and hit rate of the cache
+        """
+        requests = self.hits + self.misses
+
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+        }
+
+
+class UserCache:
+    """
+    Cache of the user identity used by the authentication dependency
+
+    Only a compact JSON projection of the user is stored (no password hash or refresh token), so a cache hit costs
+    one Redis round trip and a json.loads instead of unpickling a detached ORM object.
+    """
+    VERSION = 1
+    """Bump when the projection changes, entries written by older code are then simply never read."""
+    TTL = 900
+    FIELDS = (
+        'id', 'username', 'email', 'first_name', 'last_name', 'avatar',
+        'role', 'email_verified', 'is_active', 'created_at', 'updated_at',
+    )
+    redis = redis_client
+
+    @classmethod
+    def key(cls, email: str) -> str:
+        """
+        The key function returns the versioned redis key of the cached user.
+
+        :param cls: Represent the class itself
+        :param email: str: Email of the user
+        :return: The redis key
+        """
+        return f"user:v{cls.VERSION}:{email}"
+
+    @classmethod
+    def dumps(cls, user: User) -> bytes:
+        """
+        The dumps function serializes the cached projection of the user to json.
+
+        :param cls: Represent the class itself
+        :param user: User: The user to serialize
+        :return: The serialized projection
+        """
+        data = {field: getattr(user, field) for field in cls.FIELDS}
+
+        for field in ('created_at', 'updated_at'):
+            if data[field] is not None:
+                data[field] = data[field].isoformat()
+
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data: bytes) -> User:
+        """
+        The loads function restores a transient user object from the cached projection.
+
+        :param cls: Represent the class itself
+        :param data: bytes: The serialized projection
+        :return: A user object that is not attached to any session
+        """
+        data = json.loads(data)
+
+        data['role'] = UserRole(data['role'])
+        for field in ('created_at', 'updated_at'):
+            if data[field] is not None:
+                data[field] = datetime.fromisoformat(data[field])
+
+        return User(**data)
+
+    @classmethod
+    async def get(cls, email: str) -> Optional[User]:
+        """
+        The get function returns the cached user by email or None if it is not cached.
+
+        :param cls: Represent the class itself
+        :param email: str: Email of the user
+        :return: A transient user object or None
+        """
+        data = await cls.redis.get(cls.key(email))
+
+        return None if data is None else cls.loads(data)
+
+    @classmethod
+    async def set(cls, user: User) -> None:
+        """
+        The set function stores the projection of the user with a single SET EX command.
+
+        :param cls: Represent the class itself
+        :param user: User: The user to cache
+        :return: None
+        """
+        await cls.redis.set(cls.key(user.email), cls.dumps(user), ex=cls.TTL)
+
+    @classmethod
+    async def invalidate(cls, *emails: str) -> None:
+        """
+        The invalidate function removes the cached users, it is called after every update of the user data.
+        The in-process principal caches of all workers are notified as well.
+        A redis failure is not raised, the database is already updated and the entry expires after TTL anyway.
+
+        :param cls: Represent the class itself
+        :param emails: str: Emails of the users to remove
+        :return: None
+        """
+        try:
+            await cls.redis.delete(*(cls.key(email) for email in emails))
+        except RedisError as e:
+            print(e)
+
+        for email in emails:
+            await PrincipalCache.invalidate_user(email)
+
+
+class PrincipalCache:
+    """
+    In-process cache of authenticated principals in front of redis, keyed by a hash of the access token
+
+    A hit skips the JWT decoding and both redis round trips of the authentication dependency. Entries are evicted
+    in every uvicorn worker through redis pub/sub when a user is updated (ban, role change, ...) or a token is revoked.
+    The short local TTL bounds the staleness if a message is lost while a worker is reconnecting.
+    """
+    CHANNEL = "auth:invalidate"
+    local = LocalCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+    redis = redis_client
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        """
+        The token_key function returns the digest of the token, so raw tokens are never kept as keys or sent to redis.
+
+        :param token: str: The access token
+        :return: The hex digest of the token
+        """
+        return sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get(cls, token: str) -> Optional[User]:
+        """
+        The get function returns a fresh transient user for the cached token, or None on a miss.
+
+        :param cls: Represent the class itself
+        :param token: str: The access token
+        :return: A transient user object or None
+        """
+        item = cls.local.get(cls.token_key(token))
+
+        return None if item is None else UserCache.loads(item[1])
+
+    @classmethod
+    def set(cls, token: str, user: User, ttl: Optional[float] = None) -> None:
+        """
+        The set function caches the serialized principal, every hit then gets its own user object.
+
+        :param cls: Represent the class itself
+        :param token: str: The access token
+        :param user: User: The authenticated user
+        :param ttl: Optional[float]: Seconds left until the token expires
+        :return: None
+        """
+        cls.local.set(cls.token_key(token), (user.email, UserCache.dumps(user)), ttl)
+
+    @classmethod
+    def evict(cls, message: str) -> None:
+        """
+        The evict function applies an invalidation message in the current worker.
+
+        :param cls: Represent the class itself
+        :param message: str: "email:{email}", "token:{token_key}" or "generation:{user_id}"
+        :return: None
+        """
+        kind, _, value = message.partition(':')
+
+        if kind == 'email':
+            cls.local.pop_where(lambda key, item: item[0] == value)
+        elif kind == 'token':
+            cls.local.pop(value)
+        elif kind == 'generation':
+            TokenGeneration.local.pop(int(value))
+
+    @classmethod
+    async def publish(cls, message: str) -> None:
+        """
+        The publish function evicts the entry locally and broadcasts the eviction to the other workers.
+
+        :param cls: Represent the class itself
+        :param message: str: The invalidation message
+        :return: None
+        """
+        cls.evict(message)
+
+        try:
+            await cls.redis.publish(cls.CHANNEL, message)
+        except RedisError as e:
+            print(e)
+
+    @classmethod
+    async def invalidate_user(cls, email: str) -> None:
+        await cls.publish(f"email:{email}")
+
+    @classmethod
+    async def invalidate_token(cls, token: str) -> None:
+        await cls.publish(f"token:{cls.token_key(token)}")
+
+    @classmethod
+    async def listen(cls) -> None:
+        """
+        The listen function subscribes to the invalidation channel and evicts entries until it is cancelled.
+        The local cache is cleared after a lost connection, since messages may have been missed meanwhile.
+
+        :param cls: Represent the class itself
+        :return: None
+        """
+        while True:
+            try:
+                async with cls.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(cls.CHANNEL)
+
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            cls.evict(message['data'].decode('utf-8'))
+            except RedisError as e:
+                print(e)
+
+            cls.local.clear()
+            await asyncio.sleep(1)
+
+
+class TokenGeneration:
+    """
+    Per-user counter embedded into stateless access tokens
+
+    Bumping the counter (ban, role change) invalidates every stateless token issued to the user before. The current
+    value is cached in-process and evicted in every worker through the principal cache channel, so a request
+    authorized from the token claims normally needs no redis round trip.
+    """
+    local = LocalCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+    redis = redis_client
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"token-gen:{user_id}"
+
+    @classmethod
+    async def get(cls, user_id: int) -> int:
+        """
+        The get function returns the current token generation of the user.
+
+        :param cls: Represent the class itself
+        :param user_id: int: Id of the user
+        :return: The generation, 0 if it was never bumped
+        """
+        generation = cls.local.get(user_id)
+
+        if generation is None:
+            generation = int(await cls.redis.get(cls.key(user_id)) or 0)
+            cls.local.set(user_id, generation)
+
+        return generation
+
+    @classmethod
+    async def bump(cls, user_id: int) -> None:
+        """
+        The bump function increments the token generation of the user and notifies all workers.
+
+        :param cls: Represent the class itself
+        :param user_id: int: Id of the user
+        :return: None
+        """
+        await cls.redis.incr(cls.key(user_id))
+        await PrincipalCache.publish(f"generation:{user_id}")
+
+
+class RatingSummaryCache:
+    """
+    Cache of the rating summary of an image (count, average, histogram), invalidated on every rating write
+
+    Every entry keeps the rating aggregates of the image it was computed from. Ratings removed by a cascade (user
+    or image deleted in the database) change the aggregates, so such an entry is never read.
+    """
+    VERSION = 2
+    TTL = 3600
+    redis = redis_client
+
+    @classmethod
+    def key(cls, image_id: int) -> str:
+        return f"rating-summary:v{cls.VERSION}:{image_id}"
+
+    @classmethod
+    async def get(cls, image_id: int, aggregates: tuple[int, int]) -> Optional[dict]:
+        """
+        The get function returns the cached summary, or None on a miss, if the summary was computed from other
+        aggregates or if redis is not available.
+
+        :param cls: Represent the class itself
+        :param image_id: int: Id of the image
+        :param aggregates: tuple[int, int]: The current rating_count and rating_sum of the image
+        :return: The summary or None
+        """
+        try:
+            data = await cls.redis.get(cls.key(image_id))
+        except RedisError as e:
+            print(e)
+            return None
+
+        if data is None:
+            return None
+
+        entry = json.loads(data)
+
+        return entry['summary'] if tuple(entry['aggregates']) == tuple(aggregates) else None
+
+    @classmethod
+    async def set(cls, image_id: int, summary: dict, aggregates: tuple[int, int]) -> None:
+        """
+        The set function caches the summary, a redis failure only costs the next request a query.
+
+        :param cls: Represent the class itself
+        :param image_id: int: Id of the image
+        :param summary: dict: The summary
+        :param aggregates: tuple[int, int]: The rating_count and rating_sum of the image the summary was computed from
+        :return: None
+        """
+        entry = {'aggregates': list(aggregates), 'summary': summary}
+
+        try:
+            await cls.redis.set(cls.key(image_id), json.dumps(entry, separators=(',', ':')), ex=cls.TTL)
+        except RedisError as e:
+            print(e)
+
+    @classmethod
+    async def invalidate(cls, *image_ids: int) -> None:
+        """
+        The invalidate function removes the cached summaries, it is called after every rating write
+        and when an image is deleted.
+
+        :param cls: Represent the class itself
+        :param image_ids: int: Ids of the images
+        :return: None
+        """
+        try:
+            await cls.redis.delete(*(cls.key(image_id) for image_id in image_ids))
+        except RedisError as e:
+            print(e)
@@ -1,7 +1,8 @@
 import uuid
 import enum
+from functools import lru_cache
 
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Optional, Hashable
 
 import cloudinary
 from cloudinary.uploader import upload
@@ -94,6 +95,26 @@ class CroppingOrResizingTransformation(BaseModel):
     gravity: Optional[GravityMode] = None
 
 
+def send_image(file: BinaryIO, public_id: Optional[str] = None) -> dict:
+    """
+    The send_image function uploads an image to Cloudinary and lets the errors through, so callers can tell
+    a rejected file from a failure worth retrying.
+
+    :param file: BinaryIO: Pass the image file to be uploaded
+    :param public_id: Optional[str]: Set a custom name for the image
+    :return: A dictionary with the url, public_id and version of the image
+    :raises cloudinary.exceptions.Error: If the upload failed
+    """
+    image = cloudinary.uploader.upload_image(
+        file=file,
+        public_id=public_id or uuid.uuid4().hex,
+        folder=settings.cloudinary_folder,
+        owerwrite=True,
+    )
+
+    return {'url': image.url, 'public_id': image.public_id, 'version': image.version}
+
+
 def upload_image(file: BinaryIO, public_id: Optional[str] = None) -> Optional[dict]:
     """
     The upload_image function uploads an image to Cloudinary.
@@ -103,16 +124,14 @@ def upload_image(file: BinaryIO, public_id: Optional[str] = None) -> Optional[di
     :return: A tuple of three values:
     """
     try:
-        image = cloudinary.uploader.upload_image(
-            file=file,
-            public_id=public_id or uuid.uuid4().hex,
-            folder=settings.cloudinary_folder,
-            owerwrite=True,
-        )
+        return send_image(file, public_id)
     except cloudinary.exceptions.Error:
         return
 
-    return {'url': image.url, 'public_id': image.public_id, 'version': image.version}
+
+@lru_cache(maxsize=settings.cloudinary_url_cache_size)
+def _build_url(public_id: str, version: Optional[str], transformation: tuple[tuple[str, Hashable], ...]) -> str:
+    return cloudinary.CloudinaryImage(public_id=public_id, version=version, url_options=dict(transformation)).url
 
 
 def formatting_image_url(public_id: str,
@@ -121,6 +140,8 @@ def formatting_image_url(public_id: str,
     """
     The formatting_image_url function takes in a file_id, and transformation, version.
     The function then returns the url of the image with the specified transformation applied to it.
+    Urls are memoized by (public_id, version, transformation), a listing serializes the same images over and over,
+    the unset (None) transformation parameters are left out of the key since they don't change the url.
 
     :param public_id: str: Specify the public_id of the image
     :param transformation: Optional[CroppingTransformation | ResizingTransformation]: Specify the type of transformation to be applied on the image
@@ -130,13 +151,50 @@ def formatting_image_url(public_id: str,
     if isinstance(transformation, CroppingOrResizingTransformation):
         transformation = transformation.dict()
 
-    image = cloudinary.CloudinaryImage(
-        public_id=public_id,
-        version=version,
-        url_options=transformation
-    )
+    options = transformation or {}
+    key = tuple(sorted((name, value) for name, value in options.items() if value is not None))
+
+    try:
+        url = _build_url(public_id, version, key)
+    except TypeError:
+        # Unhashable option values (nested transformations) are built without the cache
+        url = cloudinary.CloudinaryImage(public_id=public_id, version=version, url_options=options).url
 
-    return {'url': image.url, 'format': image.url_options}
+    return {'url': url, 'format': options}
+
+
+def transformation_string(transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> str:
+    """
+    The transformation_string function returns the canonical Cloudinary transformation string (c_fill,h_250,w_250),
+    the part of the delivery url between upload/ and the version, with the parameters in Cloudinary's own order.
+
+    :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+    :return: The transformation string, empty for no transformation
+    """
+    if isinstance(transformation, CroppingOrResizingTransformation):
+        transformation = transformation.dict()
+
+    options = {name: value for name, value in (transformation or {}).items() if value is not None}
+
+    return cloudinary.utils.generate_transformation_string(**options)[0]
+
+
+def url_cache_stats() -> dict:
+    """
+    The url_cache_stats function returns the counters of the url cache in the format of LocalCache.stats.
+
+    :return: A dictionary with the size, capacity, hits, misses and hit rate of the cache
+    """
+    info = _build_url.cache_info()
+    requests = info.hits + info.misses
+
+    return {
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / requests, 4) if requests else 0.0,
+    }
 
 
 def remove_image(public_id: str) -> bool:
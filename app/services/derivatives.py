@@ -0,0 +1,248 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from app.services.cloudinary import CroppingOrResizingTransformation
+from config import settings
+
+
+def canonical(transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> dict:
+    """
+    The canonical function returns the transformation parameters without the unset ones and with the enums
+    replaced by their values, so equal transformations compare and serialize equally.
+
+    :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+    :return: The canonical parameters
+    """
+    if isinstance(transformation, CroppingOrResizingTransformation):
+        transformation = transformation.dict()
+
+    return {
+        name: value.value if isinstance(value, Enum) else value
+        for name, value in (transformation or {}).items() if value is not None
+    }
+
+
+def variant_key(public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> str:
+    """
+    The variant_key function returns the sha256 of the image and the canonical JSON of its transformation,
+    the same for every ImageFormat.format that describes the same transformation.
+
+    :param public_id: str: The public_id of the image
+    :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+    :return: The key of the variant
+    """
+    document = json.dumps([public_id, canonical(transformation)], sort_keys=True, separators=(',', ':'))
+
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+class DerivativeCache:
+    """
+    Rendered transformations of images on the local disk, limited to a byte budget and evicted least recently
+    used first
+
+    Concurrent requests for a variant that is not cached share a single render. The index lives in memory and is
+    rebuilt from the directory on first use, oldest file first, so every worker process enforces the budget on its
+    own view of the directory; a file removed by another worker is rendered again.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        """
+        The __init__ function sets the cache directory and budget, the directory is read on first use.
+
+        :param self: Represent the instance of the object itself
+        :param root: Path: The cache directory
+        :param max_bytes: int: The byte budget of the cached files
+        :return: Nothing
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._renders: dict[str, asyncio.Task] = {}
+        self._loading: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def name(public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> str:
+        """
+        The name function returns the file name of a variant. It starts with the name of the image, so the variants
+        of an image are found when the image is deleted, and ends with its extension.
+
+        :param public_id: str: The public_id of the image
+        :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+        :return: The file name of the variant
+        """
+        image = Path(public_id)
+
+        return f"{image.stem}-{variant_key(public_id, transformation)}{image.suffix}"
+
+    def path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    async def get(self, public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict],
+                  render: Callable[[], Awaitable[bytes]]) -> Path:
+        """
+        The get function returns the cached file of a variant, rendering it if it is not cached.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image, its extension is the extension of the variant
+        :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+        :param render: Callable[[], Awaitable[bytes]]: Renders the variant on a miss
+        :return: The path of the cached file
+        :raises ValueError: If the variant can't be rendered
+        """
+        await self._loaded()
+
+        name = self.name(public_id, transformation)
+        path = self.path(name)
+
+        if name in self._entries:
+            if await asyncio.to_thread(path.exists):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return path
+            self.bytes -= self._entries.pop(name)
+
+        task = self._renders.get(name)
+        if task is not None:
+            self.hits += 1
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._render(name, render))
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._renders[name] = task
+
+        # A cancelled request doesn't cancel the render the other requests wait for
+        return await asyncio.shield(task)
+
+    async def _loaded(self) -> None:
+        if self._loading is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(self._load))
+        loading = self._loading
+        try:
+            await asyncio.shield(loading)
+        except Exception:
+            # The load failed, the next request starts it again
+            if self._loading is loading:
+                self._loading = None
+            raise
+
+    async def _render(self, name: str, render: Callable[[], Awaitable[bytes]]) -> Path:
+        try:
+            data = await render()
+            path = self.path(name)
+            await asyncio.to_thread(self._write, path, data)
+        finally:
+            del self._renders[name]
+
+        self._entries[name] = len(data)
+        self.bytes += len(data)
+        evicted = self._evict(keep=name)
+        if evicted:
+            await asyncio.to_thread(self._unlink, evicted)
+
+        return path
+
+    def _evict(self, keep: str) -> list[Path]:
+        evicted = []
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                # A variant larger than the budget stays until the next one is cached
+                break
+            del self._entries[name]
+            self.bytes -= size
+            self.evictions += 1
+            evicted.append(self.path(name))
+
+        return evicted
+
+    async def discard(self, public_id: str) -> int:
+        """
+        The discard function removes the cached variants of an image, also the ones cached by other workers.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image
+        :return: The number of removed files
+        """
+        await self._loaded()
+
+        prefix = f"{Path(public_id).stem}-"
+        paths = await asyncio.to_thread(lambda: list(self.path(prefix).parent.glob(f"{glob.escape(prefix)}*")))
+
+        for path in paths:
+            if path.name in self._entries:
+                self.bytes -= self._entries.pop(path.name)
+        await asyncio.to_thread(self._unlink, paths)
+
+        return len(paths)
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=path.parent, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+
+    @staticmethod
+    def _unlink(paths: list[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def _load(self) -> None:
+        files = []
+        if self.root.exists():
+            for path in self.root.glob('*/*'):
+                if path.suffix == '.part':
+                    # Written right now by another worker, or left over by an interrupted render
+                    continue
+                stat_result = path.stat()
+                files.append((stat_result.st_mtime, path.name, stat_result.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.bytes += size
+
+        self._unlink(self._evict(keep=''))
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters used to size the cache.
+
+        :param self: Represent the instance of the object itself
+        :return: A dictionary with the number of files, bytes, budget, hits, misses and hit rate of the cache
+        """
+        requests = self.hits + self.misses
+
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            "shared": self.shared,
+            "evictions": self.evictions,
+            "rendering": len(self._renders),
+        }
+
+
+derivative_cache = DerivativeCache(settings.derivative_cache_dir, settings.derivative_cache_max_bytes)
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+
+
+def _timed(submitted_at: float, func: Callable, *args: Any) -> tuple[float, Any]:
+    """
+    The _timed function runs the job in the worker and returns how long it waited in the queue.
+    time.monotonic is system wide, so the wait is correct for the process pool as well.
+
+    :param submitted_at: float: Monotonic time when the job was submitted
+    :param func: Callable: The job
+    :param args: Any: Arguments of the job
+    :return: A tuple of the queue wait in seconds and the result of the job
+    """
+    return time.monotonic() - submitted_at, func(*args)
+
+
+class BoundedExecutor:
+    """
+    A thread or process pool that rejects jobs with 429 once too many of them are pending
+
+    A job is pending from its submission until it completes. When workers + max_queue jobs are pending, new jobs are
+    rejected with a Retry-After instead of queueing without bound. The pool is created on first use.
+    """
+    thread_name_prefix = "bounded-executor"
+    busy_detail = "Too many requests, try again later"
+
+    def __init__(self, executor: str, workers: int, max_queue: int) -> None:
+        """
+        The __init__ function sets the pool parameters, the pool itself is created on first use.
+
+        :param self: Represent the instance of the object itself
+        :param executor: str: "thread" or "process"
+        :param workers: int: Number of workers of the pool
+        :param max_queue: int: Number of jobs allowed to wait for a free worker
+        :return: Nothing
+        """
+        self.executor_type = executor
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix=self.thread_name_prefix)
+
+        return self._executor
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        The run function submits the job to the pool, rejecting it when the pool is saturated.
+
+        :param self: Represent the instance of the object itself
+        :param func: Callable: The job, picklable for a process pool
+        :param args: Any: Arguments of the job
+        :return: The result of the job
+        :raises HTTPException: 429 if the pool is saturated
+        """
+        [result] = await self.run_many([(func, args)])
+
+        return result
+
+    async def run_many(self, calls: list[tuple[Callable, tuple]]) -> list[Any]:
+        """
+        The run_many function submits several jobs to the pool, rejecting all of them when the pool has no room
+        for them.
+
+        :param self: Represent the instance of the object itself
+        :param calls: list[tuple[Callable, tuple]]: The jobs, functions with their arguments
+        :return: The results of the jobs, in order
+        :raises HTTPException: 429 if the pool has no room for the jobs
+        """
+        if self.pending + len(calls) > self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail=self.busy_detail, headers={"Retry-After": "1"})
+
+        self.pending += len(calls)
+        try:
+            loop = asyncio.get_running_loop()
+            submitted_at = time.monotonic()
+            timed = await asyncio.gather(*(loop.run_in_executor(self.executor, _timed, submitted_at, func, *args)
+                                           for func, args in calls))
+        finally:
+            self.pending -= len(calls)
+
+        self.completed += len(calls)
+        for wait, _ in timed:
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+        return [result for _, result in timed]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters of the pool, the queue wait is in milliseconds.
+
+        :param self: Represent the instance of the object itself
+        :return: A dictionary with the pool counters
+        """
+        return {
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.wait_total / self.completed * 1000, 3) if self.completed else 0.0,
+            "queue_wait_max_ms": round(self.wait_max * 1000, 3),
+        }
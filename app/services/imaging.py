@@ -0,0 +1,194 @@
+from io import BytesIO
+from typing import NamedTuple, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.services.cloudinary import CroppingOrResizingTransformation, CropMode, ResizeMode, GravityMode
+from app.services.executors import BoundedExecutor
+from config import settings
+
+
+GRAVITY_ANCHORS = {
+    GravityMode.NORTH_WEST: (0.0, 0.0), GravityMode.NORTH: (0.5, 0.0), GravityMode.NORTH_EAST: (1.0, 0.0),
+    GravityMode.WEST: (0.0, 0.5), GravityMode.CENTER: (0.5, 0.5), GravityMode.EAST: (1.0, 0.5),
+    GravityMode.SOUTH_WEST: (0.0, 1.0), GravityMode.SOUTH: (0.5, 1.0), GravityMode.SOUTH_EAST: (1.0, 1.0),
+}
+FILL_MODES = {CropMode.FILL, CropMode.IFILL, CropMode.FILL_PAD, CropMode.THUMB}
+FIT_MODES = {ResizeMode.FIT, ResizeMode.LIMIT, ResizeMode.M_FIT}
+PAD_MODES = {ResizeMode.PAD, ResizeMode.IPAD, ResizeMode.MPAD}
+ADD_ON_MODES = {CropMode.IMAGGA_SCALA, CropMode.IMAGGA_CROP}
+# Formats without transparency get a white padding
+OPAQUE_FORMATS = {'JPEG', 'BMP'}
+
+
+class Geometry(NamedTuple):
+    """
+    How an image is transformed: resized, then cropped to a box of the resized image or padded on a canvas
+    """
+    resize: tuple[int, int]
+    crop: Optional[tuple[int, int, int, int]] = None
+    canvas: Optional[tuple[int, int]] = None
+    offset: tuple[int, int] = (0, 0)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        if self.canvas is not None:
+            return self.canvas
+        if self.crop is not None:
+            return self.crop[2] - self.crop[0], self.crop[3] - self.crop[1]
+        return self.resize
+
+
+def _round(value: float) -> int:
+    return max(1, int(value + 0.5))
+
+
+def _place(space: int, fraction: float) -> int:
+    return int(space * fraction + 0.5)
+
+
+def geometry(size: tuple[int, int], transformation: dict) -> Geometry:
+    """
+    The geometry function works out the transformation of an image of the given size the way Cloudinary does.
+    A missing width or height follows the aspect ratio of the image, a transformation without a mode scales.
+
+    :param size: tuple[int, int]: Width and height of the original image
+    :param transformation: dict: The transformation parameters (width, height, crop, gravity)
+    :return: The geometry of the transformation
+    :raises ValueError: If the mode needs a Cloudinary add-on
+    """
+    original_width, original_height = size
+    width, height = transformation.get('width') or None, transformation.get('height') or None
+    mode = transformation.get('crop') or (ResizeMode.SCALE if width or height else None)
+    fx, fy = GRAVITY_ANCHORS[transformation.get('gravity') or GravityMode.CENTER]
+
+    if mode is None:
+        return Geometry(size)
+    if mode in ADD_ON_MODES:
+        raise ValueError(f"Mode {mode} needs a Cloudinary add-on")
+
+    if mode == CropMode.CROP:
+        # A region of the original, never larger than the original
+        w, h = min(width or original_width, original_width), min(height or original_height, original_height)
+        x, y = _place(original_width - w, fx), _place(original_height - h, fy)
+        return Geometry(size, crop=(x, y, x + w, y + h))
+
+    w = width or original_width * height / original_height
+    h = height or original_height * width / original_width
+
+    if mode == ResizeMode.SCALE:
+        return Geometry((_round(w), _round(h)))
+
+    if mode in FIT_MODES:
+        scale = min(w / original_width, h / original_height)
+        if mode == ResizeMode.LIMIT:
+            scale = min(scale, 1)
+        elif mode == ResizeMode.M_FIT:
+            scale = max(scale, 1)
+        return Geometry((_round(original_width * scale), _round(original_height * scale)))
+
+    if mode in FILL_MODES:
+        scale = max(w / original_width, h / original_height)
+        if mode == CropMode.IFILL and scale > 1:
+            # Not scaled up, the largest area of the requested aspect ratio is cut out instead
+            ratio = min(original_width / w, original_height / h)
+            w, h, scale = w * ratio, h * ratio, 1
+        resized = _round(original_width * scale), _round(original_height * scale)
+        w, h = min(_round(w), resized[0]), min(_round(h), resized[1])
+        x, y = _place(resized[0] - w, fx), _place(resized[1] - h, fy)
+        return Geometry(resized, crop=(x, y, x + w, y + h))
+
+    if mode in PAD_MODES:
+        scale = min(w / original_width, h / original_height)
+        if mode == ResizeMode.MPAD and scale < 1:
+            # Only scales up, larger images are left as they are
+            return Geometry(size)
+        if mode == ResizeMode.IPAD:
+            scale = min(scale, 1)
+        canvas = _round(w), _round(h)
+        resized = min(_round(original_width * scale), canvas[0]), min(_round(original_height * scale), canvas[1])
+        offset = _place(canvas[0] - resized[0], fx), _place(canvas[1] - resized[1], fy)
+        return Geometry(resized, canvas=canvas, offset=offset)
+
+    raise ValueError(f"Unknown mode {mode}")
+
+
+def render(data: bytes, transformation: dict) -> bytes:
+    """
+    The render function applies a transformation to an encoded image with Pillow and encodes the result in the
+    format of the original. It is CPU bound, run it in ImageEngine.
+
+    :param data: bytes: The encoded original image
+    :param transformation: dict: The transformation parameters (width, height, crop, gravity)
+    :return: The encoded transformed image
+    :raises ValueError: If the image can't be decoded or the mode is not supported
+    """
+    try:
+        original = Image.open(BytesIO(data))
+    except UnidentifiedImageError as e:
+        raise ValueError("Invalid image file") from e
+
+    with original:
+        image_format = original.format or 'PNG'
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        plan = geometry(image.size, transformation)
+
+        if plan.resize != image.size:
+            image = image.resize(plan.resize, Image.Resampling.LANCZOS)
+        if plan.crop is not None:
+            image = image.crop(plan.crop)
+        if plan.canvas is not None:
+            background = (255, 255, 255, 255) if image_format in OPAQUE_FORMATS else (255, 255, 255, 0)
+            canvas = Image.new('RGBA', plan.canvas, background)
+            canvas.paste(image, plan.offset)
+            image = canvas
+
+        if image_format in OPAQUE_FORMATS and image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        buffer = BytesIO()
+        image.save(buffer, format=image_format)
+
+    return buffer.getvalue()
+
+
+class ImageEngine(BoundedExecutor):
+    """
+    Transforms images locally with Pillow on a bounded process pool, as an offline alternative to the Cloudinary
+    transformations
+
+    Decoding and resampling hold the GIL, so the renders run in worker processes. LocalStorage keeps the results
+    in the derivative cache.
+    """
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        """
+        The __init__ function sets the pool parameters, the pool itself is created on first use.
+
+        :param self: Represent the instance of the object itself
+        :param workers: int: Number of worker processes
+        :param max_queue: int: Number of renders allowed to wait for a free worker
+        :return: Nothing
+        """
+        super().__init__("process", workers, max_queue)
+
+    async def render(self, data: bytes, transformation: CroppingOrResizingTransformation | dict) -> bytes:
+        """
+        The render function transforms an encoded image in the process pool.
+
+        :param self: Represent the instance of the object itself
+        :param data: bytes: The encoded original image
+        :param transformation: CroppingOrResizingTransformation | dict: The transformation parameters
+        :return: The encoded transformed image
+        :raises ValueError: If the image can't be decoded or the mode is not supported
+        """
+        if isinstance(transformation, CroppingOrResizingTransformation):
+            transformation = transformation.dict()
+
+        return await self.run(render, data, transformation)
+
+
+image_engine = ImageEngine(workers=settings.image_engine_workers, max_queue=settings.image_engine_max_queue)
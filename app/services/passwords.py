@@ -0,0 +1,38 @@
+from passlib.context import CryptContext
+
+from app.services.executors import BoundedExecutor
+from config import settings
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher(BoundedExecutor):
+    """
+    Runs bcrypt outside the event loop on a bounded thread or process pool
+
+    bcrypt takes tens to hundreds of milliseconds per call, so hashing in an async handler stalls every other request
+    of the worker.
+    """
+    thread_name_prefix = "password-hash"
+
+    async def hash(self, password: str) -> str:
+        return await self.run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(_verify, plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    executor=settings.password_hash_executor,
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+)
@@ -1,6 +1,36 @@
+import enum
+import json
+from hashlib import sha256
 from io import BytesIO
+from typing import Optional
 
 import qrcode
+from fastapi import HTTPException
+from qrcode.image.svg import SvgPathFillImage
+from redis.exceptions import RedisError
+
+from app.services.cache import redis_client
+from app.services.executors import BoundedExecutor
+from config import settings
+
+
+class QRCodeFormat(enum.StrEnum):
+    """Enum representing the output formats of a QR code"""
+    PNG = 'png'
+    SVG = 'svg'
+
+    @property
+    def media_type(self) -> str:
+        return 'image/svg+xml' if self == QRCodeFormat.SVG else 'image/png'
+
+
+class RedSvgImage(SvgPathFillImage):
+    """A single path on a white background, in the colors of the PNG image"""
+    QR_PATH_STYLE = {**SvgPathFillImage.QR_PATH_STYLE, 'fill': 'red'}
+
+
+# The parameters of the QR code rendered ahead when a formatted image is created
+DEFAULT_QR_CODE = {'version': 1, 'box_size': 10, 'border': 5, 'fit': True, 'image_format': QRCodeFormat.PNG}
 
 
 def create_qr_for_url(
@@ -8,17 +38,20 @@ def create_qr_for_url(
         version: int,
         box_size: int,
         border: int,
-        fit: bool = True
-) -> BytesIO:
+        fit: bool = True,
+        image_format: QRCodeFormat = QRCodeFormat.PNG
+) -> bytes:
     """
     The create_qr_for_url function takes a URL and returns a QR code image of that URL.
+    It is CPU bound, run it in QRCodeGenerator.
 
     :param url: str: Pass in the url that will be encoded into the qr code
     :param version: int: Specify the size of the qr code
     :param box_size: int: Set the size of each box in the qr code
     :param border: int: Set the border width of the qr code
     :param fit: bool: Determine if the qr code should be fitted to the data
-    :return: A bytesio object, which is a file-like
+    :param image_format: QRCodeFormat: PNG, or SVG which is rendered without Pillow and is much cheaper
+    :return: The encoded image
     """
     qr = qrcode.QRCode(
         version=version,
@@ -28,10 +61,267 @@ def create_qr_for_url(
     )
     qr.add_data(url)
     qr.make(fit=fit)
-    qr_img = qr.make_image(fill_color="red", back_color="white")
+
+    if image_format == QRCodeFormat.SVG:
+        qr_img = qr.make_image(image_factory=RedSvgImage)
+    else:
+        qr_img = qr.make_image(fill_color="red", back_color="white")
 
     buffer = BytesIO()
     qr_img.save(buffer)
-    buffer.seek(0)
 
-    return buffer
+    return buffer.getvalue()
+
+
+def create_qr_codes(
+        urls: list[str],
+        version: int,
+        box_size: int,
+        border: int,
+        fit: bool = True,
+        image_format: QRCodeFormat = QRCodeFormat.PNG
+) -> list[bytes]:
+    """
+    The create_qr_codes function renders the QR codes of several urls with the same parameters, so a batch is sent
+    to a worker process in one job.
+
+    :param urls: list[str]: The urls that will be encoded into the qr codes
+    :param version: int: Specify the size of the qr codes
+    :param box_size: int: Set the size of each box in the qr codes
+    :param border: int: Set the border width of the qr codes
+    :param fit: bool: Determine if the qr codes should be fitted to the data
+    :param image_format: QRCodeFormat: PNG or SVG
+    :return: The encoded images, in the order of the urls
+    """
+    return [create_qr_for_url(url, version, box_size, border, fit, image_format) for url in urls]
+
+
+class QRCodeCache:
+    """
+    Cache of rendered QR codes in redis, keyed by a digest of the url and the rendering parameters
+
+    The digest is also the ETag of the image. Counters are per process.
+    """
+    VERSION = 1
+    """Part of the digest, changing it after a change of the rendering also changes every ETag clients hold."""
+    redis = redis_client
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def digest(cls, url: str, version: int, box_size: int, border: int, fit: bool,
+               image_format: QRCodeFormat) -> str:
+        """
+        The digest function returns the sha256 of the canonical JSON of the parameters of a QR code.
+
+        :param cls: Represent the class itself
+        :param url: str: The encoded url
+        :param version: int: The version of the qr code
+        :param box_size: int: The size of each box in pixels
+        :param border: int: The width of the border in boxes
+        :param fit: bool: Whether the qr code is fitted to the data
+        :param image_format: QRCodeFormat: The output format
+        :return: The hex digest
+        """
+        document = json.dumps([cls.VERSION, url, version, box_size, border, fit, image_format.value],
+                              separators=(',', ':'))
+
+        return sha256(document.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def key(cls, digest: str) -> str:
+        return f"qr-code:{digest}"
+
+    @classmethod
+    async def get(cls, digest: str) -> Optional[bytes]:
+        """
+        The get function returns the cached image, or None on a miss or if redis is not available.
+
+        :param cls: Represent the class itself
+        :param digest: str: The digest of the qr code
+        :return: The encoded image or None
+        """
+        try:
+            data = await cls.redis.get(cls.key(digest))
+        except RedisError as e:
+            print(e)
+            data = None
+
+        if data is None:
+            cls.misses += 1
+        else:
+            cls.hits += 1
+
+        return data
+
+    @classmethod
+    async def get_many(cls, digests: list[str]) -> list[Optional[bytes]]:
+        """
+        The get_many function returns the cached images with a single MGET, None for every miss.
+
+        :param cls: Represent the class itself
+        :param digests: list[str]: The digests of the qr codes
+        :return: The encoded images or None, in the order of the digests
+        """
+        try:
+            cached = await cls.redis.mget([cls.key(digest) for digest in digests])
+        except RedisError as e:
+            print(e)
+            cached = [None] * len(digests)
+
+        hits = sum(data is not None for data in cached)
+        cls.hits += hits
+        cls.misses += len(digests) - hits
+
+        return cached
+
+    @classmethod
+    async def set(cls, digest: str, data: bytes) -> None:
+        """
+        The set function caches the image for QR_CODE_CACHE_TTL, a redis failure only costs the next request a render.
+
+        :param cls: Represent the class itself
+        :param digest: str: The digest of the qr code
+        :param data: bytes: The encoded image
+        :return: None
+        """
+        try:
+            await cls.redis.set(cls.key(digest), data, ex=settings.qr_code_cache_ttl)
+        except RedisError as e:
+            print(e)
+
+    @classmethod
+    async def set_many(cls, images: dict[str, bytes]) -> None:
+        """
+        The set_many function caches several images in one pipeline.
+
+        :param cls: Represent the class itself
+        :param images: dict[str, bytes]: The encoded images by digest
+        :return: None
+        """
+        try:
+            async with cls.redis.pipeline(transaction=False) as pipe:
+                for digest, data in images.items():
+                    pipe.set(cls.key(digest), data, ex=settings.qr_code_cache_ttl)
+                await pipe.execute()
+        except RedisError as e:
+            print(e)
+
+    @classmethod
+    def stats(cls) -> dict:
+        requests = cls.hits + cls.misses
+
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_rate": round(cls.hits / requests, 4) if requests else 0.0,
+        }
+
+
+class QRCodeGenerator(BoundedExecutor):
+    """
+    Renders QR codes on a bounded process pool, behind QRCodeCache
+
+    A batch is split into one job per worker, and it is rejected as a whole when the pool has no room for all its
+    jobs, so a batch never fails halfway.
+    """
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        """
+        The __init__ function sets the pool parameters, the pool itself is created on first use.
+
+        :param self: Represent the instance of the object itself
+        :param workers: int: Number of worker processes
+        :param max_queue: int: Number of renders allowed to wait for a free worker
+        :return: Nothing
+        """
+        super().__init__("process", workers, max_queue)
+
+    async def render(self, url: str, version: int, box_size: int, border: int, fit: bool,
+                     image_format: QRCodeFormat) -> bytes:
+        """
+        The render function renders a QR code in the process pool, without the cache.
+
+        :param self: Represent the instance of the object itself
+        :param url: str: The encoded url
+        :param version: int: The version of the qr code
+        :param box_size: int: The size of each box in pixels
+        :param border: int: The width of the border in boxes
+        :param fit: bool: Whether the qr code is fitted to the data
+        :param image_format: QRCodeFormat: The output format
+        :return: The encoded image
+        """
+        return await self.run(create_qr_for_url, url, version, box_size, border, fit, image_format)
+
+    async def get(self, url: str, version: int, box_size: int, border: int, fit: bool,
+                  image_format: QRCodeFormat) -> bytes:
+        """
+        The get function returns the cached QR code, rendering and caching it on a miss.
+
+        :param self: Represent the instance of the object itself
+        :param url: str: The encoded url
+        :param version: int: The version of the qr code
+        :param box_size: int: The size of each box in pixels
+        :param border: int: The width of the border in boxes
+        :param fit: bool: Whether the qr code is fitted to the data
+        :param image_format: QRCodeFormat: The output format
+        :return: The encoded image
+        """
+        digest = QRCodeCache.digest(url, version, box_size, border, fit, image_format)
+
+        data = await QRCodeCache.get(digest)
+        if data is None:
+            data = await self.render(url, version, box_size, border, fit, image_format)
+            await QRCodeCache.set(digest, data)
+
+        return data
+
+    async def get_many(self, urls: list[str], version: int, box_size: int, border: int, fit: bool,
+                       image_format: QRCodeFormat) -> list[bytes]:
+        """
+        The get_many function returns the QR codes of several urls. The cache is read with one round trip,
+        the misses are split into one job per worker and rendered in parallel.
+
+        :param self: Represent the instance of the object itself
+        :param urls: list[str]: The encoded urls
+        :param version: int: The version of the qr codes
+        :param box_size: int: The size of each box in pixels
+        :param border: int: The width of the border in boxes
+        :param fit: bool: Whether the qr codes are fitted to the data
+        :param image_format: QRCodeFormat: The output format
+        :return: The encoded images, in the order of the urls
+        """
+        digests = [QRCodeCache.digest(url, version, box_size, border, fit, image_format) for url in urls]
+        images = await QRCodeCache.get_many(digests)
+
+        missing = [index for index, data in enumerate(images) if data is None]
+        if missing:
+            chunks = [missing[start::self.workers] for start in range(min(self.workers, len(missing)))]
+            results = await self.run_many([
+                (create_qr_codes, ([urls[index] for index in chunk], version, box_size, border, fit, image_format))
+                for chunk in chunks
+            ])
+            for chunk, rendered in zip(chunks, results):
+                for index, data in zip(chunk, rendered):
+                    images[index] = data
+
+            await QRCodeCache.set_many({digests[index]: images[index] for index in missing})
+
+        return images
+
+    async def precompute(self, url: str) -> None:
+        """
+        The precompute function caches the QR code with the default parameters, it runs as a background task
+        after a formatted image is created. It is skipped while the pool is busy.
+
+        :param self: Represent the instance of the object itself
+        :param url: str: The url of the formatted image
+        :return: None
+        """
+        try:
+            await self.get(url, **DEFAULT_QR_CODE)
+        except HTTPException as e:
+            print(e.detail)
+
+
+qr_code_generator = QRCodeGenerator(workers=settings.qr_code_workers, max_queue=settings.qr_code_max_queue)
@@ -0,0 +1,171 @@
+import asyncio
+import math
+import time
+from hashlib import blake2b, sha256
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from app.services.cache import redis_client
+from config import settings
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings: no false negatives, false positives at the configured rate
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """
+        The __init__ function sizes the bit array and the number of hashes for the expected number of items.
+
+        :param self: Represent the instance of the object itself
+        :param capacity: int: Expected number of items
+        :param error_rate: float: Acceptable false positive rate at full capacity
+        :return: Nothing
+        """
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        digest = blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationStore:
+    """
+    Revoked tokens, stored in redis as one key per token identifier (jti) that expires together with the token
+
+    With REVOCATION_BLOOM_FILTER enabled every worker keeps a Bloom filter of the revoked identifiers, filled from
+    redis on start and kept in sync through pub/sub, so the common "not revoked" answer needs no redis round trip.
+    Until the filter is loaded, or while the subscription is lost, every check goes to redis.
+    """
+    PREFIX = "revoked:"
+    CHANNEL = "auth:revoked"
+    redis = redis_client
+    bloom: Optional[BloomFilter] = None
+    bloom_ready = False
+
+    @classmethod
+    def key(cls, jti: str) -> str:
+        return f"{cls.PREFIX}{jti}"
+
+    @staticmethod
+    def token_id(payload: dict, token: str) -> str:
+        """
+        The token_id function returns the identifier of the token, tokens issued without a jti are identified by
+        the digest of the token itself.
+
+        :param payload: dict: The decoded token
+        :param token: str: The encoded token
+        :return: The token identifier
+        """
+        return payload.get('jti') or sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def may_be_revoked(cls, jti: str) -> bool:
+        """
+        The may_be_revoked function answers from the local Bloom filter whether redis has to be asked at all.
+
+        :param cls: Represent the class itself
+        :param jti: str: The token identifier
+        :return: False only when the token is certainly not revoked
+        """
+        if not cls.bloom_ready:
+            return True
+
+        return jti in cls.bloom
+
+    @classmethod
+    async def is_revoked(cls, jti: str) -> bool:
+        """
+        The is_revoked function checks if the token was revoked.
+
+        :param cls: Represent the class itself
+        :param jti: str: The token identifier
+        :return: True if the token was revoked
+        """
+        if not cls.may_be_revoked(jti):
+            return False
+
+        return bool(await cls.redis.exists(cls.key(jti)))
+
+    @classmethod
+    async def revoke(cls, jti: str, expire_seconds: int) -> None:
+        """
+        The revoke function stores the token identifier until the token expires and notifies the other workers.
+
+        :param cls: Represent the class itself
+        :param jti: str: The token identifier
+        :param expire_seconds: int: Seconds left until the token expires
+        :return: None
+        """
+        if expire_seconds <= 0:
+            return
+
+        await cls.redis.set(cls.key(jti), 1, ex=expire_seconds)
+
+        if cls.bloom is not None:
+            cls.bloom.add(jti)
+        if settings.revocation_bloom_filter:
+            await cls.redis.publish(cls.CHANNEL, jti)
+
+    @classmethod
+    async def _rebuild(cls) -> None:
+        """
+        The _rebuild function loads the identifiers of all tokens that are still revoked into a new Bloom filter.
+        Expired identifiers are dropped this way, which keeps the false positive rate down.
+
+        :param cls: Represent the class itself
+        :return: None
+        """
+        bloom = BloomFilter(settings.revocation_bloom_capacity, settings.revocation_bloom_error_rate)
+
+        async for key in cls.redis.scan_iter(match=f"{cls.PREFIX}*", count=1000):
+            bloom.add(key.decode('utf-8').removeprefix(cls.PREFIX))
+
+        cls.bloom = bloom
+        cls.bloom_ready = True
+
+    @classmethod
+    async def listen(cls) -> None:
+        """
+        The listen function keeps the Bloom filter of the worker in sync until it is cancelled.
+        It subscribes before loading the filter, so revocations made during the load are not lost, and rebuilds
+        the filter periodically and after a lost connection.
+
+        :param cls: Represent the class itself
+        :return: None
+        """
+        while True:
+            try:
+                async with cls.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(cls.CHANNEL)
+                    await cls._rebuild()
+                    rebuilt_at = time.monotonic()
+
+                    while True:
+                        message = await pubsub.get_message(timeout=1.0)
+                        if message is not None and message['type'] == 'message':
+                            cls.bloom.add(message['data'].decode('utf-8'))
+
+                        if time.monotonic() - rebuilt_at > settings.revocation_bloom_rebuild_interval:
+                            await cls._rebuild()
+                            rebuilt_at = time.monotonic()
+            except RedisError as e:
+                print(e)
+
+            cls.bloom_ready = False
+            await asyncio.sleep(1)
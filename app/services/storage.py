@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import hmac
+import mimetypes
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Optional
+from urllib.parse import urlencode
+
+from app.services import cloudinary
+from app.services.cloudinary import CroppingOrResizingTransformation
+from app.services.derivatives import DerivativeCache, canonical, derivative_cache, variant_key
+from app.services.imaging import image_engine
+from app.services.uploads import SNIFF_SIZE, image_uploader, sniff_image_type
+from config import settings
+
+
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}(\.[a-z0-9]+)?')
+# Query parameters of the transformation in the url of a variant
+VARIANT_PARAMS = {'crop': 'c', 'gravity': 'g', 'height': 'h', 'width': 'w'}
+
+
+class ContentStore:
+    """
+    Files on the local disk addressed by the sha256 of their content
+
+    The same content is stored once, and a stored file never changes, so it can be cached forever. Files are
+    written to a temporary file and renamed, readers never see a partial file.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        """
+        The key_for function returns the key of the content: its sha256 and the extension of its image format.
+
+        :param data: bytes: The content
+        :return: The key
+        """
+        mime_type = sniff_image_type(data[:SNIFF_SIZE])
+        extension = mimetypes.guess_extension(mime_type) if mime_type else None
+
+        return hashlib.sha256(data).hexdigest() + (extension or '')
+
+    def path(self, key: str) -> Path:
+        """
+        The path function returns the path of a key, files are spread over two levels of directories.
+
+        :param key: str: The key
+        :return: The path of the file
+        :raises ValueError: If the key is not a key of the store
+        """
+        if not KEY_PATTERN.fullmatch(key):
+            raise ValueError(f"Invalid key: {key}")
+
+        return self.root / key[:2] / key[2:4] / key
+
+    def put(self, data: bytes) -> str:
+        """
+        The put function stores the content, unless it is already stored.
+
+        :param data: bytes: The content
+        :return: The key of the content
+        """
+        key = self.key_for(data)
+        path = self.path(key)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, partial = tempfile.mkstemp(dir=path.parent, suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(data)
+                os.replace(partial, path)
+            except BaseException:
+                os.unlink(partial)
+                raise
+
+        return key
+
+    def get(self, key: str) -> bytes:
+        return self.path(key).read_bytes()
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def delete(self, key: str) -> bool:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            return False
+
+        return True
+
+
+class StorageBackend(ABC):
+    """
+    Where the images are stored and how their transformations are produced, chosen with STORAGE_BACKEND
+
+    Images are identified by the public_id returned by upload, the backend applies to every image in the database.
+    """
+
+    @abstractmethod
+    def send(self, file: BinaryIO, public_id: Optional[str] = None) -> dict:
+        """
+        The send function stores an image, blocking, errors are raised.
+
+        :param self: Represent the instance of the object itself
+        :param file: BinaryIO: The validated image file
+        :param public_id: Optional[str]: Set a custom name for the image, if the backend supports it
+        :return: A dictionary with the url, public_id and version of the image
+        """
+
+    @abstractmethod
+    async def upload(self, file: BinaryIO, public_id: Optional[str] = None) -> Optional[dict]:
+        """
+        The upload function stores an image on the upload pool.
+
+        :param self: Represent the instance of the object itself
+        :param file: BinaryIO: The validated image file
+        :param public_id: Optional[str]: Set a custom name for the image, if the backend supports it
+        :return: A dictionary with the url, public_id and version of the image, or None if the image was rejected
+        """
+
+    async def restore(self, file: BinaryIO, public_id: str) -> None:
+        """
+        The restore function stores an uploaded image again if the delete of an image with the same public_id
+        removed it after the upload. It is called under the lock of the public_id, right before the new image is
+        committed. Backends that never give two uploads the same public_id have nothing to restore.
+
+        :param self: Represent the instance of the object itself
+        :param file: BinaryIO: The uploaded image file
+        :param public_id: str: The public_id returned by the upload
+        :return: None
+        """
+
+    @abstractmethod
+    async def delete(self, public_id: str) -> bool:
+        """
+        The delete function removes a stored image, called once no image in the database refers to it.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image
+        :return: True if the image was removed
+        """
+
+    @abstractmethod
+    def url(self, public_id: str, version: Optional[str] = None) -> str:
+        """
+        The url function returns the url of the original image.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image
+        :param version: Optional[str]: The version of the image
+        :return: The url of the image
+        """
+
+    @abstractmethod
+    async def transform(self, public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict] = None,
+                        version: Optional[str] = None) -> dict:
+        """
+        The transform function returns the url of the transformed image, in the format of formatting_image_url.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image
+        :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+        :param version: Optional[str]: The version of the image
+        :return: A dictionary with the url and the transformation parameters (format)
+        :raises ValueError: If the backend can't produce the transformation
+        """
+
+    @abstractmethod
+    def transformation_string(self, transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> str:
+        """
+        The transformation_string function returns the canonical string of a transformation, stored with a format
+        so equal formats of an image are found by it.
+
+        :param self: Represent the instance of the object itself
+        :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+        :return: The transformation string, empty for no transformation
+        """
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Images stored on Cloudinary, transformations are applied by Cloudinary on delivery
+    """
+
+    def send(self, file: BinaryIO, public_id: Optional[str] = None) -> dict:
+        return cloudinary.send_image(file, public_id)
+
+    async def upload(self, file: BinaryIO, public_id: Optional[str] = None) -> Optional[dict]:
+        return await image_uploader.upload(file, public_id)
+
+    async def delete(self, public_id: str) -> bool:
+        return await asyncio.to_thread(cloudinary.remove_image, public_id)
+
+    def url(self, public_id: str, version: Optional[str] = None) -> str:
+        return cloudinary.formatting_image_url(public_id, version=version)['url']
+
+    async def transform(self, public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict] = None,
+                        version: Optional[str] = None) -> dict:
+        return cloudinary.formatting_image_url(public_id, transformation, version)
+
+    def transformation_string(self, transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> str:
+        return cloudinary.transformation_string(transformation)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Images stored in a ContentStore on the local disk and served by GET /media/{key}, transformations are rendered
+    by the local image engine into a DerivativeCache
+
+    Needs no network, which makes it usable for load tests. The public_id of an image is its content key, custom
+    names and versions are ignored, images with the same content share the file. The url of a transformed image
+    carries the transformation and a signature, so an evicted variant is rendered again on request, but only for
+    transformations the api handed out.
+    """
+
+    def __init__(self, store: ContentStore, base_url: str, cache: DerivativeCache, signing_key: str) -> None:
+        self.store = store
+        self.base_url = base_url
+        self.cache = cache
+        self.signing_key = signing_key.encode('utf-8')
+
+    def send(self, file: BinaryIO, public_id: Optional[str] = None) -> dict:
+        key = self.store.put(file.read())
+
+        return {'url': self.url(key), 'public_id': key, 'version': None}
+
+    async def upload(self, file: BinaryIO, public_id: Optional[str] = None) -> Optional[dict]:
+        return await image_uploader.run(self.send, file, public_id)
+
+    async def restore(self, file: BinaryIO, public_id: str) -> None:
+        if not await asyncio.to_thread(self.store.exists, public_id):
+            file.seek(0)
+            await asyncio.to_thread(self.send, file)
+
+    async def delete(self, public_id: str) -> bool:
+        try:
+            removed = await asyncio.to_thread(self.store.delete, public_id)
+        except ValueError:
+            # Not a key of the store, an image uploaded before the backend was switched
+            return False
+
+        await self.cache.discard(public_id)
+
+        return removed
+
+    def url(self, public_id: str, version: Optional[str] = None) -> str:
+        return f"{self.base_url}{public_id}"
+
+    def sign(self, public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict]) -> str:
+        """
+        The sign function returns the signature of a variant, an HMAC of its key.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image
+        :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+        :return: The signature
+        """
+        key = variant_key(public_id, transformation).encode('utf-8')
+
+        return hmac.new(self.signing_key, key, hashlib.sha256).hexdigest()[:16]
+
+    def verify(self, public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict],
+               signature: str) -> bool:
+        return hmac.compare_digest(self.sign(public_id, transformation), signature)
+
+    async def derivative(self, public_id: str,
+                         transformation: Optional[CroppingOrResizingTransformation | dict]) -> Path:
+        """
+        The derivative function returns the file of a transformed image from the cache, rendering it on a miss.
+
+        :param self: Represent the instance of the object itself
+        :param public_id: str: The public_id of the image
+        :param transformation: Optional[CroppingOrResizingTransformation | dict]: The transformation parameters
+        :return: The path of the transformed image
+        :raises ValueError: If the image is not stored locally or the transformation is not supported
+        """
+        options = canonical(transformation)
+
+        async def render() -> bytes:
+            try:
+                data = await asyncio.to_thread(self.store.get, public_id)
+            except FileNotFoundError as e:
+                raise ValueError(f"Image {public_id} is not stored locally") from e
+            return await image_engine.render(data, options)
+
+        return await self.cache.get(public_id, options, render)
+
+    async def transform(self, public_id: str, transformation: Optional[CroppingOrResizingTransformation | dict] = None,
+                        version: Optional[str] = None) -> dict:
+        if isinstance(transformation, CroppingOrResizingTransformation):
+            transformation = transformation.dict()
+
+        options = transformation or {}
+        variant = canonical(options)
+        if not variant:
+            return {'url': self.url(public_id), 'format': options}
+
+        # Rendered ahead, so an unsupported transformation fails here and the first request finds it cached
+        await self.derivative(public_id, variant)
+
+        query = {VARIANT_PARAMS[name]: value for name, value in variant.items()}
+        query['s'] = self.sign(public_id, variant)
+
+        return {'url': f"{self.url(public_id)}?{urlencode(query)}", 'format': options}
+
+    def transformation_string(self, transformation: Optional[CroppingOrResizingTransformation | dict] = None) -> str:
+        # The query parameters of the variant url, without the signature
+        params = [f"{VARIANT_PARAMS[name]}_{value}" for name, value in canonical(transformation).items()]
+
+        return ','.join(sorted(params))
+
+
+media_store = ContentStore(settings.media_dir)
+
+local_storage = LocalStorage(media_store, settings.media_url, derivative_cache, settings.media_signing_key)
+
+storage: StorageBackend = local_storage if settings.storage_backend == "local" else CloudinaryStorage()
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+import cloudinary.exceptions
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.connect import AsyncSessionLocal
+from app.repository import images as repository_images
+from app.repository.tags import TagConflictError
+from app.schemas.image import UploadJobStatus
+from app.services.cache import redis_client
+from app.services.storage import storage
+from app.services.uploads import ImageUploader
+from config import settings
+
+
+# Cloudinary errors that won't go away on retry, the others (network, 5xx, rate limit) are retried
+PERMANENT_ERRORS = (
+    cloudinary.exceptions.BadRequest,
+    cloudinary.exceptions.AuthorizationRequired,
+    cloudinary.exceptions.NotAllowed,
+    cloudinary.exceptions.NotFound,
+    cloudinary.exceptions.AlreadyExists,
+)
+
+UNFINISHED = (UploadJobStatus.queued, UploadJobStatus.processing)
+
+
+def stage_file(file: BinaryIO, staging_dir: Optional[Path] = None) -> Path:
+    """
+    The stage_file function copies an uploaded file to the staging directory, where the worker picks it up.
+    The file is written under a temporary name and renamed, so the worker never sees a partial file.
+
+    :param file: BinaryIO: The validated image file
+    :param staging_dir: Optional[Path]: The staging directory, UPLOAD_STAGING_DIR by default
+    :return: The path of the staged file
+    """
+    staging_dir = staging_dir or settings.upload_staging_dir
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    path = staging_dir / uuid.uuid4().hex
+    partial = path.with_suffix('.part')
+
+    with open(partial, 'wb') as staged:
+        shutil.copyfileobj(file, staged)
+    partial.rename(path)
+
+    return path
+
+
+class UploadJobQueue:
+    """
+    Upload jobs in redis: a list of queued job ids and one hash per job that expires after UPLOAD_JOB_TTL
+
+    A worker moves the ids it takes to its own processing list and removes them when the jobs are finished,
+    so the jobs of a worker that stopped in the middle of a batch are not lost.
+    """
+    QUEUE = "upload-jobs:queue"
+    PROCESSING = "upload-jobs:processing:"
+    WORKERS = "upload-jobs:workers"
+    PREFIX = "upload-job:"
+    redis = redis_client
+
+    @classmethod
+    def key(cls, job_id: str) -> str:
+        return f"{cls.PREFIX}{job_id}"
+
+    @classmethod
+    def processing(cls, worker_id: str) -> str:
+        return f"{cls.PROCESSING}{worker_id}"
+
+    @classmethod
+    async def enqueue(cls, user_id: int, description: str, tags: Optional[list[str]], path: Path) -> str:
+        """
+        The enqueue function stores a new job and puts it at the end of the queue.
+
+        :param cls: Represent the class itself
+        :param user_id: int: Owner of the image
+        :param description: str: Description of the image
+        :param tags: Optional[list[str]]: Tags of the image
+        :param path: Path: The staged file
+        :return: The job id
+        """
+        job_id = uuid.uuid4().hex
+
+        async with cls.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(cls.key(job_id), mapping={
+                'id': job_id,
+                'status': UploadJobStatus.queued.value,
+                'user_id': user_id,
+                'description': description,
+                'tags': json.dumps(tags or []),
+                'path': str(path),
+            })
+            pipe.expire(cls.key(job_id), settings.upload_job_ttl)
+            pipe.lpush(cls.QUEUE, job_id)
+            await pipe.execute()
+
+        return job_id
+
+    @classmethod
+    async def get(cls, job_id: str) -> Optional[dict]:
+        """
+        The get function returns the job, or None if it doesn't exist or has expired.
+
+        :param cls: Represent the class itself
+        :param job_id: str: The job id
+        :return: A dictionary with the fields of the job
+        """
+        job = await cls.redis.hgetall(cls.key(job_id))
+        if not job:
+            return None
+
+        job = {name.decode('utf-8'): value.decode('utf-8') for name, value in job.items()}
+        job['user_id'] = int(job['user_id'])
+        job['tags'] = json.loads(job['tags'])
+        job['image_id'] = int(job['image_id']) if 'image_id' in job else None
+
+        return job
+
+    @classmethod
+    async def update(cls, job_id: str, status: UploadJobStatus, **fields) -> None:
+        """
+        The update function sets the status and other fields of an existing job.
+
+        :param cls: Represent the class itself
+        :param job_id: str: The job id
+        :param status: UploadJobStatus: The new status
+        :param fields: Other fields to set (image_id, detail)
+        :return: None
+        """
+        await cls.redis.hset(cls.key(job_id), mapping={'status': status.value, **fields})
+
+    @classmethod
+    async def take(cls, worker_id: str, count: int, timeout: float = 1.0) -> list[str]:
+        """
+        The take function waits for the next job and moves up to count jobs from the queue to the processing list
+        of the worker.
+
+        :param cls: Represent the class itself
+        :param worker_id: str: The id of the worker
+        :param count: int: Maximum number of jobs
+        :param timeout: float: Seconds to wait for the first job
+        :return: The job ids, oldest first, empty if the queue stayed empty
+        """
+        processing = cls.processing(worker_id)
+
+        first = await cls.redis.blmove(cls.QUEUE, processing, timeout, 'RIGHT', 'LEFT')
+        if first is None:
+            return []
+
+        job_ids = [first]
+        if count > 1:
+            async with cls.redis.pipeline(transaction=False) as pipe:
+                for _ in range(count - 1):
+                    pipe.lmove(cls.QUEUE, processing, 'RIGHT', 'LEFT')
+                job_ids += [job_id for job_id in await pipe.execute() if job_id is not None]
+
+        return [job_id.decode('utf-8') for job_id in job_ids]
+
+    @classmethod
+    async def ack(cls, worker_id: str, job_ids: list[str]) -> None:
+        """
+        The ack function removes finished jobs from the processing list of the worker.
+
+        :param cls: Represent the class itself
+        :param worker_id: str: The id of the worker
+        :param job_ids: list[str]: The finished jobs
+        :return: None
+        """
+        async with cls.redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.lrem(cls.processing(worker_id), 1, job_id)
+            await pipe.execute()
+
+    @classmethod
+    async def requeue(cls, worker_id: str) -> int:
+        """
+        The requeue function puts the jobs left in the processing list of the worker back at the head of the queue,
+        oldest first. It is called when the worker starts, before it takes new jobs.
+
+        :param cls: Represent the class itself
+        :param worker_id: str: The id of the worker
+        :return: The number of requeued jobs
+        """
+        requeued = 0
+        while await cls.redis.lmove(cls.processing(worker_id), cls.QUEUE, 'LEFT', 'RIGHT') is not None:
+            requeued += 1
+
+        return requeued
+
+    @classmethod
+    async def report(cls, worker_id: str, stats: dict) -> None:
+        """
+        The report function stores the counters of the upload pool of a worker, the api serves them from /stats.
+
+        :param cls: Represent the class itself
+        :param worker_id: str: The id of the worker
+        :param stats: dict: The counters, as returned by BoundedExecutor.stats
+        :return: None
+        """
+        await cls.redis.hset(cls.WORKERS, worker_id, json.dumps({**stats, 'reported_at': int(time.time())}))
+
+    @classmethod
+    async def workers(cls) -> dict:
+        """
+        The workers function returns the last reported counters of every worker.
+
+        :param cls: Represent the class itself
+        :return: A dictionary of the counters by worker id
+        """
+        return {worker_id.decode('utf-8'): json.loads(stats)
+                for worker_id, stats in (await cls.redis.hgetall(cls.WORKERS)).items()}
+
+
+class UploadWorker:
+    """
+    Takes upload jobs in batches, sends the files to Cloudinary concurrently and creates the images of a batch
+    in one transaction
+
+    Runs in its own process, started from the project root with `python -m app.services.upload_jobs`.
+    The staging directory has to be shared with the api. Jobs are delivered at least once, a requeued job that
+    was already finished is skipped.
+    """
+
+    def __init__(self,
+                 uploader: Callable[[BinaryIO], dict] = storage.send,
+                 session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+                 batch_size: int = settings.upload_job_batch_size,
+                 retries: int = settings.upload_job_retries,
+                 retry_delay: float = settings.upload_job_retry_delay,
+                 worker_id: str = settings.upload_worker_id,
+                 executor: Optional[ImageUploader] = None) -> None:
+        """
+        The __init__ function sets the worker parameters.
+
+        :param self: Represent the instance of the object itself
+        :param uploader: Callable[[BinaryIO], dict]: Stores a file like StorageBackend.send, raising on errors
+        :param session_factory: Callable[[], AsyncSession]: Creates database sessions
+        :param batch_size: int: Maximum number of jobs processed together
+        :param retries: int: Number of retries of a transient upload error
+        :param retry_delay: float: Delay before the first retry in seconds, doubled on every retry
+        :param worker_id: str: The id of the processing list of the worker, unique among the running workers
+        :param executor: Optional[ImageUploader]: The pool the files are sent on, by default UPLOAD_JOB_WORKERS threads
+            with room for a whole batch, so an upload of the worker is never rejected
+        :return: Nothing
+        """
+        self.uploader = uploader
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.worker_id = worker_id
+        self.executor = executor or ImageUploader(workers=settings.upload_job_workers, max_queue=batch_size)
+
+    async def run(self) -> None:
+        """
+        The run function puts back the jobs left by the previous run of the worker, then processes jobs until
+        it is cancelled. The counters of the upload pool are reported after every batch.
+
+        :param self: Represent the instance of the object itself
+        :return: None
+        """
+        requeued = False
+        try:
+            while True:
+                try:
+                    if not requeued:
+                        await UploadJobQueue.requeue(self.worker_id)
+                        requeued = True
+
+                    job_ids = await UploadJobQueue.take(self.worker_id, self.batch_size)
+                    jobs = [await UploadJobQueue.get(job_id) for job_id in job_ids]
+                    # Expired jobs and jobs finished before a restart are only acknowledged
+                    jobs = [job for job in jobs if job is not None and job['status'] in UNFINISHED]
+                    if jobs:
+                        await self.process(jobs)
+                    await UploadJobQueue.ack(self.worker_id, job_ids)
+                    if job_ids:
+                        await UploadJobQueue.report(self.worker_id, self.executor.stats())
+                except RedisError as e:
+                    print(e)
+                    await asyncio.sleep(1)
+        finally:
+            self.executor.shutdown()
+
+    async def process(self, jobs: list[dict]) -> None:
+        """
+        The process function uploads the files of a batch of jobs and creates their images.
+
+        :param self: Represent the instance of the object itself
+        :param jobs: list[dict]: The jobs, as returned by UploadJobQueue.get
+        :return: None
+        """
+        for job in jobs:
+            await UploadJobQueue.update(job['id'], UploadJobStatus.processing)
+
+        results = await asyncio.gather(*(self.upload(job) for job in jobs))
+        uploaded = [(job, result) for job, result in zip(jobs, results) if result is not None]
+
+        if uploaded:
+            await self.save(uploaded)
+
+        for job in jobs:
+            Path(job['path']).unlink(missing_ok=True)
+
+    async def upload(self, job: dict) -> Optional[dict]:
+        """
+        The upload function sends the staged file of a job, retrying transient errors with exponential backoff.
+        The job is marked as failed if the file is rejected or the retries run out.
+
+        :param self: Represent the instance of the object itself
+        :param job: dict: The job
+        :return: The result of the uploader, or None if the upload failed
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with open(job['path'], 'rb') as file:
+                    return await self.executor.run(self.uploader, file)
+            except PERMANENT_ERRORS as e:
+                print(e)
+                await UploadJobQueue.update(job['id'], UploadJobStatus.failed, detail="Invalid image file")
+                return None
+            except (cloudinary.exceptions.Error, OSError) as e:
+                print(e)
+                if attempt < self.retries:
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+        await UploadJobQueue.update(job['id'], UploadJobStatus.failed, detail="Upload failed, try again later")
+
+    async def save(self, uploaded: list[tuple[dict, dict]]) -> None:
+        """
+        The save function creates the images of the uploaded jobs with a single commit. If the batch fails,
+        the images are created one by one, so one bad job doesn't fail the others.
+
+        :param self: Represent the instance of the object itself
+        :param uploaded: list[tuple[dict, dict]]: The jobs with the results of their uploads
+        :return: None
+        """
+        async with self.session_factory() as db:
+            try:
+                images = [
+                    await repository_images.create_image(job['user_id'], job['description'], job['tags'],
+                                                         result['public_id'], db, commit=False)
+                    for job, result in uploaded
+                ]
+                for job, result in uploaded:
+                    await self.restore(job, result)
+                image_ids = [image.id for image in images]
+                await db.commit()
+            except (SQLAlchemyError, TagConflictError, OSError) as e:
+                print(e)
+                await db.rollback()
+                image_ids = None
+
+        if image_ids is None:
+            image_ids = [await self.save_one(job, result) for job, result in uploaded]
+
+        for (job, _), image_id in zip(uploaded, image_ids):
+            if image_id is not None:
+                await UploadJobQueue.update(job['id'], UploadJobStatus.done, image_id=image_id)
+
+    @staticmethod
+    async def restore(job: dict, result: dict) -> None:
+        """
+        The restore function stores the file of a job again if the delete of an image with the same content
+        removed it since the upload, the images of the batch are not committed yet.
+
+        :param job: dict: The job
+        :param result: dict: The result of the upload
+        :return: None
+        """
+        with open(job['path'], 'rb') as file:
+            await storage.restore(file, result['public_id'])
+
+    async def save_one(self, job: dict, result: dict) -> Optional[int]:
+        async with self.session_factory() as db:
+            try:
+                image = await repository_images.create_image(job['user_id'], job['description'], job['tags'],
+                                                             result['public_id'], db, commit=False)
+                await self.restore(job, result)
+                image_id = image.id
+                await db.commit()
+                return image_id
+            except (SQLAlchemyError, TagConflictError, OSError) as e:
+                print(e)
+                await UploadJobQueue.update(job['id'], UploadJobStatus.failed, detail="Image could not be saved")
+
+
+if __name__ == '__main__':
+    asyncio.run(UploadWorker().run())
@@ -0,0 +1,160 @@
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services import cloudinary
+from app.services.executors import BoundedExecutor
+from config import settings
+
+
+SNIFF_SIZE = 32
+CHUNK_SIZE = 64 * 1024
+# Room for the boundaries and the other fields of an upload form (description, tags)
+FORM_OVERHEAD = 64 * 1024
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+)
+ISO_MEDIA_BRANDS = {
+    b'avif': 'image/avif', b'avis': 'image/avif',
+    b'heic': 'image/heic', b'heix': 'image/heic', b'mif1': 'image/heic',
+}
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    The sniff_image_type function detects the image format from the magic bytes at the start of the file,
+    the content type sent by the client is not trusted.
+
+    :param header: bytes: The first SNIFF_SIZE bytes of the file
+    :return: The mime type of the image, or None if the file is not an image format Cloudinary accepts
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[4:8] == b'ftyp':
+        return ISO_MEDIA_BRANDS.get(header[8:12])
+
+    return None
+
+
+async def validate_image(file: UploadFile, max_size: int = settings.upload_max_size) -> str:
+    """
+    The validate_image function checks the size and the magic bytes of an uploaded file before it is sent anywhere
+    and rewinds the file for the upload.
+
+    :param file: UploadFile: The uploaded file
+    :param max_size: int: Maximum size of the file in bytes
+    :return: The mime type of the image
+    :raises HTTPException: 413 if the file is too large, 422 if it is not an image
+    """
+    header = await file.read(SNIFF_SIZE)
+    size = file.size
+
+    if size is None:
+        size = len(header)
+        while size <= max_size and (chunk := await file.read(CHUNK_SIZE)):
+            size += len(chunk)
+
+    if size > max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+
+    mime_type = sniff_image_type(header)
+    if mime_type is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid image file")
+
+    await file.seek(0)
+
+    return mime_type
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware that stops multipart request bodies larger than the limit while they are received
+
+    FastAPI parses the whole form into temporary files before the route runs, so without the limit a client could
+    make a worker spool any amount of data to disk. Requests announcing a larger Content-Length are rejected
+    right away, the others are counted chunk by chunk.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int = settings.upload_max_size + FORM_OVERHEAD) -> None:
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not self._is_multipart(scope):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope['headers']).get(b'content-length', b'')
+        if content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse({"detail": "File is too large"},
+                                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_body_size:
+                    # FastAPI passes HTTPException raised while parsing the body through to the exception handler
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail="File is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    def _is_multipart(scope: Scope) -> bool:
+        return dict(scope['headers']).get(b'content-type', b'').startswith(b'multipart/form-data')
+
+
+class ImageUploader(BoundedExecutor):
+    """
+    Sends images to Cloudinary on a dedicated bounded thread pool
+
+    An upload blocks a thread for the whole Cloudinary round trip, on the default executor a burst of large uploads
+    would starve every other run_in_executor user.
+    """
+    thread_name_prefix = "image-upload"
+    busy_detail = "Too many uploads, try again later"
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        """
+        The __init__ function sets the pool parameters, the pool itself is created on first use.
+
+        :param self: Represent the instance of the object itself
+        :param workers: int: Number of uploads sent at the same time
+        :param max_queue: int: Number of uploads allowed to wait for a free worker
+        :return: Nothing
+        """
+        super().__init__("thread", workers, max_queue)
+
+    async def upload(self, file: BinaryIO, public_id: Optional[str] = None) -> Optional[dict]:
+        """
+        The upload function uploads the file to Cloudinary without blocking the event loop.
+
+        :param self: Represent the instance of the object itself
+        :param file: BinaryIO: The validated image file
+        :param public_id: Optional[str]: Set a custom name for the image
+        :return: The result of cloudinary.upload_image
+        """
+        return await self.run(cloudinary.upload_image, file, public_id)
+
+
+image_uploader = ImageUploader(workers=settings.upload_workers, max_queue=settings.upload_max_queue)
@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional, Any
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import Select, tuple_
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Cursor(NamedTuple):
+    """
+    Position after the last row of a page in the (created_at, id) order of a listing
+    """
+    created_at: datetime
+    id: int
+
+
+def encode_cursor(created_at: datetime, id_: int) -> str:
+    """
+    The encode_cursor function packs the position of a row into an opaque url safe string.
+
+    :param created_at: datetime: Creation time of the last row of the page
+    :param id_: int: Id of the last row of the page
+    :return: The cursor string
+    """
+    data = json.dumps([created_at.isoformat(), id_], separators=(',', ':')).encode('utf-8')
+
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    The decode_cursor function restores the position encoded by encode_cursor.
+
+    :param cursor: str: The cursor string
+    :return: The decoded cursor
+    :raises ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        created_at, id_ = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return Cursor(datetime.fromisoformat(created_at), int(id_))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def get_cursor(
+        cursor: Optional[str] = Query(
+            default=None, max_length=200,
+            description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page, skip is ignored if provided"
+        )
+) -> Optional[Cursor]:
+    """
+    The get_cursor function is a dependency that decodes the cursor query parameter.
+
+    :param cursor: Optional[str]: The cursor of the next page
+    :return: The decoded cursor or None for offset pagination
+    """
+    if cursor is None:
+        return None
+
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def paginate(query: Select, model: Any, skip: int, limit: int, cursor: Optional[Cursor] = None) -> Select:
+    """
+    The paginate function orders the query by (created_at, id) and selects one page of it.
+    With a cursor the page starts right after the cursor row (keyset pagination), so deep pages cost the same as the
+    first one thanks to the (created_at, id) index; without a cursor the first skip rows are skipped (OFFSET).
+
+    :param query: Select: The filtered query
+    :param model: Any: Model with the created_at and id columns
+    :param skip: int: Number of rows to skip, ignored if a cursor is provided
+    :param limit: int: Number of rows of the page
+    :param cursor: Optional[Cursor]: Position after the last row of the previous page
+    :return: The query of the page
+    """
+    query = query.order_by(model.created_at, model.id).limit(limit)
+
+    if cursor is not None:
+        return query.filter(tuple_(model.created_at, model.id) > tuple_(cursor.created_at, cursor.id))
+
+    return query.offset(skip)
+
+
+def next_cursor(items: list, limit: int) -> Optional[str]:
+    """
+    The next_cursor function returns the cursor of the page after the given one.
+
+    :param items: list: Rows of the page, ordered by paginate
+    :param limit: int: Number of rows requested
+    :return: The cursor string, or None if the page is the last one
+    """
+    if not items or len(items) < limit:
+        return None
+
+    return encode_cursor(items[-1].created_at, items[-1].id)
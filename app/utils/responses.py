@@ -0,0 +1,101 @@
+import re
+import zipfile
+from typing import Iterable, Iterator, Optional
+
+from starlette.responses import FileResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    The etag_matches function checks an If-None-Match header against the ETag of a response with the weak comparison
+    of RFC 9110: the header is a list of entity tags, W/ prefixes are ignored and * matches any ETag.
+
+    :param if_none_match: Optional[str]: The If-None-Match header of the request
+    :param etag: str: The ETag of the response
+    :return: True if the client has the response already
+    """
+    etag = etag.removeprefix('W/')
+
+    return any(tag == '*' or tag.removeprefix('W/') == etag for tag in ENTITY_TAG.findall(if_none_match or ''))
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    File response that lets the server send the file with sendfile when it supports one of the ASGI extensions
+    for it (http.response.pathsend or http.response.zerocopy), and streams it in chunks otherwise
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get('extensions') or {}
+
+        if self.send_header_only or self.stat_result is None or not (
+                'http.response.pathsend' in extensions or 'http.response.zerocopy' in extensions):
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if 'http.response.pathsend' in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            with open(self.path, 'rb') as file:
+                await send({"type": "http.response.zerocopy", "file": file, "count": self.stat_result.st_size})
+
+        if self.background is not None:
+            await self.background()
+
+
+class _ChunkWriter:
+    """
+    Write only file that collects what zipfile writes. It can't seek, so zipfile writes the sizes of every member
+    after its data and the archive can be sent while it is built.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_chunks(files: Iterable[tuple[str, bytes]], compression: int = zipfile.ZIP_STORED) -> Iterator[bytes]:
+    """
+    The zip_chunks function builds a zip archive of the files and yields it member by member.
+
+    :param files: Iterable[tuple[str, bytes]]: Names and contents of the members
+    :param compression: int: The zipfile compression method, compressed images are stored as they are by default
+    :return: The chunks of the archive
+    """
+    writer = _ChunkWriter()
+
+    with zipfile.ZipFile(writer, 'w', compression=compression) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield writer.take()
+
+    yield writer.take()
+
+
+class ZipStreamResponse(StreamingResponse):
+    """
+    Zip archive sent member by member while it is built, the members are written in a worker thread
+    """
+
+    def __init__(self, files: Iterable[tuple[str, bytes]], filename: str, compression: int = zipfile.ZIP_STORED,
+                 headers: Optional[dict] = None) -> None:
+        headers = {**(headers or {}), "Content-Disposition": f'attachment; filename="{filename}"'}
+
+        super().__init__(zip_chunks(files, compression), headers=headers, media_type="application/zip")
@@ -1,6 +1,8 @@
+import socket
 from dataclasses import dataclass
 from pathlib import Path
 from ipaddress import ip_address
+from typing import Literal
 
 from pydantic import BaseSettings, EmailStr
 from fastapi.templating import Jinja2Templates
@@ -31,6 +33,9 @@ class Settings(BaseSettings):
 
     secret_key_jwt: str = "secret_key_jwt"
     algorithm: str = "HS256"
+    auth_stateless_tokens: bool = False
+    jwt_cache_size: int = 10_000
+    jwt_cache_ttl: int = 900
 
     mail_username: EmailStr
     mail_password: str
@@ -43,10 +48,49 @@ class Settings(BaseSettings):
     redis_port: int
     redis_password: str
 
+    principal_cache_size: int = 10_000
+    principal_cache_ttl: int = 30
+
+    revocation_bloom_filter: bool = False
+    revocation_bloom_capacity: int = 100_000
+    revocation_bloom_error_rate: float = 0.001
+    revocation_bloom_rebuild_interval: int = 3600
+
+    password_hash_executor: Literal["thread", "process"] = "thread"
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+
+    tag_cache_size: int = 10_000
+    tag_cache_ttl: int = 3600
+
     cloudinary_name: str
     cloudinary_api_key: int
     cloudinary_api_secret: str
     cloudinary_folder: str = "media"
+    cloudinary_url_cache_size: int = 4096
+
+    upload_max_size: int = 10_485_760
+    upload_workers: int = 4
+    upload_max_queue: int = 16
+    upload_staging_dir: Path = BASE_DIR / 'staging'
+    upload_job_ttl: int = 86400
+    upload_job_batch_size: int = 10
+    upload_job_retries: int = 3
+    upload_job_retry_delay: float = 1.0
+    upload_job_workers: int = 4
+    upload_worker_id: str = socket.gethostname()
+
+    storage_backend: Literal["cloudinary", "local"] = "cloudinary"
+    media_dir: Path = BASE_DIR / 'media'
+    media_url: str = "/media/"
+    image_engine_workers: int = 2
+    image_engine_max_queue: int = 16
+    media_signing_key: str = "media_signing_key"
+    derivative_cache_dir: Path = BASE_DIR / 'derivatives'
+    derivative_cache_max_bytes: int = 536_870_912
+    qr_code_workers: int = 2
+    qr_code_max_queue: int = 32
+    qr_code_cache_ttl: int = 86400
 
     class Config:
         env_file = BASE_DIR / '.env'
@@ -1,3 +1,4 @@
+import asyncio
 from ipaddress import ip_address
 from typing import Callable
 
@@ -11,7 +12,15 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.database.connect import get_db
-from app.routes import router
+from app.repository.tags import TagConflictError
+from app.routes import router, media
+from app.services.cache import PrincipalCache
+from app.services.imaging import image_engine
+from app.services.passwords import password_hasher
+from app.services.qr_code import qr_code_generator
+from app.services.revocation import RevocationStore
+from app.services.uploads import UploadSizeLimit, image_uploader
+from app.utils.pagination import NEXT_CURSOR_HEADER
 from config import (
     settings,
     PROJECT_NAME,
@@ -37,12 +46,15 @@ def get_application():
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
+    app.add_middleware(UploadSizeLimit)
 
     return app
 
 
 app = get_application()
+background_tasks: set[asyncio.Task] = set()
 
 
 @app.middleware("http")
@@ -62,6 +74,18 @@ async def ban_ips(request: Request, call_next: Callable):
     return response
 
 
+@app.exception_handler(TagConflictError)
+async def tag_conflict_handler(request: Request, exc: TagConflictError):
+    """
+    The tag_conflict_handler function answers 409 when the tags of a request were removed while they were added.
+
+    :param request: Request: The request that failed
+    :param exc: TagConflictError: The error
+    :return: A JSONResponse with status code 409
+    """
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": str(exc)})
+
+
 @app.on_event("startup")
 async def startup():
     """
@@ -75,6 +99,30 @@ async def startup():
                           db=0, encoding="utf-8", decode_responses=True)
     )
 
+    background_tasks.add(asyncio.create_task(PrincipalCache.listen()))
+    if settings.revocation_bloom_filter:
+        background_tasks.add(asyncio.create_task(RevocationStore.listen()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It cancels the background tasks started by the startup function and stops the worker pools.
+
+    :return: None
+    """
+    for task in background_tasks:
+        task.cancel()
+
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+    password_hasher.shutdown()
+    image_uploader.shutdown()
+    image_engine.shutdown()
+    qr_code_generator.shutdown()
+
 
 @app.get("/", name="Images app team_3_project")
 def read_root():
@@ -113,6 +161,8 @@ async def healthchecker(db: Session = Depends(get_db)):
 
 
 app.include_router(router, prefix=API_PREFIX)
+# Served without the api prefix, media urls are MEDIA_URL + key
+app.include_router(media.router)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,53 @@
+"""Association and foreign key indexes
+
+Revision ID: 4d8a6c2e9f15
+Revises: b71e04c5d9a2
+Create Date: 2026-10-18 14:22:10.671388
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d8a6c2e9f15'
+down_revision = 'b71e04c5d9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # image_m2m_tag: the (image_id, tag_id) pair becomes the primary key, duplicated and dangling rows are dropped
+    op.execute("DELETE FROM image_m2m_tag WHERE image_id IS NULL OR tag_id IS NULL")
+    op.execute(
+        "DELETE FROM image_m2m_tag a USING image_m2m_tag b "
+        "WHERE a.image_id = b.image_id AND a.tag_id = b.tag_id AND a.id > b.id"
+    )
+    op.drop_constraint('image_m2m_tag_pkey', 'image_m2m_tag', type_='primary')
+    op.drop_column('image_m2m_tag', 'id')
+    op.create_primary_key('image_m2m_tag_pkey', 'image_m2m_tag', ['image_id', 'tag_id'])
+    op.create_index('ix_image_m2m_tag_tag_id_image_id', 'image_m2m_tag', ['tag_id', 'image_id'], unique=False)
+
+    op.create_index(op.f('ix_images_user_id'), 'images', ['user_id'], unique=False)
+    op.create_index(op.f('ix_image_comments_image_id'), 'image_comments', ['image_id'], unique=False)
+    op.create_index(op.f('ix_image_comments_user_id'), 'image_comments', ['user_id'], unique=False)
+    op.create_index(op.f('ix_image_ratings_image_id'), 'image_ratings', ['image_id'], unique=False)
+
+    # Never used by a query: comments are not searched by their full text, and the primary key is indexed already
+    op.drop_index('ix_image_comments_data', table_name='image_comments')
+    op.drop_index('ix_image_formats_id', table_name='image_formats')
+
+
+def downgrade() -> None:
+    op.create_index('ix_image_formats_id', 'image_formats', ['id'], unique=False)
+    op.create_index('ix_image_comments_data', 'image_comments', ['data'], unique=False)
+
+    op.drop_index(op.f('ix_image_ratings_image_id'), table_name='image_ratings')
+    op.drop_index(op.f('ix_image_comments_user_id'), table_name='image_comments')
+    op.drop_index(op.f('ix_image_comments_image_id'), table_name='image_comments')
+    op.drop_index(op.f('ix_images_user_id'), table_name='images')
+
+    op.drop_index('ix_image_m2m_tag_tag_id_image_id', table_name='image_m2m_tag')
+    op.drop_constraint('image_m2m_tag_pkey', 'image_m2m_tag', type_='primary')
+    op.execute("ALTER TABLE image_m2m_tag ADD COLUMN id SERIAL")
+    op.create_primary_key('image_m2m_tag_pkey', 'image_m2m_tag', ['id'])
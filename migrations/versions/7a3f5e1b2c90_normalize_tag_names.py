@@ -0,0 +1,41 @@
+"""Normalize tag names
+
+Revision ID: 7a3f5e1b2c90
+Revises: e25c7b0a4f68
+Create Date: 2026-10-18 17:31:12.480917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3f5e1b2c90'
+down_revision = 'e25c7b0a4f68'
+branch_labels = None
+depends_on = None
+
+
+NORMALIZED_NAME = "lower(regexp_replace(btrim(name), '\\s+', ' ', 'g'))"
+
+
+def upgrade() -> None:
+    # Tags that only differ by case or spaces are merged into the oldest one before the names are normalized
+    op.execute(f"""
+        CREATE TEMPORARY TABLE tag_merge ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY {NORMALIZED_NAME}) AS target_id FROM tags
+    """)
+    op.execute("DELETE FROM tag_merge WHERE id = target_id")
+    op.execute("""
+        INSERT INTO image_m2m_tag (image_id, tag_id)
+        SELECT image_m2m_tag.image_id, tag_merge.target_id
+        FROM image_m2m_tag JOIN tag_merge ON tag_merge.id = image_m2m_tag.tag_id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("DELETE FROM tags WHERE id IN (SELECT id FROM tag_merge)")
+    op.execute(f"UPDATE tags SET name = {NORMALIZED_NAME} WHERE name <> {NORMALIZED_NAME}")
+
+
+def downgrade() -> None:
+    # Merged tags and the original spelling of the names can't be restored
+    pass
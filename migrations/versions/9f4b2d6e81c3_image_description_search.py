@@ -0,0 +1,32 @@
+"""Image description search
+
+Revision ID: 9f4b2d6e81c3
+Revises: 3c5e9a1f0b27
+Create Date: 2026-10-18 11:40:27.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4b2d6e81c3'
+down_revision = '3c5e9a1f0b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The stored generated column rewrites the images table, run it in a maintenance window on large tables
+    op.add_column('images', sa.Column(
+        'description_search', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', description)", persisted=True), nullable=True
+    ))
+    op.create_index('ix_images_description_search', 'images', ['description_search'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_images_description_search', table_name='images', postgresql_using='gin')
+    op.drop_column('images', 'description_search')
@@ -0,0 +1,27 @@
+"""Tag name trigram index
+
+Revision ID: b71e04c5d9a2
+Revises: 9f4b2d6e81c3
+Create Date: 2026-10-18 13:05:51.227403
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e04c5d9a2'
+down_revision = '9f4b2d6e81c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_tags_name_trgm', 'tags', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    # The extension is kept, other objects may depend on it
+    op.drop_index('ix_tags_name_trgm', table_name='tags', postgresql_using='gin')
@@ -0,0 +1,70 @@
+"""Image format urls
+
+Revision ID: c8e1f4a7b3d6
+Revises: 7a3f5e1b2c90
+Create Date: 2026-10-18 18:42:07.319254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1f4a7b3d6'
+down_revision = '7a3f5e1b2c90'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+# A frozen copy of the Cloudinary url building at this revision, the application code may change after it
+TRANSFORMATION_PARAMS = {'crop': 'c', 'gravity': 'g', 'height': 'h', 'width': 'w'}
+
+
+def transformation_string(format_: dict) -> str:
+    params = [f"{TRANSFORMATION_PARAMS[name]}_{value}" for name, value in (format_ or {}).items()
+              if value is not None and name in TRANSFORMATION_PARAMS]
+
+    return ','.join(sorted(params))
+
+
+def delivery_url(public_id: str, transformation: str) -> str:
+    parts = [f"https://res.cloudinary.com/{settings.cloudinary_name}/image/upload"]
+    if transformation:
+        parts.append(transformation)
+    if '/' in public_id:
+        parts.append('v1')
+    parts.append(public_id)
+
+    return '/'.join(parts)
+
+
+def upgrade() -> None:
+    op.add_column('image_formats', sa.Column('transformation', sa.String(length=255), server_default='',
+                                             nullable=False))
+    op.add_column('image_formats', sa.Column('url', sa.String(length=1024), nullable=True))
+
+    # Every image was stored on Cloudinary at this revision, the urls are built locally without calls to it
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("""
+        SELECT image_formats.id, image_formats.format, images.public_id
+        FROM image_formats JOIN images ON images.id = image_formats.image_id
+    """))
+    update = sa.text("UPDATE image_formats SET url = :url, transformation = :transformation WHERE id = :id")
+
+    while batch := rows.fetchmany(BATCH_SIZE):
+        params = []
+        for id_, format_, public_id in batch:
+            transformation = transformation_string(format_)
+            params.append({'id': id_, 'url': delivery_url(public_id, transformation), 'transformation': transformation})
+        connection.execute(update, params)
+
+    op.alter_column('image_formats', 'url', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('image_formats', 'url')
+    op.drop_column('image_formats', 'transformation')
@@ -0,0 +1,55 @@
+"""Image rating aggregates
+
+Revision ID: e25c7b0a4f68
+Revises: 4d8a6c2e9f15
+Create Date: 2026-10-18 15:48:36.204571
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e25c7b0a4f68'
+down_revision = '4d8a6c2e9f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('images', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION image_ratings_aggregates() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE images SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE id = OLD.image_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE images SET rating_count = rating_count + 1, rating_sum = rating_sum + NEW.rating
+                WHERE id = NEW.image_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER image_ratings_aggregates
+        AFTER INSERT OR DELETE OR UPDATE OF rating, image_id ON image_ratings
+        FOR EACH ROW EXECUTE FUNCTION image_ratings_aggregates()
+    """)
+
+    op.execute("""
+        UPDATE images SET rating_count = aggregates.count, rating_sum = aggregates.sum
+        FROM (SELECT image_id, count(*) AS count, sum(rating) AS sum FROM image_ratings GROUP BY image_id) AS aggregates
+        WHERE images.id = aggregates.image_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER image_ratings_aggregates ON image_ratings")
+    op.execute("DROP FUNCTION image_ratings_aggregates()")
+    op.drop_column('images', 'rating_sum')
+    op.drop_column('images', 'rating_count')
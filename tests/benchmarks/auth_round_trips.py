@@ -0,0 +1,101 @@
+"""
+Microbenchmark of the authentication dependency: redis round trips and time per authenticated request.
+
+Redis and the database are replaced by in-memory fakes that count calls, so the numbers show the work done by
+AuthService.get_current_user itself. Run from the project root:
+
+    python tests/benchmarks/auth_round_trips.py
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.database.models import User, UserRole  # noqa: E402
+from app.services.auth import AuthService  # noqa: E402
+from app.services.cache import UserCache, PrincipalCache  # noqa: E402
+from app.services.revocation import RevocationStore  # noqa: E402
+
+
+class CountingRedis:
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    async def get(self, name):
+        self.round_trips += 1
+        return self.data.get(name)
+
+    async def mget(self, *names):
+        self.round_trips += 1
+        return [self.data.get(name) for name in names]
+
+    async def set(self, name, value, ex=None):
+        self.round_trips += 1
+        self.data[name] = value
+
+    async def publish(self, channel, message):
+        self.round_trips += 1
+
+
+USER = User(id=1, username="username", email="email@example.com", first_name="Test", last_name="User",
+            avatar=None, role=UserRole.user, email_verified=True, is_active=True,
+            created_at=datetime(2023, 4, 1, 12, 30), updated_at=None)
+
+
+class CountingDB:
+    def __init__(self):
+        self.queries = 0
+
+    async def get_user_by_email(self, email, db):
+        self.queries += 1
+        return USER
+
+
+async def measure(name: str, requests: int, reset) -> None:
+    redis, db = CountingRedis(), CountingDB()
+    token = await AuthService.create_access_token({"sub": USER.email})
+
+    with patch.object(AuthService, 'redis', redis), patch.object(UserCache, 'redis', redis), \
+            patch.object(PrincipalCache, 'redis', redis), patch.object(RevocationStore, 'redis', redis), \
+            patch('app.services.auth.repository_users.get_user_by_email', db.get_user_by_email):
+        PrincipalCache.local.clear()
+        await AuthService.get_current_user(token, None)
+
+        redis.round_trips = db.queries = 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            reset(redis)
+            await AuthService.get_current_user(token, None)
+        elapsed = time.perf_counter() - start
+
+    print(f"{name:<32} {redis.round_trips / requests:>12.2f} {db.queries / requests:>10.2f} "
+          f"{elapsed / requests * 1e6:>10.1f}")
+
+
+def cold(redis):
+    PrincipalCache.local.clear()
+    redis.data.clear()
+
+
+def redis_hit(redis):
+    PrincipalCache.local.clear()
+
+
+def principal_hit(redis):
+    pass
+
+
+async def main(requests: int = 10_000) -> None:
+    print(f"{'scenario':<32} {'round trips':>12} {'db queries':>10} {'us/req':>10}")
+    await measure("cold (db + write back)", requests, cold)
+    await measure("redis user cache hit", requests, redis_hit)
+    await measure("in-process principal hit", requests, principal_hit)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
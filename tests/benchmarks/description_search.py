@@ -0,0 +1,85 @@
+"""
+Benchmark of the description filter of the image listing: LIKE substring scan against the full text modes.
+
+The images table (with its generated search column and indexes) is copied into a scratch schema and seeded with
+random descriptions, then every mode of repository.images.get_images is timed against it. Needs the migrated
+database of DB_URL, the public tables are not modified. Run from the project root:
+
+    python tests/benchmarks/description_search.py [rows]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+
+from app.repository.images import get_images  # noqa: E402
+from app.schemas.image import DescriptionMatch  # noqa: E402
+from config import settings  # noqa: E402
+
+
+SCHEMA = "bench_description_search"
+WORDS = [
+    "sunset", "mountain", "river", "forest", "city", "night", "street", "portrait", "winter", "summer", "beach",
+    "ocean", "bridge", "castle", "garden", "flower", "autumn", "snow", "lake", "cloud", "storm", "desert", "road",
+    "train", "market", "coffee", "window", "shadow", "light", "reflection", "harbour", "village", "valley",
+]
+SEARCHES = [
+    (DescriptionMatch.substring, "mountain river"),
+    (DescriptionMatch.words, "mountain river"),
+    (DescriptionMatch.prefix, "mount riv"),
+    (DescriptionMatch.phrase, "mountain river"),
+]
+
+
+async def seed(session: AsyncSession, rows: int) -> None:
+    await session.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    await session.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    await session.execute(text(f"CREATE TABLE {SCHEMA}.images (LIKE public.images INCLUDING ALL)"))
+    await session.execute(text(f"""
+        INSERT INTO {SCHEMA}.images (public_id, description, created_at, user_id)
+        SELECT 'bench-' || g,
+               array_to_string(ARRAY(
+                   SELECT (:words)[1 + floor(random() * :count)::int] FROM generate_series(1, 12) WHERE g > 0
+               ), ' '),
+               now() - g * interval '1 second',
+               1
+        FROM generate_series(1, :rows) AS g
+    """), {"words": WORDS, "count": len(WORDS), "rows": rows})
+    await session.execute(text(f"ANALYZE {SCHEMA}.images"))
+    await session.commit()
+
+
+async def main(rows: int = 1_000_000, repeat: int = 20) -> None:
+    engine = create_async_engine(settings.db_url)
+
+    async with AsyncSession(engine) as session:
+        start = time.perf_counter()
+        await seed(session, rows)
+        print(f"seeded {rows} images in {time.perf_counter() - start:.1f} s\n")
+
+        await session.execute(text(f"SET search_path TO {SCHEMA}, public"))
+
+        print(f"{'match':<10} {'search':<16} {'results':>8} {'ms/query':>10}")
+        for match, search in SEARCHES:
+            images = await get_images(0, 10, search, None, None, None, session, match=match)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                await get_images(0, 10, search, None, None, None, session, match=match)
+            elapsed = time.perf_counter() - start
+
+            print(f"{match:<10} {search:<16} {len(images):>8} {elapsed / repeat * 1000:>10.1f}")
+
+        await session.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        await session.commit()
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:2])))
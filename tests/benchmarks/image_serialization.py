@@ -0,0 +1,71 @@
+"""
+Benchmark of the serialization of an image listing page: ImagePublic and FormattedImagePublic objects built from
+ORM rows. Image urls are built with the Cloudinary url cache cold (every url built, as before the cache) and warm,
+formatted image urls are read from the stored column.
+
+No database or network is needed, Cloudinary urls are built locally. Run from the project root:
+
+    python tests/benchmarks/image_serialization.py
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.database.models import Image, ImageFormat, Tag  # noqa: E402
+from app.schemas.image import ImagePublic  # noqa: E402
+from app.schemas.image_formats import FormattedImagePublic  # noqa: E402
+from app.services.cloudinary import _build_url, formatting_image_url, transformation_string  # noqa: E402
+
+
+def page(size: int) -> list[Image]:
+    tags = [Tag(id=i, name=f"tag{i}", created_at=datetime(2023, 4, 1)) for i in range(5)]
+
+    return [
+        Image(id=i, public_id=f"media/{i:032x}", description="Image description", user_id=1, tags=tags,
+              rating_count=0, rating_sum=0, created_at=datetime(2023, 4, 1))
+        for i in range(size)
+    ]
+
+
+def formats(size: int) -> list[ImageFormat]:
+    result = []
+    for i in range(size):
+        format_ = {"width": 250, "height": 250, "crop": "fill", "gravity": "center"}
+        result.append(ImageFormat(id=i, user_id=1, image_id=i, created_at=datetime(2023, 4, 1), format=format_,
+                                  url=formatting_image_url(f"media/{i:032x}", format_)['url'],
+                                  transformation=transformation_string(format_)))
+
+    return result
+
+
+def measure(name: str, schema, rows: list, pages: int, cold: bool, stored: bool = False) -> None:
+    for row in rows:
+        if not stored:
+            row.__dict__.pop('url', None)
+    [schema.from_orm(row) for row in rows]
+
+    start = time.perf_counter()
+    for _ in range(pages):
+        if cold:
+            _build_url.cache_clear()
+        for row in rows:
+            if not stored:
+                row.__dict__.pop('url', None)
+        [schema.from_orm(row) for row in rows]
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<36} {elapsed / pages * 1000:>10.2f} {elapsed / pages / len(rows) * 1e6:>12.1f}")
+
+
+def main(size: int = 100, pages: int = 200) -> None:
+    print(f"{'page of ' + str(size):<36} {'ms/page':>10} {'us/object':>12}")
+    measure("images, url cache cold", ImagePublic, page(size), pages, cold=True)
+    measure("images, url cache warm", ImagePublic, page(size), pages, cold=False)
+    measure("formatted images, stored url", FormattedImagePublic, formats(size), pages, cold=False, stored=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Microbenchmark of the access token decoding with and without the cache of verified payloads.
+
+Run from the project root:
+
+    python tests/benchmarks/jwt_decode.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from jose import jwt  # noqa: E402
+
+from app.services.auth import AuthService  # noqa: E402
+
+
+decode_jwt = AuthService._AuthService__decode_jwt  # noqa
+
+
+def measure(name: str, token: str, requests: int, cached: bool) -> float:
+    AuthService.payload_cache.clear()
+    decode_jwt(token)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            AuthService.payload_cache.clear()
+        decode_jwt(token)
+    per_request = (time.perf_counter() - start) / requests
+
+    print(f"{name:<24} {per_request * 1e6:>10.2f}")
+
+    return per_request
+
+
+async def main(requests: int = 20_000) -> None:
+    token = await AuthService.create_access_token({"sub": "email@example.com"})
+    print(f"{'decode':<24} {'us/req':>10}")
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        jwt.decode(token, AuthService.SECRET_KEY, algorithms=[AuthService.ALGORITHM])
+    print(f"{'python-jose only':<24} {(time.perf_counter() - start) / requests * 1e6:>10.2f}")
+
+    uncached = measure("without cache", token, requests, cached=False)
+    cached = measure("with cache", token, requests, cached=True)
+
+    print(f"speedup: {uncached / cached:.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -13,6 +13,8 @@ from sqlalchemy.orm import sessionmaker
 from app.database.connect import get_db
 from app.database.models import Base, User
 from app.services.auth import AuthService
+from app.services.cache import UserCache, PrincipalCache, TokenGeneration, RatingSummaryCache
+from app.services.revocation import RevocationStore
 from config import settings
 from main import app
 from sqlalchemy.pool import NullPool
@@ -84,8 +86,21 @@ def mock_rate_limit(mocker):
 
 @pytest_asyncio.fixture(autouse=True)
 async def mock_auth_redis(mocker):
-    mock_redis = mocker.patch.object(AuthService, 'redis', autospec=True)
+    mock_redis = mocker.AsyncMock()
     mock_redis.get.return_value = None
+    mock_redis.mget.return_value = [None, None]
+    mock_redis.exists.return_value = 0
+
+    mocker.patch.object(AuthService, 'redis', mock_redis)
+    mocker.patch.object(UserCache, 'redis', mock_redis)
+    mocker.patch.object(PrincipalCache, 'redis', mock_redis)
+    mocker.patch.object(RevocationStore, 'redis', mock_redis)
+    mocker.patch.object(TokenGeneration, 'redis', mock_redis)
+    mocker.patch.object(RatingSummaryCache, 'redis', mock_redis)
+    PrincipalCache.local.clear()
+    TokenGeneration.local.clear()
+
+    return mock_redis
 
 
 @pytest_asyncio.fixture(scope="class")
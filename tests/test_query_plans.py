@@ -0,0 +1,67 @@
+import json
+from datetime import datetime
+
+from pytest import mark
+from sqlalchemy import select, text
+
+from app.database.models import Image, ImageComment, ImageRating
+from app.database.models.images import image_m2m_tag
+from app.repository.images import description_query
+from app.schemas.image import DescriptionMatch
+from app.utils.pagination import Cursor, paginate
+
+
+HOT_QUERIES = {
+    "image tags (selectin load)": (
+        select(image_m2m_tag.c.tag_id).filter(image_m2m_tag.c.image_id.in_([1, 2, 3])), "image_m2m_tag"
+    ),
+    "images by tag (tag filter)": (
+        select(image_m2m_tag.c.image_id).filter(image_m2m_tag.c.tag_id.in_([1, 2, 3])), "image_m2m_tag"
+    ),
+    "comments of an image": (select(ImageComment).filter(ImageComment.image_id == 1), "image_comments"),
+    "comments of a user": (select(ImageComment).filter(ImageComment.user_id == 1), "image_comments"),
+    "ratings of an image": (select(ImageRating).filter(ImageRating.image_id == 1), "image_ratings"),
+    "images of a user": (select(Image.id).filter(Image.user_id == 1), "images"),
+    "images after a cursor": (
+        paginate(select(Image.id), Image, 0, 10, Cursor(datetime(2023, 4, 1), 1)), "images"
+    ),
+    "images by description": (
+        select(Image.id).filter(
+            Image.description_search.bool_op('@@')(description_query("sunset", DescriptionMatch.words))
+        ),
+        "images",
+    ),
+}
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@mark.asyncio
+class TestQueryPlans:
+    """
+    The tables of the test database are almost empty, so sequential scans are disabled to check that an index
+    is usable for every hot query, a dropped or unused index makes the planner fall back to a sequential scan.
+    """
+
+    @mark.parametrize("name", HOT_QUERIES)
+    async def test_index_scan(self, session, name):
+        query, table = HOT_QUERIES[name]
+
+        connection = await session.connection()
+        compiled = query.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+        params = tuple(compiled.params[param] for param in compiled.positiontup)
+
+        await connection.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)).scalar()
+        await session.rollback()
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = {node["Node Type"] for node in plan_nodes(plan[0]["Plan"]) if node.get("Relation Name") == table}
+
+        assert scans, f"{name}: {table} is not scanned"
+        assert "Seq Scan" not in scans, f"{name}: sequential scan of {table}"
@@ -0,0 +1,74 @@
+from pytest import mark, fixture
+from sqlalchemy import select, update
+
+from app.database.models import Image, ImageRating, User
+from app.repository.image_ratings import recompute_rating_aggregates, upsert_rating
+
+
+@fixture(scope="module")
+def rating_users() -> list[dict]:
+    return [
+        {
+            "username": f"rating_user_{i}",
+            "email": f"rating.user.{i}@test.com",
+            "password": "test_pwd",
+            "first_name": "Rating",
+            "last_name": "User",
+        }
+        for i in range(3)
+    ]
+
+
+@mark.asyncio
+class TestRatingAggregates:
+    async def aggregates(self, session, image_id: int) -> tuple[int, int]:
+        session.expire_all()
+        image = await session.scalar(select(Image).filter(Image.id == image_id))
+        return image.rating_count, image.rating_sum
+
+    async def test_trigger_and_repair(self, session, rating_users):
+        users = [User(**user) for user in rating_users]
+        session.add_all(users)
+        await session.commit()
+
+        image = Image(user_id=users[0].id, description="Rated image", public_id="rated")
+        session.add(image)
+        await session.commit()
+        assert await self.aggregates(session, image.id) == (0, 0)
+
+        ratings = [ImageRating(user_id=user.id, image_id=image.id, rating=rating)
+                   for user, rating in zip(users, (5, 3, 1))]
+        session.add_all(ratings)
+        await session.commit()
+        assert await self.aggregates(session, image.id) == (3, 9)
+
+        await session.execute(update(ImageRating).filter(ImageRating.id == ratings[2].id).values(rating=4))
+        await session.commit()
+        assert await self.aggregates(session, image.id) == (3, 12)
+
+        await session.delete(await session.get(ImageRating, ratings[0].id))
+        await session.commit()
+        assert await self.aggregates(session, image.id) == (2, 7)
+
+        await session.execute(update(Image).filter(Image.id == image.id).values(rating_count=10, rating_sum=0))
+        await session.commit()
+        assert await recompute_rating_aggregates(session, image.id) == 1
+        assert await self.aggregates(session, image.id) == (2, 7)
+        assert await recompute_rating_aggregates(session, image.id) == 0
+
+    async def test_upsert(self, session, rating_users):
+        owner, rater = [await session.scalar(select(User).filter(User.email == user["email"]))
+                        for user in rating_users[:2]]
+        image = Image(user_id=owner.id, description="Upserted image", public_id="upserted")
+        session.add(image)
+        await session.commit()
+
+        rating, created = await upsert_rating(rater.id, 2, image.id, session)
+        assert created and rating.rating == 2
+
+        rating, created = await upsert_rating(rater.id, 5, image.id, session)
+        assert not created and rating.rating == 5
+        assert await self.aggregates(session, image.id) == (1, 5)
+
+        assert await upsert_rating(owner.id, 5, image.id, session) == (None, False)
+        assert await upsert_rating(rater.id, 5, image.id + 1000, session) == (None, False)
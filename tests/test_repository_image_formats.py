@@ -1,7 +1,7 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from app.database.models import ImageFormat, User, Image
-from app.repository.image_formats import create_image_format, get_image_formats_by_image_id
+from app.repository.image_formats import create_image_format, get_image_formats_by_image_id, get_image_formats_by_ids
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
@@ -19,14 +19,19 @@ class TestRepositoryImagesFormats(unittest.IsolatedAsyncioTestCase):
             "crop": "fill",
             "gravity": "center"
             }
+        self.url = "https://res.cloudinary.com/demo/image/upload/c_fill,g_center,h_0,w_0/v1/image"
+        self.transformation = "c_fill,g_center,h_0,w_0"
         
 
     async def test_create_image_format_success(self):
  
-        result = await create_image_format(user_id=self.user.id, image_id=self.image.id, format_=self.body, db=self.session)
+        result = await create_image_format(user_id=self.user.id, image_id=self.image.id, format_=self.body,
+                                           url=self.url, transformation=self.transformation, db=self.session)
 
         self.assertIsInstance(result, ImageFormat)
         self.assertEqual(result.format, self.body)
+        self.assertEqual(result.url, self.url)
+        self.assertEqual(result.transformation, self.transformation)
         self.assertEqual(result.user_id, self.user.id)
         self.assertEqual(result.image_id, self.image.id)
         self.assertTrue(hasattr(result, 'id'))
@@ -40,7 +45,8 @@ class TestRepositoryImagesFormats(unittest.IsolatedAsyncioTestCase):
 
         self.session.commit.side_effect = IntegrityError(None, None, None)
 
-        result = await create_image_format(user_id=self.user.id, image_id=self.image.id, format_=self.body, db=self.session)
+        result = await create_image_format(user_id=self.user.id, image_id=self.image.id, format_=self.body,
+                                           url=self.url, transformation=self.transformation, db=self.session)
 
         self.assertIsNone(result)
 
@@ -67,8 +73,20 @@ class TestRepositoryImagesFormats(unittest.IsolatedAsyncioTestCase):
 
         result = await get_image_formats_by_image_id(user_id=self.user.id, image_id=self.image.id, db=self.session)
 
-        self.assertIsNone(await result)       
+        self.assertIsNone(await result)
 
+    async def test_get_image_formats_by_ids(self):
+        image_formats = [ImageFormat(id=1, user_id=self.user.id, image=self.image),
+                         ImageFormat(id=2, user_id=self.user.id, image=self.image)]
+        self.session.scalars = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=image_formats)))
+
+        result = await get_image_formats_by_ids([1, 2], db=self.session)
+
+        self.assertEqual(result, image_formats)
+        self.session.scalars.assert_awaited_once()
+        query = str(self.session.scalars.await_args.args[0])
+        self.assertIn("JOIN images ON images.id = image_formats.image_id", query)
+        self.assertIn("images.public_id", query)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,135 @@
+import io
+import zipfile
+
+import pytest_asyncio
+from pytest import mark
+
+from fastapi import status
+
+from app.database.models import Image, ImageFormat, User
+from app.services.qr_code import QRCodeCache, QRCodeFormat
+
+
+@pytest_asyncio.fixture()
+async def formatted_image(session, user, access_token) -> ImageFormat:
+    image = Image(user_id=user['id'], description="Formatted image", public_id="formatted")
+    session.add(image)
+    await session.commit()
+    await session.refresh(image)
+
+    formatted_image = ImageFormat(user_id=user['id'], image_id=image.id, format={'width': 250}, transformation="w_250",
+                                  url="https://res.cloudinary.com/demo/image/upload/w_250/formatted")
+    session.add(formatted_image)
+    await session.commit()
+    await session.refresh(formatted_image)
+
+    return formatted_image
+
+
+@mark.asyncio
+class TestGetImageFormatQRCode:
+    url_path = "api/images/formats/qr-code/{image_format_id}"
+
+    def etag(self, formatted_image: ImageFormat) -> str:
+        return f'"{QRCodeCache.digest(formatted_image.url, 1, 10, 5, True, QRCodeFormat.PNG)}"'
+
+    @mark.parametrize("if_none_match", ('{etag}', '"other", W/{etag}', '*'))
+    async def test_not_modified(self, client, access_token, formatted_image, if_none_match, mocker):
+        get = mocker.patch('app.routes.image_formats.qr_code_generator.get', new=mocker.AsyncMock())
+
+        response = client.get(
+            self.url_path.format(image_format_id=formatted_image.id),
+            headers={"Authorization": f"Bearer {access_token}",
+                     "If-None-Match": if_none_match.format(etag=self.etag(formatted_image))},
+        )
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers['etag'] == self.etag(formatted_image)
+        get.assert_not_awaited()
+
+    async def test_modified(self, client, access_token, formatted_image, mocker):
+        get = mocker.patch('app.routes.image_formats.qr_code_generator.get',
+                           new=mocker.AsyncMock(return_value=b'qr code'))
+
+        response = client.get(
+            self.url_path.format(image_format_id=formatted_image.id),
+            headers={"Authorization": f"Bearer {access_token}", "If-None-Match": '"other", W/"another"'},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == b'qr code'
+        assert response.headers['etag'] == self.etag(formatted_image)
+        get.assert_awaited_once()
+
+
+@mark.asyncio
+@mark.usefixtures('mock_rate_limit')
+class TestGetImageFormatsQRCodes:
+    url_path = "api/images/formats/qr-codes"
+
+    @staticmethod
+    async def add_format(session, user_id: int, image_id: int) -> ImageFormat:
+        image_format = ImageFormat(user_id=user_id, image_id=image_id, format={'width': 100}, transformation="w_100",
+                                   url="https://res.cloudinary.com/demo/image/upload/w_100/formatted")
+        session.add(image_format)
+        await session.commit()
+        await session.refresh(image_format)
+
+        return image_format
+
+    @staticmethod
+    def members(response) -> dict[str, int]:
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            return {info.filename: info.compress_type for info in archive.infolist()}
+
+    @mark.parametrize("qr_format, compression", (("png", zipfile.ZIP_STORED), ("svg", zipfile.ZIP_DEFLATED)))
+    async def test_zip(self, client, access_token, formatted_image, session, qr_format, compression, mocker):
+        other_format = await self.add_format(session, formatted_image.user_id, formatted_image.image_id)
+        get_many = mocker.patch('app.routes.image_formats.qr_code_generator.get_many',
+                                new=mocker.AsyncMock(return_value=[b'first', b'second']))
+
+        response = client.post(
+            self.url_path,
+            json={"image_format_ids": [formatted_image.id, other_format.id, formatted_image.id], "format": qr_format},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'] == "application/zip"
+        image_dir = f"image-{formatted_image.image_id}"
+        assert self.members(response) == {f"{image_dir}/format-{formatted_image.id}.{qr_format}": compression,
+                                          f"{image_dir}/format-{other_format.id}.{qr_format}": compression}
+        # The duplicate id is rendered once
+        assert get_many.await_args.args[0] == [formatted_image.url, other_format.url]
+
+    async def test_not_found(self, client, access_token, formatted_image, mocker):
+        get_many = mocker.patch('app.routes.image_formats.qr_code_generator.get_many', new=mocker.AsyncMock())
+
+        response = client.post(
+            self.url_path,
+            json={"image_format_ids": [formatted_image.id, 999998, 999999]},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()['detail'] == "Not found formatted images: 999998, 999999"
+        get_many.assert_not_awaited()
+
+    async def test_not_owner(self, client, access_token, formatted_image, session, mocker):
+        owner = User(username="qr_owner", email="qr.owner@test.com", password="test_pwd", first_name="Qr",
+                     last_name="Owner")
+        session.add(owner)
+        await session.commit()
+        await session.refresh(owner)
+        other_format = await self.add_format(session, owner.id, formatted_image.image_id)
+        get_many = mocker.patch('app.routes.image_formats.qr_code_generator.get_many', new=mocker.AsyncMock())
+
+        response = client.post(
+            self.url_path,
+            json={"image_format_ids": [formatted_image.id, other_format.id]},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['detail'] == "The image does not belong to you"
+        get_many.assert_not_awaited()
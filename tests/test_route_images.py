@@ -4,6 +4,10 @@ from fastapi import status
 from sqlalchemy import select
 
 from app.database.models import Image, UserRole, User
+from app.repository import images as repository_images
+from app.routes.images import delete_image
+from app.services.derivatives import DerivativeCache
+from app.services.storage import ContentStore, LocalStorage
 
 
 @fixture(scope='module')
@@ -91,7 +95,7 @@ class TestUploadImage:
         response = client.post(
             self.url_path,
             headers={"Authorization": f"Bearer {access_token}"},
-            files={"file": ("test.png", b"image", "image/png")},
+            files={"file": ("test.png", b"\x89PNG\r\n\x1a\nimage", "image/png")},
             data={"description": image['description'], "tags": image['tags']}
         )
 
@@ -101,6 +105,32 @@ class TestUploadImage:
         assert response.json()['message'] == "Image successfully uploaded"
         assert response.json()['image']['url'] == mock_image['url']
 
+    @mark.usefixtures('mock_rate_limit')
+    async def test_async_upload(self, client, access_token, image, mocker, tmp_path):
+        mocker.patch("app.services.upload_jobs.settings.upload_staging_dir", tmp_path)
+        enqueue = mocker.patch("app.services.upload_jobs.UploadJobQueue.enqueue", return_value="job_id")
+        # A job of another user
+        mocker.patch("app.services.upload_jobs.UploadJobQueue.get", return_value={
+            "id": "job_id", "status": "queued", "user_id": 0, "image_id": None,
+        })
+
+        response = client.post(
+            self.url_path,
+            params={"async": True},
+            headers={"Authorization": f"Bearer {access_token}"},
+            files={"file": ("test.png", b"\x89PNG\r\n\x1a\nimage", "image/png")},
+            data={"description": image['description'], "tags": image['tags']}
+        )
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json() == {"id": "job_id", "status": "queued", "image_id": None, "detail": None}
+        assert enqueue.call_args.args[3].read_bytes() == b"\x89PNG\r\n\x1a\nimage"
+
+        response = client.get("api/images/jobs/job_id", headers={"Authorization": f"Bearer {access_token}"})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()['detail'] == "Not found upload job"
+
 
 @mark.asyncio
 class TestGetImages:
@@ -316,4 +346,55 @@ class TestImageDelete:
         assert response.status_code == status.HTTP_200_OK
         assert response.json()['message'] == 'Image successfully deleted'
 
+    @mark.usefixtures('mock_rate_limit')
+    async def test_shared_file_is_kept(self, client, access_token, session, user, mocker):
+        storage = mocker.patch('app.routes.images.storage', new=mocker.AsyncMock())
+        images = [Image(user_id=user['id'], description="Same content", public_id="a" * 64 + ".png")
+                  for _ in range(2)]
+        session.add_all(images)
+        await session.commit()
+        for image in images:
+            await session.refresh(image)
 
+        for image in images:
+            response = client.delete(
+                self.url_path.format(image_id=image.id),
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+        # The file goes with the last image that refers to it
+        storage.delete.assert_awaited_once_with("a" * 64 + ".png")
+
+    @mark.usefixtures('mock_rate_limit')
+    async def test_delete_during_upload_of_same_content(self, client, access_token, session, user, tmp_path, mocker):
+        local_storage = LocalStorage(ContentStore(tmp_path / 'media'), "/media/",
+                                     DerivativeCache(tmp_path / 'derivatives', max_bytes=1_000_000), "signing_key")
+        mocker.patch('app.routes.images.storage', local_storage)
+        content = b"\x89PNG\r\n\x1a\nshared content"
+        shared = Image(user_id=user['id'], description="Same content", public_id=local_storage.store.put(content))
+        session.add(shared)
+        await session.commit()
+        await session.refresh(shared)
+
+        create_image = repository_images.create_image
+
+        async def create_after_delete(user_id, description, tags, public_id, db, commit=True):
+            # The only other image with the same content is deleted after the upload stored the file
+            await delete_image(shared.id, db, await db.get(User, user_id))
+            assert not local_storage.store.exists(public_id)
+            return await create_image(user_id, description, tags, public_id, db, commit)
+
+        mocker.patch('app.repository.images.create_image', side_effect=create_after_delete)
+
+        response = client.post(
+            "api/images/",
+            headers={"Authorization": f"Bearer {access_token}"},
+            files={"file": ("test.png", content, "image/png")},
+            data={"description": "Uploaded while the same content is deleted"},
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        image = await session.scalar(select(Image).filter(Image.id == response.json()['image']['id']))
+        assert image.public_id == shared.public_id
+        assert local_storage.store.get(image.public_id) == content
@@ -0,0 +1,113 @@
+from io import BytesIO
+
+from PIL import Image
+from pytest import fixture, mark
+
+from fastapi import status
+
+from app.services.cloudinary import FORMAT_AVATAR
+from app.services.derivatives import DerivativeCache, variant_key
+from app.services.storage import ContentStore, LocalStorage
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+
+
+@fixture()
+def local_storage(tmp_path, mocker) -> LocalStorage:
+    cache = DerivativeCache(tmp_path / 'derivatives', max_bytes=1_000_000)
+    local_storage = LocalStorage(ContentStore(tmp_path / 'media'), "/media/", cache, "signing_key")
+    mocker.patch("app.routes.media.local_storage", local_storage)
+    return local_storage
+
+
+@fixture()
+def store(local_storage) -> ContentStore:
+    return local_storage.store
+
+
+@fixture()
+def image(store) -> str:
+    buffer = BytesIO()
+    Image.new('RGB', (400, 300)).save(buffer, format='PNG')
+    return store.put(buffer.getvalue())
+
+
+@mark.asyncio
+class TestGetMedia:
+    url_path = "media/"
+
+    async def test_file(self, client, store):
+        key = store.put(PNG)
+
+        response = client.get(self.url_path + key)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == PNG
+        assert response.headers['content-type'] == "image/png"
+        assert response.headers['etag'] == f'"{key}"'
+        assert "immutable" in response.headers['cache-control']
+
+    @mark.parametrize("if_none_match", ('"{key}"', '"other", W/"{key}"', '*'))
+    async def test_not_modified(self, client, store, if_none_match):
+        key = store.put(PNG)
+
+        response = client.get(self.url_path + key, headers={"If-None-Match": if_none_match.format(key=key)})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b''
+
+    async def test_modified(self, client, store):
+        key = store.put(PNG)
+
+        response = client.get(self.url_path + key, headers={"If-None-Match": '"other", W/"another"'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == PNG
+
+    @mark.parametrize("key", ("0" * 64 + ".png", "..%2F..%2Fconfig.py", "invalid"))
+    async def test_not_found(self, client, store, key):
+        response = client.get(self.url_path + key)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@fixture()
+def url(local_storage, image) -> str:
+    signature = local_storage.sign(image, FORMAT_AVATAR)
+    return f"media/{image}?c=fill&h=250&w=250&s={signature}"
+
+
+@mark.asyncio
+class TestGetDerivative:
+    async def test_derivative(self, client, local_storage, image, url):
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'] == "image/png"
+        assert response.headers['etag'] == f'"{variant_key(image, FORMAT_AVATAR)}"'
+        with Image.open(BytesIO(response.content)) as result:
+            assert result.size == (250, 250)
+
+        assert client.get(url).content == response.content
+        assert (local_storage.cache.stats()['misses'], local_storage.cache.stats()['hits']) == (1, 1)
+
+    async def test_not_modified(self, client, local_storage, image, url):
+        response = client.get(url, headers={"If-None-Match": f'"{variant_key(image, FORMAT_AVATAR)}"'})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert local_storage.cache.stats()['misses'] == 0
+
+    async def test_evicted_derivative_is_rendered(self, client, local_storage, image, url):
+        client.get(url)
+        local_storage.cache.path(local_storage.cache.name(image, FORMAT_AVATAR)).unlink()
+
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert local_storage.cache.stats()['misses'] == 2
+
+    async def test_invalid_signature(self, client, local_storage, image):
+        response = client.get(f"media/{image}", params={'w': 100, 's': local_storage.sign(image, {'width': 200})})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert local_storage.cache.stats()['misses'] == 0
@@ -89,7 +89,7 @@ class TestUpdateAvatar:
 
         response = client.patch(
             self.url_path,
-            files={"file": ("test.png", b"image", "image/png")},
+            files={"file": ("test.png", b"\x89PNG\r\n\x1a\nimage", "image/png")},
             headers={"Authorization": f"Bearer {access_token}"},
         )
 
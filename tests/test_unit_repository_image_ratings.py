@@ -0,0 +1,156 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch, call
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import ImageRating
+from app.repository.image_ratings import (
+    recompute_rating_aggregates,
+    get_rating_summary,
+    update_rating,
+    remove_rating,
+    upsert_rating,
+)
+from app.services.cache import RatingSummaryCache
+
+
+class TestRecomputeRatingAggregates(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock(rowcount=2)
+
+    def query(self) -> str:
+        return str(self.session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+
+    async def test_all_images(self):
+        result = await recompute_rating_aggregates(self.session)
+
+        self.assertEqual(result, 2)
+        self.session.commit.assert_awaited_once()
+
+        query = self.query()
+        self.assertTrue(query.startswith("UPDATE images SET updated_at=images.updated_at"))
+        self.assertIn("rating_count=(SELECT count(image_ratings.id)", query)
+        self.assertIn("images.rating_count IS DISTINCT FROM", query)
+        self.assertNotIn("images.id =", query)
+
+    async def test_one_image(self):
+        await recompute_rating_aggregates(self.session, image_id=5)
+
+        self.assertIn("AND images.id = ", self.query())
+
+
+class TestRatingSummary(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.cache_get = patch.object(RatingSummaryCache, 'get', AsyncMock(return_value=None)).start()
+        self.cache_set = patch.object(RatingSummaryCache, 'set', AsyncMock()).start()
+        self.cache_invalidate = patch.object(RatingSummaryCache, 'invalidate', AsyncMock()).start()
+        self.addCleanup(patch.stopall)
+
+    def results(self, aggregates, rows=None) -> None:
+        self.session.execute.side_effect = [
+            MagicMock(first=MagicMock(return_value=aggregates)),
+            MagicMock(all=MagicMock(return_value=rows or [])),
+        ]
+
+    async def test_summary(self):
+        self.results((4, 17), [(5, 3), (2, 1)])
+
+        result = await get_rating_summary(image_id=1, db=self.session)
+
+        self.assertEqual(result, {
+            "image_id": 1,
+            "count": 4,
+            "average": 4.25,
+            "histogram": {1: 0, 2: 1, 3: 0, 4: 0, 5: 3},
+        })
+        self.assertEqual(self.session.execute.await_count, 2)
+        query = str(self.session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("GROUP BY image_ratings.rating", query)
+        self.cache_get.assert_awaited_once_with(1, (4, 17))
+        self.cache_set.assert_awaited_once_with(1, result, (4, 17))
+
+    async def test_summary_without_ratings(self):
+        self.results(None)
+
+        result = await get_rating_summary(image_id=1, db=self.session)
+
+        self.assertEqual(result["count"], 0)
+        self.assertIsNone(result["average"])
+
+    async def test_cached_summary(self):
+        self.results((1, 5))
+        self.cache_get.return_value = {"image_id": 1, "count": 1, "average": 5.0,
+                                       "histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 1}}
+
+        result = await get_rating_summary(image_id=1, db=self.session)
+
+        self.assertEqual(result["histogram"][5], 1)
+        self.session.execute.assert_awaited_once()
+        self.cache_set.assert_not_awaited()
+
+    async def test_writes_invalidate_summary(self):
+        await update_rating(ImageRating(id=1, user_id=1, image_id=3, rating=5), 4, self.session)
+        await remove_rating(ImageRating(id=1, user_id=1, image_id=3, rating=4), self.session)
+
+        self.assertEqual(self.cache_invalidate.await_args_list, [call(3)] * 2)
+
+
+class TestUpsertRating(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.result = self.session.execute.return_value = MagicMock()
+        self.cache_invalidate = patch.object(RatingSummaryCache, 'invalidate', AsyncMock()).start()
+        self.addCleanup(patch.stopall)
+
+    async def test_single_statement(self):
+        self.result.mappings.return_value.first.return_value = {
+            "id": 7, "rating": 4, "user_id": 1, "image_id": 3, "created_at": None, "updated_at": None, "created": True,
+        }
+
+        rating, created = await upsert_rating(user_id=1, rating=4, image_id=3, db=self.session)
+
+        self.assertIsInstance(rating, ImageRating)
+        self.assertEqual((rating.id, rating.rating, rating.image_id), (7, 4, 3))
+        self.assertTrue(created)
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
+        self.cache_invalidate.assert_awaited_once_with(3)
+
+        query = str(self.session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("INSERT INTO image_ratings (user_id, image_id, rating, created_at) SELECT", query)
+        self.assertIn("images.user_id != ", query)
+        self.assertIn("ON CONFLICT ON CONSTRAINT unique_user_image_rating DO UPDATE SET rating = excluded.rating",
+                      query)
+        self.assertIn("xmax = 0 AS created", query)
+
+    async def test_rejected(self):
+        self.result.mappings.return_value.first.return_value = None
+
+        self.assertEqual(await upsert_rating(user_id=1, rating=4, image_id=3, db=self.session), (None, False))
+        self.cache_invalidate.assert_not_awaited()
+
+
+
+class TestRatingSummaryCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.stored = {}
+        redis = AsyncMock()
+        redis.get.side_effect = lambda key: self.stored.get(key)
+        redis.set.side_effect = lambda key, value, ex: self.stored.update({key: value})
+        patch.object(RatingSummaryCache, 'redis', redis).start()
+        self.addCleanup(patch.stopall)
+
+    async def test_outdated_aggregates(self):
+        summary = {"image_id": 1, "count": 2, "average": 4.5, "histogram": {"4": 1, "5": 1}}
+        await RatingSummaryCache.set(1, summary, (2, 9))
+
+        self.assertEqual(await RatingSummaryCache.get(1, (2, 9)), summary)
+        # A rating removed by the cascade of a user deletion
+        self.assertIsNone(await RatingSummaryCache.get(1, (1, 5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Image
+from app.repository.images import get_images, delete_image, description_query, lock_public_id, public_id_in_use
+from app.schemas.image import DescriptionMatch, ImageSort
+from app.schemas.tag import TagMode
+from app.utils.pagination import Cursor
+
+
+class TestGetImages(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+
+    @staticmethod
+    def compile(statement) -> str:
+        return str(statement.compile(dialect=postgresql.dialect()))
+
+    async def test_two_phase_query(self):
+        images = [Image(id=1), Image(id=2)]
+        self.session.scalars.side_effect = [
+            MagicMock(all=MagicMock(return_value=[1, 2])),
+            MagicMock(all=MagicMock(return_value=images)),
+        ]
+        self.session.execute.return_value = MagicMock(all=MagicMock(return_value=[(7, "tag")]))
+
+        result = await get_images(skip=0, limit=2, description=None, tags=["tag"], image_id=None, user_id=None,
+                                  db=self.session)
+
+        self.assertEqual(result, images)
+        self.assertEqual(self.session.scalars.await_count, 2)
+
+        page_query = self.compile(self.session.scalars.await_args_list[0].args[0])
+        self.assertIn("SELECT images.id", page_query)
+        self.assertIn("LIMIT", page_query)
+        self.assertNotIn("JOIN", page_query)
+
+        images_query = self.compile(self.session.scalars.await_args_list[1].args[0])
+        self.assertNotIn("LIMIT", images_query)
+        self.assertNotIn("JOIN", images_query)
+
+    async def test_all_tags(self):
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=[]))
+        self.session.execute.return_value = MagicMock(all=MagicMock(return_value=[(1, "sunset"), (2, "sun")]))
+
+        await get_images(skip=0, limit=10, description=None, tags=["sun", "set"], image_id=None, user_id=None,
+                         db=self.session)
+
+        page_query = self.compile(self.session.scalars.await_args.args[0])
+        self.assertEqual(page_query.count("FROM image_m2m_tag"), 1)
+        self.assertIn("HAVING bool_or(", page_query)
+        self.assertNotIn("EXISTS", page_query)
+
+    async def test_any_tag(self):
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=[]))
+        self.session.execute.return_value = MagicMock(all=MagicMock(return_value=[(2, "sun")]))
+
+        await get_images(skip=0, limit=10, description=None, tags=["sun", "moon"], image_id=None, user_id=None,
+                         db=self.session, tags_mode=TagMode.any)
+
+        page_query = self.compile(self.session.scalars.await_args.args[0])
+        self.assertIn("images.id IN (SELECT image_m2m_tag.image_id", page_query)
+        self.assertNotIn("HAVING", page_query)
+
+    async def test_all_tags_without_match(self):
+        self.session.execute.return_value = MagicMock(all=MagicMock(return_value=[(2, "sun")]))
+
+        result = await get_images(skip=0, limit=10, description=None, tags=["sun", "moon"], image_id=None,
+                                  user_id=None, db=self.session)
+
+        self.assertEqual(result, [])
+        self.session.scalars.assert_not_awaited()
+
+    async def test_sort_by_rating(self):
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=[]))
+
+        await get_images(skip=20, limit=10, description=None, tags=None, image_id=None, user_id=None,
+                         db=self.session, sort=ImageSort.rating)
+
+        page_query = self.compile(self.session.scalars.await_args.args[0])
+        self.assertIn("ORDER BY CAST(images.rating_sum AS FLOAT) / CAST(nullif(images.rating_count", page_query)
+        self.assertIn("DESC NULLS LAST, images.rating_count DESC, images.id", page_query)
+        self.assertIn("OFFSET", page_query)
+
+    def test_rating_average(self):
+        self.assertEqual(Image(rating_count=2, rating_sum=7).rating_average, 3.5)
+        self.assertIsNone(Image(rating_count=0, rating_sum=0).rating_average)
+
+    async def test_cursor_page(self):
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=[]))
+
+        await get_images(skip=100, limit=10, description=None, tags=None, image_id=None, user_id=None,
+                         db=self.session, cursor=Cursor(datetime(2023, 1, 1), 5))
+
+        page_query = self.compile(self.session.scalars.await_args.args[0])
+        self.assertIn("(images.created_at, images.id) >", page_query)
+        self.assertNotIn("OFFSET", page_query)
+
+    async def test_full_text_search(self):
+        images = [Image(id=1), Image(id=2)]
+        self.session.scalars.side_effect = [
+            MagicMock(all=MagicMock(return_value=[2, 1])),
+            MagicMock(all=MagicMock(return_value=images)),
+        ]
+
+        result = await get_images(skip=0, limit=10, description="sunset beach", tags=None, image_id=None,
+                                  user_id=None, db=self.session, match=DescriptionMatch.words)
+
+        self.assertEqual([image.id for image in result], [2, 1])
+
+        page_query = self.compile(self.session.scalars.await_args_list[0].args[0])
+        self.assertIn("images.description_search @@ websearch_to_tsquery(", page_query)
+        self.assertIn("ORDER BY ts_rank_cd(", page_query)
+        self.assertNotIn("LIKE", page_query)
+
+    async def test_prefix_search_without_words(self):
+        result = await get_images(skip=0, limit=10, description="!?&|", tags=None, image_id=None,
+                                  user_id=None, db=self.session, match=DescriptionMatch.prefix)
+
+        self.assertEqual(result, [])
+        self.session.scalars.assert_not_awaited()
+
+    def test_prefix_query(self):
+        query = description_query("sun:* | set!", DescriptionMatch.prefix)
+
+        self.assertEqual(query.clauses.clauses[1].value, "sun:* & set:*")
+
+    async def test_empty_page(self):
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=[]))
+
+        result = await get_images(skip=100, limit=10, description=None, tags=None, image_id=None, user_id=None,
+                                  db=self.session)
+
+        self.assertEqual(result, [])
+        self.session.scalars.assert_awaited_once()
+
+
+
+class TestDeleteImage(unittest.IsolatedAsyncioTestCase):
+    async def test_invalidates_rating_summary(self):
+        session = MagicMock(spec=AsyncSession)
+        image = Image(id=3)
+
+        with patch('app.repository.images.RatingSummaryCache.invalidate', new_callable=AsyncMock) as invalidate:
+            await delete_image(image, session)
+
+        session.delete.assert_awaited_once_with(image)
+        session.commit.assert_awaited_once()
+        invalidate.assert_awaited_once_with(3)
+
+
+class TestPublicIdInUse(unittest.IsolatedAsyncioTestCase):
+    async def test_public_id_in_use(self):
+        session = MagicMock(spec=AsyncSession)
+        session.scalar.return_value = True
+
+        self.assertTrue(await public_id_in_use("a" * 64 + ".png", session))
+
+        query = str(session.scalar.await_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("EXISTS (SELECT", query)
+        self.assertIn("images.public_id = ", query)
+
+    async def test_lock_public_id(self):
+        session = MagicMock(spec=AsyncSession)
+
+        await lock_public_id("a" * 64 + ".png", session)
+
+        query = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertIn("pg_advisory_xact_lock(hashtext(", query)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Tag
+from app.repository.tags import (
+    TAG_RESOLVE_ATTEMPTS, TagConflictError, resolve_tag_patterns, get_or_create_tags, normalize_tag_name, tag_ids
+)
+from app.schemas.tag import TagMatch
+
+
+class TestResolveTagPatterns(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock(all=MagicMock(return_value=[
+            (1, "Sunset"), (2, "sun"), (3, "100%_cotton"),
+        ]))
+
+    def query(self):
+        statement = self.session.execute.await_args.args[0]
+        return statement.compile(dialect=postgresql.dialect())
+
+    async def test_contains(self):
+        result = await resolve_tag_patterns(["sun", "SET", "%_", "moon"], TagMatch.contains, self.session)
+
+        self.assertEqual(result, [[1, 2], [1], [3], []])
+        self.session.execute.assert_awaited_once()
+        query = self.query()
+        self.assertEqual(str(query).count("ILIKE"), 4)
+        self.assertIn("%\\%\\_%", query.params.values())
+
+    async def test_exact(self):
+        result = await resolve_tag_patterns(["sun", " SUNSET"], TagMatch.exact, self.session)
+
+        self.assertEqual(result, [[2], []])
+        query = self.query()
+        self.assertIn("tags.name IN (", str(query))
+        self.assertIn(["sun", "sunset"], query.params.values())
+
+
+class TestGetOrCreateTags(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        tag_ids.clear()
+        self.addCleanup(tag_ids.clear)
+
+    def scalars(self, *tags: Tag):
+        return MagicMock(all=MagicMock(return_value=list(tags)))
+
+    def test_normalize_tag_name(self):
+        self.assertEqual(normalize_tag_name("  Sunset   Beach "), "sunset beach")
+
+    async def test_create(self):
+        self.session.scalars.return_value = self.scalars(Tag(id=2, name="beach"), Tag(id=1, name="sunset"))
+
+        result = await get_or_create_tags(["Sunset ", "beach", "sunset", "  "], self.session)
+
+        self.assertEqual([tag.name for tag in result], ["sunset", "beach"])
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
+        self.session.scalars.assert_awaited_once()
+
+        insert = self.session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+        self.assertIn("ON CONFLICT (name) DO NOTHING", str(insert))
+        self.assertEqual(sorted(insert.params.values())[:2], ["beach", "sunset"])
+        self.assertEqual(tag_ids.get("sunset"), 1)
+
+    async def test_create_without_commit(self):
+        tag_ids.set("beach", 2)
+        self.session.scalars.return_value = self.scalars(Tag(id=2, name="beach"), Tag(id=1, name="sunset"))
+
+        result = await get_or_create_tags(["sunset", "beach"], self.session, commit=False)
+
+        self.assertEqual([tag.id for tag in result], [1, 2])
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_not_awaited()
+        self.assertIsNone(tag_ids.get("sunset"))
+
+    async def test_cached(self):
+        tag_ids.set("sunset", 1)
+        self.session.scalars.return_value = self.scalars(Tag(id=1, name="sunset"))
+
+        result = await get_or_create_tags(["SUNSET"], self.session)
+
+        self.assertEqual([tag.id for tag in result], [1])
+        self.session.execute.assert_not_awaited()
+        self.session.commit.assert_not_awaited()
+        self.session.scalars.assert_awaited_once()
+
+    async def test_stale_cache(self):
+        tag_ids.set("sunset", 1)
+        self.session.scalars.side_effect = [self.scalars(), self.scalars(Tag(id=5, name="sunset"))]
+
+        result = await get_or_create_tags(["sunset"], self.session)
+
+        self.assertEqual([tag.id for tag in result], [5])
+        self.session.execute.assert_awaited_once()
+        self.assertEqual(tag_ids.get("sunset"), 5)
+
+    async def test_removed_after_insert(self):
+        self.session.scalars.side_effect = [self.scalars(), self.scalars(Tag(id=6, name="sunset"))]
+
+        result = await get_or_create_tags(["sunset"], self.session)
+
+        self.assertEqual([tag.id for tag in result], [6])
+        self.assertEqual(self.session.execute.await_count, 2)
+
+    async def test_keeps_being_removed(self):
+        self.session.scalars.side_effect = [self.scalars() for _ in range(TAG_RESOLVE_ATTEMPTS + 1)]
+
+        with self.assertRaises(TagConflictError):
+            await get_or_create_tags(["sunset"], self.session)
+
+        self.assertEqual(self.session.execute.await_count, TAG_RESOLVE_ATTEMPTS + 1)
+
+    async def test_empty(self):
+        self.assertEqual(await get_or_create_tags(None, self.session), [])
+        self.session.scalars.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
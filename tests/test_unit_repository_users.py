@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock, patch
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -25,6 +25,15 @@ from app.repository.users import (
 class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.session = MagicMock(spec=AsyncSession)
+
+        invalidate_patcher = patch('app.repository.users.UserCache.invalidate', new_callable=AsyncMock)
+        self.invalidate = invalidate_patcher.start()
+        self.addCleanup(invalidate_patcher.stop)
+
+        bump_patcher = patch('app.repository.users.TokenGeneration.bump', new_callable=AsyncMock)
+        self.bump = bump_patcher.start()
+        self.addCleanup(bump_patcher.stop)
+
         self.body = UserCreate(
             username="username",
             email="email@example.com",
@@ -112,13 +121,15 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
         self.session.commit.assert_called_once()
 
     async def test_update_email_found(self):
-        mock_user = User()
+        mock_user = User(id=1)
         self.session.scalar.return_value = mock_user
 
         result = await update_email(user_id=1, email="email@example.com", db=self.session)
 
         self.assertEqual(result, mock_user)
         self.session.commit.assert_called_once()
+        self.invalidate.assert_awaited_once()
+        self.bump.assert_awaited_once_with(1)
 
     async def test_update_password_found(self):
         mock_user = User()
@@ -128,6 +139,7 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(result, mock_user)
         self.session.commit.assert_called_once()
+        self.bump.assert_awaited_once()
 
     async def test_get_user_by_email_or_username_found(self):
         mock_user = User()
@@ -176,6 +188,8 @@ class TestRepositoryUsers(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(result, mock_user)
         self.session.commit.assert_called_once()
+        self.invalidate.assert_awaited_once_with(mock_user.email)
+        self.bump.assert_awaited_once_with(mock_user.id)
 
     async def test_update_user_profile_found(self):
         mock_user = User()
@@ -0,0 +1,202 @@
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import User, UserRole
+from app.repository.users import update_email
+from app.services.auth import AuthService
+from app.services.cache import UserCache, PrincipalCache, TokenGeneration
+from app.services.revocation import RevocationStore, BloomFilter
+from config import settings
+
+
+class TestGetCurrentUser(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.user = User(id=1, username="username", email="email@example.com", first_name="Test",
+                         last_name="User", avatar=None, role=UserRole.user, email_verified=True, is_active=True,
+                         created_at=datetime(2023, 4, 1, 12, 30), updated_at=None)
+
+        self.redis = AsyncMock()
+        for target in (AuthService, UserCache, PrincipalCache, RevocationStore):
+            patcher = patch.object(target, 'redis', self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        get_user_patcher = patch('app.services.auth.repository_users.get_user_by_email', new_callable=AsyncMock)
+        self.get_user_by_email = get_user_patcher.start()
+        self.get_user_by_email.return_value = self.user
+        self.addCleanup(get_user_patcher.stop)
+
+        PrincipalCache.local.clear()
+        self.addCleanup(PrincipalCache.local.clear)
+
+    async def test_cached_user_single_round_trip(self):
+        token = await AuthService.create_access_token({"sub": self.user.email})
+        self.redis.mget.return_value = [None, UserCache.dumps(self.user)]
+
+        result = await AuthService.get_current_user(token, self.session)
+
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(len(self.redis.mock_calls), 1)
+        jti = jwt.get_unverified_claims(token)['jti']
+        self.redis.mget.assert_awaited_once_with(RevocationStore.key(jti), UserCache.key(self.user.email))
+        self.get_user_by_email.assert_not_awaited()
+
+    async def test_not_cached_user_two_round_trips(self):
+        token = await AuthService.create_access_token({"sub": self.user.email})
+        self.redis.mget.return_value = [None, None]
+
+        result = await AuthService.get_current_user(token, self.session)
+
+        self.assertEqual(result, self.user)
+        self.assertEqual(len(self.redis.mock_calls), 2)
+        self.redis.set.assert_awaited_once_with(UserCache.key(self.user.email), UserCache.dumps(self.user),
+                                                ex=UserCache.TTL)
+
+    async def test_principal_cache_no_round_trips(self):
+        token = await AuthService.create_access_token({"sub": self.user.email})
+        self.redis.mget.return_value = [None, UserCache.dumps(self.user)]
+
+        await AuthService.get_current_user(token, self.session)
+        self.redis.reset_mock()
+        result = await AuthService.get_current_user(token, self.session)
+
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(len(self.redis.mock_calls), 0)
+
+    async def test_bloom_filter_skips_revocation_check(self):
+        token = await AuthService.create_access_token({"sub": self.user.email})
+        self.redis.get.return_value = UserCache.dumps(self.user)
+
+        with patch.object(RevocationStore, 'bloom_ready', True), \
+                patch.object(RevocationStore, 'bloom', BloomFilter(capacity=100, error_rate=0.01)):
+            result = await AuthService.get_current_user(token, self.session)
+
+        self.assertEqual(result.id, self.user.id)
+        self.redis.mget.assert_not_awaited()
+        self.redis.get.assert_awaited_once_with(UserCache.key(self.user.email))
+
+    async def test_blacklisted_token(self):
+        token = await AuthService.create_access_token({"sub": self.user.email})
+        self.redis.mget.return_value = [b"1", UserCache.dumps(self.user)]
+
+        with self.assertRaises(HTTPException) as e:
+            await AuthService.get_current_user(token, self.session)
+
+        self.assertEqual(e.exception.status_code, 401)
+
+
+
+class TestDecodeCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        AuthService.payload_cache.clear()
+        self.addCleanup(AuthService.payload_cache.clear)
+
+    async def test_decoded_once(self):
+        token = await AuthService.create_refresh_token({"sub": "email@example.com"})
+
+        with patch('app.services.auth.jwt.decode', wraps=jwt.decode) as decode:
+            first = await AuthService.decode_refresh_token(token)
+            second = await AuthService.decode_refresh_token(token)
+
+        self.assertEqual(first, "email@example.com")
+        self.assertEqual(second, first)
+        decode.assert_called_once()
+
+    async def test_expired_token_not_cached(self):
+        token = await AuthService.create_refresh_token({"sub": "email@example.com"}, expires_delta=-10)
+
+        with self.assertRaises(HTTPException):
+            await AuthService.decode_refresh_token(token)
+
+        self.assertEqual(len(AuthService.payload_cache), 0)
+
+
+class TestStatelessPrincipal(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=AsyncSession)
+        self.user = User(id=1, email="email@example.com", role=UserRole.moderator, is_active=True)
+
+        self.redis = AsyncMock()
+        self.redis.get.return_value = b"3"
+        self.redis.exists.return_value = 0
+        for target in (AuthService, UserCache, PrincipalCache, RevocationStore, TokenGeneration):
+            patcher = patch.object(target, 'redis', self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        settings_patcher = patch.object(settings, 'auth_stateless_tokens', True)
+        settings_patcher.start()
+        self.addCleanup(settings_patcher.stop)
+
+        get_user_patcher = patch('app.services.auth.repository_users.get_user_by_email', new_callable=AsyncMock)
+        self.get_user_by_email = get_user_patcher.start()
+        self.addCleanup(get_user_patcher.stop)
+
+        TokenGeneration.local.clear()
+        self.addCleanup(TokenGeneration.local.clear)
+
+    async def test_claims_embedded(self):
+        token = await AuthService.create_access_token({"sub": self.user.email}, user=self.user)
+
+        claims = jwt.get_unverified_claims(token)
+
+        self.assertEqual(claims['uid'], self.user.id)
+        self.assertEqual(claims['role'], UserRole.moderator)
+        self.assertTrue(claims['act'])
+        self.assertEqual(claims['gen'], 3)
+
+    async def test_principal_from_claims(self):
+        token = await AuthService.create_access_token({"sub": self.user.email}, user=self.user)
+        self.redis.reset_mock()
+
+        result = await AuthService.get_current_principal(token, self.session)
+
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(result.role, UserRole.moderator)
+        self.assertTrue(result.is_active)
+        self.get_user_by_email.assert_not_awaited()
+        self.redis.get.assert_not_awaited()
+
+    async def test_outdated_generation(self):
+        token = await AuthService.create_access_token({"sub": self.user.email}, user=self.user)
+        await TokenGeneration.bump(self.user.id)
+        self.redis.get.return_value = b"4"
+
+        with self.assertRaises(HTTPException) as e:
+            await AuthService.get_current_principal(token, self.session)
+
+        self.assertEqual(e.exception.status_code, 401)
+
+    async def test_email_change_invalidates_token(self):
+        token = await AuthService.create_access_token({"sub": self.user.email}, user=self.user)
+        self.session.scalar.side_effect = [self.user.email, User(id=1, email="new@example.com")]
+
+        await update_email(self.user.id, "new@example.com", self.session)
+        self.redis.get.return_value = b"4"
+
+        self.redis.incr.assert_awaited_once_with(TokenGeneration.key(self.user.id))
+        with self.assertRaises(HTTPException) as e:
+            await AuthService.get_current_principal(token, self.session)
+
+        self.assertEqual(e.exception.status_code, 401)
+
+    async def test_token_without_claims_falls_back(self):
+        token = await AuthService.create_access_token({"sub": self.user.email})
+        self.redis.mget.return_value = [None, None]
+        self.get_user_by_email.return_value = self.user
+
+        with patch.object(PrincipalCache, 'set'):
+            result = await AuthService.get_current_principal(token, self.session)
+
+        self.assertEqual(result, self.user)
+        self.get_user_by_email.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
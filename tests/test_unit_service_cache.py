@@ -0,0 +1,172 @@
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from app.database.models import User, UserRole
+from app.services.cache import UserCache, LocalCache, PrincipalCache
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.user = User(
+            id=1,
+            username="username",
+            email="email@example.com",
+            password="hashed_password",
+            first_name="Test",
+            last_name="User",
+            avatar="https://example.com/avatar.png",
+            role=UserRole.moderator,
+            refresh_token="refresh_token",
+            email_verified=True,
+            is_active=True,
+            created_at=datetime(2023, 4, 1, 12, 30),
+            updated_at=None,
+        )
+
+        redis_patcher = patch.object(UserCache, 'redis', new_callable=AsyncMock)
+        self.redis = redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+
+        publish_patcher = patch.object(PrincipalCache, 'publish', new_callable=AsyncMock)
+        self.publish = publish_patcher.start()
+        self.addCleanup(publish_patcher.stop)
+
+    def test_key_is_versioned(self):
+        self.assertEqual(UserCache.key(self.user.email), f"user:v{UserCache.VERSION}:{self.user.email}")
+
+    def test_dumps_loads(self):
+        result = UserCache.loads(UserCache.dumps(self.user))
+
+        self.assertIsInstance(result, User)
+        for field in UserCache.FIELDS:
+            self.assertEqual(getattr(result, field), getattr(self.user, field))
+        self.assertIs(result.role, UserRole.moderator)
+
+    def test_dumps_skips_secrets(self):
+        data = UserCache.dumps(self.user)
+
+        self.assertNotIn(b"hashed_password", data)
+        self.assertNotIn(b"refresh_token", data)
+
+    async def test_get_not_found(self):
+        self.redis.get.return_value = None
+
+        result = await UserCache.get(self.user.email)
+
+        self.assertIsNone(result)
+
+    async def test_get_found(self):
+        self.redis.get.return_value = UserCache.dumps(self.user)
+
+        result = await UserCache.get(self.user.email)
+
+        self.assertEqual(result.id, self.user.id)
+        self.redis.get.assert_awaited_once_with(UserCache.key(self.user.email))
+
+    async def test_set(self):
+        await UserCache.set(self.user)
+
+        self.redis.set.assert_awaited_once_with(
+            UserCache.key(self.user.email), UserCache.dumps(self.user), ex=UserCache.TTL
+        )
+
+    async def test_invalidate(self):
+        await UserCache.invalidate("old@example.com", "new@example.com")
+
+        self.redis.delete.assert_awaited_once_with(UserCache.key("old@example.com"), UserCache.key("new@example.com"))
+        self.assertEqual(self.publish.await_count, 2)
+
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = LocalCache(maxsize=2, ttl=60)
+
+        cache.set("key", "value")
+
+        self.assertEqual(cache.get("key"), "value")
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_lru_eviction(self):
+        cache = LocalCache(maxsize=2, ttl=60)
+
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired(self):
+        cache = LocalCache(maxsize=2, ttl=60)
+
+        cache.set("key", "value", ttl=-1)
+
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_pop_where(self):
+        cache = LocalCache(maxsize=10, ttl=60)
+
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.pop_where(lambda key, value: value == 2)
+
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get("b"))
+
+
+class TestPrincipalCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.user = User(id=1, username="username", email="email@example.com", first_name="Test",
+                         last_name="User", avatar=None, role=UserRole.user, email_verified=True, is_active=True,
+                         created_at=datetime(2023, 4, 1, 12, 30), updated_at=None)
+
+        redis_patcher = patch.object(PrincipalCache, 'redis', new_callable=AsyncMock)
+        self.redis = redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+        self.addCleanup(PrincipalCache.local.clear)
+
+    def test_get_returns_new_object(self):
+        PrincipalCache.set("token", self.user)
+
+        first, second = PrincipalCache.get("token"), PrincipalCache.get("token")
+
+        self.assertEqual(first.id, self.user.id)
+        self.assertIsNot(first, second)
+        self.assertIsNone(PrincipalCache.get("other_token"))
+
+    async def test_invalidate_user(self):
+        PrincipalCache.set("token_1", self.user)
+        PrincipalCache.set("token_2", self.user)
+
+        await PrincipalCache.invalidate_user(self.user.email)
+
+        self.assertIsNone(PrincipalCache.get("token_1"))
+        self.assertIsNone(PrincipalCache.get("token_2"))
+        self.redis.publish.assert_awaited_once_with(PrincipalCache.CHANNEL, f"email:{self.user.email}")
+
+    async def test_invalidate_token(self):
+        PrincipalCache.set("token_1", self.user)
+        PrincipalCache.set("token_2", self.user)
+
+        await PrincipalCache.invalidate_token("token_1")
+
+        self.assertIsNone(PrincipalCache.get("token_1"))
+        self.assertIsNotNone(PrincipalCache.get("token_2"))
+
+    def test_evict_message_from_other_worker(self):
+        PrincipalCache.set("token", self.user)
+
+        PrincipalCache.evict(f"token:{PrincipalCache.token_key('token')}")
+
+        self.assertIsNone(PrincipalCache.get("token"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import cloudinary
+
+from app.services.cloudinary import formatting_image_url, _build_url, FORMAT_AVATAR, url_cache_stats, \
+    transformation_string
+
+
+class TestFormattingImageUrl(unittest.TestCase):
+    def setUp(self):
+        _build_url.cache_clear()
+
+    @staticmethod
+    def reference(public_id, transformation=None, version=None) -> str:
+        return cloudinary.CloudinaryImage(public_id=public_id, version=version, url_options=transformation).url
+
+    def test_same_url_as_cloudinary(self):
+        transformation = {"width": 100, "height": 50, "crop": "fill", "gravity": None}
+
+        self.assertEqual(formatting_image_url("image")['url'], self.reference("image"))
+        self.assertEqual(formatting_image_url("image", transformation),
+                         {"url": self.reference("image", transformation), "format": transformation})
+        self.assertEqual(formatting_image_url("avatar", FORMAT_AVATAR, "123")['url'],
+                         self.reference("avatar", FORMAT_AVATAR.dict(), "123"))
+
+    def test_normalized_key(self):
+        formatting_image_url("image", {"width": 100, "crop": "fill"})
+        formatting_image_url("image", {"crop": "fill", "width": 100, "gravity": None})
+        formatting_image_url("image", {"crop": "fill", "width": 100}, version="2")
+
+        stats = url_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 2, 2))
+
+    def test_unhashable_transformation(self):
+        transformation = {"transformation": [{"width": 100, "crop": "scale"}, {"angle": 90}]}
+
+        url = formatting_image_url("image", transformation)['url']
+
+        self.assertEqual(url, self.reference("image", transformation))
+        self.assertEqual(url_cache_stats()["size"], 0)
+
+    def test_transformation_string(self):
+        transformation = {"width": 100, "height": 50, "crop": "fill", "gravity": None}
+
+        self.assertEqual(transformation_string(transformation), "c_fill,h_50,w_100")
+        self.assertEqual(transformation_string(FORMAT_AVATAR), "c_fill,h_250,w_250")
+        self.assertEqual(transformation_string(), "")
+        self.assertIn(f"/upload/{transformation_string(transformation)}/",
+                      formatting_image_url("image", transformation)['url'])
+
+
+if __name__ == '__main__':
+    unittest.main()
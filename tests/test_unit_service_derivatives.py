@@ -0,0 +1,154 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app.services.cloudinary import FORMAT_AVATAR, CropMode, GravityMode
+from app.services.derivatives import DerivativeCache, canonical, variant_key
+
+KEY = "a" * 64 + ".png"
+
+
+class FakeRenderer:
+    """
+    Stands in for the image engine: returns size bytes after a short delay, or raises the given error
+    """
+
+    def __init__(self, size: int = 10, error: Exception = None) -> None:
+        self.size = size
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return b'x' * self.size
+
+
+class TestVariantKey(unittest.TestCase):
+    def test_canonical(self):
+        self.assertEqual(canonical(FORMAT_AVATAR), {'width': 250, 'height': 250, 'crop': 'fill'})
+        self.assertIs(type(canonical(FORMAT_AVATAR)['crop']), str)
+        self.assertEqual(canonical({'width': 100, 'height': None}), {'width': 100})
+        self.assertEqual(canonical(None), {})
+
+    def test_same_transformation_same_key(self):
+        transformation = {'crop': CropMode.FILL, 'gravity': GravityMode.CENTER, 'width': 100, 'height': None}
+
+        self.assertEqual(variant_key(KEY, transformation),
+                         variant_key(KEY, {'width': 100, 'gravity': 'center', 'crop': 'fill'}))
+        self.assertNotEqual(variant_key(KEY, transformation), variant_key(KEY, {'width': 100}))
+        self.assertNotEqual(variant_key(KEY, transformation), variant_key("b" * 64 + ".png", transformation))
+
+
+class TestDerivativeCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        self.cache = DerivativeCache(self.root, max_bytes=25)
+
+    async def test_hit(self):
+        renderer = FakeRenderer()
+
+        path = await self.cache.get(KEY, {'width': 100}, renderer)
+
+        self.assertEqual(path.read_bytes(), b'x' * 10)
+        self.assertEqual(path.suffix, '.png')
+        self.assertEqual(await self.cache.get(KEY, {'width': 100, 'height': None}, renderer), path)
+        self.assertEqual(renderer.calls, 1)
+        self.assertEqual(self.cache.stats()['hit_rate'], 0.5)
+
+    async def test_single_flight(self):
+        renderer = FakeRenderer()
+
+        paths = await asyncio.gather(*(self.cache.get(KEY, {'width': 100}, renderer) for _ in range(5)))
+
+        self.assertEqual(renderer.calls, 1)
+        self.assertEqual(len(set(paths)), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['shared'], stats['rendering']), (1, 4, 4, 0))
+
+    async def test_discard(self):
+        other = "b" * 64 + ".png"
+        paths = [await self.cache.get(KEY, {'width': width}, FakeRenderer(size=5)) for width in (100, 200)]
+        kept = await self.cache.get(other, {'width': 100}, FakeRenderer(size=5))
+
+        self.assertTrue(all(path.name.startswith("a" * 64 + "-") for path in paths))
+        self.assertEqual(await self.cache.discard(KEY), 2)
+
+        self.assertFalse(any(path.exists() for path in paths))
+        self.assertTrue(kept.exists())
+        self.assertEqual((self.cache.stats()['size'], self.cache.stats()['bytes']), (1, 5))
+
+    async def test_failed_render_is_not_cached(self):
+        renderer = FakeRenderer(error=ValueError("Invalid image file"))
+
+        results = await asyncio.gather(*(self.cache.get(KEY, {'width': 100}, renderer) for _ in range(2)),
+                                       return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        with self.assertRaises(ValueError):
+            await self.cache.get(KEY, {'width': 100}, renderer)
+        self.assertEqual(renderer.calls, 2)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    async def test_cancelled_request_keeps_render(self):
+        renderer = FakeRenderer()
+
+        first = asyncio.create_task(self.cache.get(KEY, {'width': 100}, renderer))
+        second = asyncio.create_task(self.cache.get(KEY, {'width': 100}, renderer))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertTrue((await second).exists())
+        self.assertEqual(renderer.calls, 1)
+
+    async def test_lru_eviction(self):
+        paths = [await self.cache.get(KEY, {'width': width}, FakeRenderer()) for width in (1, 2)]
+        await self.cache.get(KEY, {'width': 1}, FakeRenderer())
+
+        paths.append(await self.cache.get(KEY, {'width': 3}, FakeRenderer()))
+
+        self.assertEqual([path.exists() for path in paths], [True, False, True])
+        stats = self.cache.stats()
+        self.assertEqual((stats['size'], stats['bytes'], stats['evictions']), (2, 20, 1))
+
+    async def test_rerenders_removed_file(self):
+        renderer = FakeRenderer()
+        path = await self.cache.get(KEY, {'width': 100}, renderer)
+        path.unlink()
+
+        self.assertEqual(await self.cache.get(KEY, {'width': 100}, renderer), path)
+        self.assertTrue(path.exists())
+        self.assertEqual(renderer.calls, 2)
+
+    async def test_loads_directory(self):
+        for width in (1, 2):
+            await self.cache.get(KEY, {'width': width}, FakeRenderer())
+        (self.root / 'ab').mkdir()
+        (self.root / 'ab' / 'partial.part').write_bytes(b'x')
+
+        cache = DerivativeCache(self.root, max_bytes=15)
+        renderer = FakeRenderer()
+        await cache.get(KEY, {'width': 2}, renderer)
+
+        self.assertEqual(renderer.calls, 0)
+        self.assertEqual((cache.stats()['size'], cache.stats()['bytes']), (1, 10))
+
+    async def test_failed_load_is_retried(self):
+        with patch.object(self.cache, '_load', side_effect=[PermissionError("Permission denied"), None]) as load:
+            with self.assertRaises(PermissionError):
+                await self.cache.get(KEY, {'width': 1}, FakeRenderer())
+
+            path = await self.cache.get(KEY, {'width': 1}, FakeRenderer())
+
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(path.read_bytes(), b'x' * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from app.services.executors import BoundedExecutor
+
+
+class TestBoundedExecutor(unittest.IsolatedAsyncioTestCase):
+    async def test_process_pool(self):
+        executor = BoundedExecutor("process", workers=1, max_queue=0)
+        self.addCleanup(executor.shutdown)
+
+        self.assertNotEqual(await executor.run(os.getpid), os.getpid())
+        self.assertEqual(executor.stats()["completed"], 1)
+
+    async def test_run_many(self):
+        executor = BoundedExecutor("thread", workers=2, max_queue=0)
+        self.addCleanup(executor.shutdown)
+
+        self.assertEqual(await executor.run_many([(pow, (2, 3)), (max, (1, 5))]), [8, 5])
+        self.assertEqual(executor.stats()["completed"], 2)
+
+        with self.assertRaises(HTTPException):
+            await executor.run_many([(pow, (2, 3))] * 3)
+        self.assertEqual((executor.stats()["rejected"], executor.stats()["pending"]), (1, 0))
+
+    async def test_rejects_when_saturated(self):
+        executor = BoundedExecutor("thread", workers=1, max_queue=0)
+        executor.busy_detail = "Busy"
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+
+        blocked = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as e:
+            await executor.run(release.wait)
+
+        release.set()
+        await blocked
+
+        self.assertEqual((e.exception.status_code, e.exception.detail), (429, "Busy"))
+        self.assertEqual(e.exception.headers, {"Retry-After": "1"})
+        self.assertEqual(executor.stats()["rejected"], 1)
+        self.assertEqual(executor.stats()["pending"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
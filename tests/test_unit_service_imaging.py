@@ -0,0 +1,120 @@
+import unittest
+from io import BytesIO
+
+from PIL import Image
+
+from app.services.cloudinary import CroppingOrResizingTransformation, CropMode, ResizeMode, GravityMode, FORMAT_AVATAR
+from app.services.imaging import ImageEngine, geometry, render
+
+
+def encode(size: tuple[int, int], image_format: str = 'PNG', color=(255, 0, 0)) -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class TestGeometry(unittest.TestCase):
+    # Output sizes of Cloudinary for a 400x300 original
+    CASES = (
+        ({}, (400, 300)),
+        ({'width': 200}, (200, 150)),
+        ({'height': 150}, (200, 150)),
+        ({'width': 200, 'height': 200, 'crop': ResizeMode.SCALE}, (200, 200)),
+        ({'width': 200, 'crop': ResizeMode.SCALE}, (200, 150)),
+        ({'width': 200, 'height': 200, 'crop': ResizeMode.FIT}, (200, 150)),
+        ({'width': 800, 'height': 800, 'crop': ResizeMode.FIT}, (800, 600)),
+        ({'width': 800, 'height': 800, 'crop': ResizeMode.LIMIT}, (400, 300)),
+        ({'width': 200, 'height': 200, 'crop': ResizeMode.LIMIT}, (200, 150)),
+        ({'width': 200, 'height': 200, 'crop': ResizeMode.M_FIT}, (400, 300)),
+        ({'width': 800, 'height': 800, 'crop': ResizeMode.M_FIT}, (800, 600)),
+        ({'width': 200, 'height': 200, 'crop': CropMode.FILL}, (200, 200)),
+        ({'width': 800, 'height': 200, 'crop': CropMode.FILL}, (800, 200)),
+        ({'width': 200, 'crop': CropMode.FILL}, (200, 150)),
+        ({'width': 200, 'height': 200, 'crop': CropMode.THUMB}, (200, 200)),
+        ({'width': 200, 'height': 200, 'crop': CropMode.FILL_PAD}, (200, 200)),
+        ({'width': 200, 'height': 200, 'crop': CropMode.IFILL}, (200, 200)),
+        ({'width': 800, 'height': 800, 'crop': CropMode.IFILL}, (300, 300)),
+        ({'width': 800, 'height': 400, 'crop': CropMode.IFILL}, (400, 200)),
+        ({'width': 200, 'height': 200, 'crop': ResizeMode.PAD}, (200, 200)),
+        ({'width': 800, 'height': 800, 'crop': ResizeMode.PAD}, (800, 800)),
+        ({'width': 800, 'height': 800, 'crop': ResizeMode.IPAD}, (800, 800)),
+        ({'width': 800, 'height': 800, 'crop': ResizeMode.MPAD}, (800, 800)),
+        ({'width': 200, 'height': 200, 'crop': ResizeMode.MPAD}, (400, 300)),
+        ({'width': 100, 'height': 100, 'crop': CropMode.CROP}, (100, 100)),
+        ({'width': 800, 'height': 100, 'crop': CropMode.CROP}, (400, 100)),
+        ({'width': 100, 'crop': CropMode.CROP}, (100, 300)),
+    )
+
+    def test_output_size(self):
+        for transformation, expected in self.CASES:
+            with self.subTest(transformation=transformation):
+                self.assertEqual(geometry((400, 300), transformation).size, expected)
+
+    def test_gravity(self):
+        crop = {'width': 100, 'height': 100, 'crop': CropMode.CROP}
+        fill = {'width': 200, 'height': 200, 'crop': CropMode.FILL}
+
+        self.assertEqual(geometry((400, 300), crop).crop, (150, 100, 250, 200))
+        self.assertEqual(geometry((400, 300), {**crop, 'gravity': GravityMode.NORTH_WEST}).crop, (0, 0, 100, 100))
+        self.assertEqual(geometry((400, 300), {**crop, 'gravity': GravityMode.SOUTH_EAST}).crop, (300, 200, 400, 300))
+        self.assertEqual(geometry((400, 300), {**fill, 'gravity': GravityMode.EAST}).crop, (67, 0, 267, 200))
+        self.assertEqual(geometry((400, 300), {**fill, 'gravity': 'west'}).crop, (0, 0, 200, 200))
+
+    def test_pad_offset(self):
+        pad = {'width': 200, 'height': 200, 'crop': ResizeMode.PAD}
+
+        self.assertEqual(geometry((400, 300), pad).offset, (0, 25))
+        self.assertEqual(geometry((400, 300), {**pad, 'gravity': GravityMode.SOUTH}).offset, (0, 50))
+
+    def test_add_on_modes(self):
+        with self.assertRaises(ValueError):
+            geometry((400, 300), {'width': 200, 'height': 200, 'crop': CropMode.IMAGGA_CROP})
+
+
+class TestRender(unittest.TestCase):
+    def test_size_matches_geometry(self):
+        data = encode((400, 300))
+
+        for transformation, expected in TestGeometry.CASES:
+            with self.subTest(transformation=transformation):
+                with Image.open(BytesIO(render(data, transformation))) as result:
+                    self.assertEqual(result.size, expected)
+                    self.assertEqual(result.format, 'PNG')
+
+    def test_keeps_format(self):
+        for image_format in ('JPEG', 'GIF', 'WEBP'):
+            with Image.open(BytesIO(render(encode((400, 300), image_format), FORMAT_AVATAR.dict()))) as result:
+                self.assertEqual((result.format, result.size), (image_format, (250, 250)))
+
+    def test_padding(self):
+        transformation = {'width': 200, 'height': 200, 'crop': ResizeMode.PAD, 'gravity': GravityMode.NORTH}
+
+        with Image.open(BytesIO(render(encode((400, 300)), transformation))) as result:
+            self.assertEqual(result.getpixel((100, 10)), (255, 0, 0, 255))
+            self.assertEqual(result.getpixel((100, 190))[3], 0)
+
+        with Image.open(BytesIO(render(encode((400, 300), 'JPEG'), transformation))) as result:
+            self.assertGreater(min(result.getpixel((100, 190))), 240)
+
+    def test_invalid_image(self):
+        with self.assertRaises(ValueError):
+            render(b'image', {'width': 100})
+
+
+class TestImageEngine(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.engine = ImageEngine(workers=1, max_queue=1)
+        self.addCleanup(self.engine.shutdown)
+
+    async def test_render(self):
+        transformation = CroppingOrResizingTransformation(width=100, height=100, crop=CropMode.THUMB)
+
+        result = await self.engine.render(encode((400, 300)), transformation)
+
+        with Image.open(BytesIO(result)) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (100, 100)))
+        self.assertEqual(self.engine.stats()['completed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
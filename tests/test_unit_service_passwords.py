@@ -0,0 +1,41 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from app.services.passwords import PasswordHasher
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.hasher = PasswordHasher(executor="thread", workers=1, max_queue=1)
+        self.addCleanup(self.hasher.shutdown)
+
+    async def test_hash_and_verify(self):
+        hashed_password = await self.hasher.hash("test_pwd")
+
+        self.assertNotEqual(hashed_password, "test_pwd")
+        self.assertTrue(await self.hasher.verify("test_pwd", hashed_password))
+        self.assertFalse(await self.hasher.verify("invalid", hashed_password))
+        self.assertEqual(self.hasher.stats()["completed"], 3)
+
+    async def test_rejects_when_saturated(self):
+        release = threading.Event()
+        blocked = [asyncio.ensure_future(self.hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as e:
+            await self.hasher.hash("test_pwd")
+
+        release.set()
+        await asyncio.gather(*blocked)
+
+        self.assertEqual(e.exception.status_code, 429)
+        self.assertEqual(self.hasher.stats()["rejected"], 1)
+        self.assertEqual(self.hasher.stats()["pending"], 0)
+        self.assertGreater(self.hasher.stats()["queue_wait_max_ms"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
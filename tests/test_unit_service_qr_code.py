@@ -0,0 +1,114 @@
+import unittest
+from io import BytesIO
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from PIL import Image
+from redis.exceptions import RedisError
+
+from app.services.qr_code import DEFAULT_QR_CODE, QRCodeCache, QRCodeFormat, QRCodeGenerator, create_qr_for_url
+
+URL = "https://res.cloudinary.com/demo/image/upload/c_fill,h_250,w_250/v1/media/image"
+
+
+class TestCreateQrForUrl(unittest.TestCase):
+    def test_png(self):
+        with Image.open(BytesIO(create_qr_for_url(URL, 1, 10, 5))) as image:
+            self.assertEqual(image.format, 'PNG')
+            # Fitted to the data: version 4 has 33 boxes, plus the border on both sides
+            self.assertEqual(image.size, ((33 + 10) * 10, (33 + 10) * 10))
+
+    def test_svg(self):
+        svg = create_qr_for_url(URL, 1, 10, 5, image_format=QRCodeFormat.SVG)
+
+        self.assertTrue(svg.startswith(b'<?xml'))
+        self.assertIn(b'<svg', svg)
+        self.assertIn(b'fill="red"', svg)
+
+    def test_media_type(self):
+        self.assertEqual(QRCodeFormat.PNG.media_type, 'image/png')
+        self.assertEqual(QRCodeFormat.SVG.media_type, 'image/svg+xml')
+
+
+class TestQRCodeCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.object(QRCodeCache, 'redis', new=AsyncMock())
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_digest(self):
+        digest = QRCodeCache.digest(URL, 1, 10, 5, True, QRCodeFormat.PNG)
+
+        self.assertEqual(digest, QRCodeCache.digest(URL, 1, 10, 5, True, QRCodeFormat('png')))
+        self.assertNotEqual(digest, QRCodeCache.digest(URL, 1, 10, 5, True, QRCodeFormat.SVG))
+        self.assertNotEqual(digest, QRCodeCache.digest(URL, 1, 10, 4, True, QRCodeFormat.PNG))
+        self.assertNotEqual(digest, QRCodeCache.digest(URL + "x", 1, 10, 5, True, QRCodeFormat.PNG))
+
+    async def test_redis_failure_is_a_miss(self):
+        self.redis.get.side_effect = RedisError("Connection refused")
+        self.redis.set.side_effect = RedisError("Connection refused")
+
+        self.assertIsNone(await QRCodeCache.get("digest"))
+        await QRCodeCache.set("digest", b'image')
+
+
+class TestQRCodeGenerator(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.generator = QRCodeGenerator(workers=1, max_queue=0)
+        self.addCleanup(self.generator.shutdown)
+
+        self.cached = {}
+        for name, mock in (('get', AsyncMock(side_effect=lambda digest: self.cached.get(digest))),
+                           ('set', AsyncMock(side_effect=lambda digest, data: self.cached.update({digest: data})))):
+            patcher = patch.object(QRCodeCache, name, new=mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_get_caches_render(self):
+        first = await self.generator.get(URL, 1, 10, 5, True, QRCodeFormat.SVG)
+        second = await self.generator.get(URL, 1, 10, 5, True, QRCodeFormat.SVG)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.generator.stats()['completed'], 1)
+        self.assertEqual(list(self.cached.values()), [first])
+
+    async def test_get_many(self):
+        urls = [f"{URL}/{index}" for index in range(5)]
+        cached = await self.generator.get(urls[0], 1, 10, 5, True, QRCodeFormat.PNG)
+
+        with patch.object(QRCodeCache, 'get_many', new=AsyncMock(side_effect=lambda digests: [
+            self.cached.get(digest) for digest in digests
+        ])), patch.object(QRCodeCache, 'set_many', new=AsyncMock(side_effect=self.cached.update)) as set_many:
+            images = await self.generator.get_many(urls, 1, 10, 5, True, QRCodeFormat.PNG)
+
+        self.assertEqual(images[0], cached)
+        self.assertEqual(images, [create_qr_for_url(url, 1, 10, 5) for url in urls])
+        self.assertEqual(len(set_many.await_args.args[0]), 4)
+        self.assertEqual(self.generator.stats()['completed'], 2)
+
+    async def test_get_many_rejects_when_busy(self):
+        generator = QRCodeGenerator(workers=2, max_queue=0)
+        generator.pending = 1
+
+        with patch.object(QRCodeCache, 'get_many', new=AsyncMock(return_value=[None, None])), \
+                self.assertRaises(HTTPException):
+            await generator.get_many([URL, URL + "/1"], 1, 10, 5, True, QRCodeFormat.PNG)
+
+        self.assertEqual(generator.stats()['rejected'], 1)
+
+    async def test_precompute(self):
+        await self.generator.precompute(URL)
+
+        self.assertIn(QRCodeCache.digest(URL, **DEFAULT_QR_CODE), self.cached)
+
+    async def test_rejects_when_busy(self):
+        self.generator.pending = self.generator.max_pending
+
+        await self.generator.precompute(URL)
+
+        self.assertEqual(self.generator.stats()['rejected'], 1)
+        self.assertEqual(self.cached, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
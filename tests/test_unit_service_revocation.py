@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.services.revocation import BloomFilter, RevocationStore
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"jti-{i}" for i in range(1000)]
+
+        for item in items:
+            bloom.add(item)
+
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+
+        false_positives = sum(f"other-{i}" in bloom for i in range(10_000))
+
+        self.assertLess(false_positives / 10_000, 0.03)
+
+
+class TestRevocationStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        redis_patcher = patch.object(RevocationStore, 'redis', new_callable=AsyncMock)
+        self.redis = redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+
+    def test_token_id(self):
+        self.assertEqual(RevocationStore.token_id({"jti": "abc"}, "token"), "abc")
+        self.assertEqual(len(RevocationStore.token_id({}, "token")), 64)
+
+    async def test_revoke(self):
+        await RevocationStore.revoke("abc", 60)
+
+        self.redis.set.assert_awaited_once_with(RevocationStore.key("abc"), 1, ex=60)
+
+    async def test_revoke_expired_token(self):
+        await RevocationStore.revoke("abc", 0)
+
+        self.redis.set.assert_not_awaited()
+
+    async def test_is_revoked(self):
+        self.redis.exists.return_value = 1
+
+        self.assertTrue(await RevocationStore.is_revoked("abc"))
+        self.redis.exists.assert_awaited_once_with(RevocationStore.key("abc"))
+
+    async def test_is_revoked_skips_redis_with_bloom_filter(self):
+        bloom = BloomFilter(capacity=100, error_rate=0.01)
+        bloom.add("revoked")
+        self.redis.exists.return_value = 1
+
+        with patch.object(RevocationStore, 'bloom', bloom), patch.object(RevocationStore, 'bloom_ready', True):
+            self.assertFalse(await RevocationStore.is_revoked("abc"))
+            self.redis.exists.assert_not_awaited()
+
+            self.assertTrue(await RevocationStore.is_revoked("revoked"))
+
+
+if __name__ == '__main__':
+    unittest.main()
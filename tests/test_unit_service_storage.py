@@ -0,0 +1,154 @@
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+
+from urllib.parse import parse_qs, urlsplit
+
+from app.services.cloudinary import FORMAT_AVATAR, CropMode, formatting_image_url, transformation_string
+from app.services.derivatives import DerivativeCache
+from app.services.imaging import image_engine
+from app.services.storage import CloudinaryStorage, ContentStore, LocalStorage
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+
+
+class TestContentStore(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        self.store = ContentStore(self.root)
+
+    def test_put_get(self):
+        key = self.store.put(PNG)
+
+        self.assertRegex(key, r'^[0-9a-f]{64}\.png$')
+        self.assertEqual(self.store.path(key), self.root / key[:2] / key[2:4] / key)
+        self.assertEqual(self.store.get(key), PNG)
+        self.assertEqual(self.store.put(PNG), key)
+        self.assertEqual([path.name for path in self.root.rglob('*') if path.is_file()], [key])
+
+    def test_unknown_format(self):
+        self.assertNotIn('.', self.store.put(b'data'))
+
+    def test_invalid_key(self):
+        for key in ('../../etc/passwd', 'a' * 63, 'A' * 64, 'a' * 64 + '/x', 'a' * 64 + '.'):
+            with self.subTest(key=key), self.assertRaises(ValueError):
+                self.store.path(key)
+
+    def test_delete(self):
+        key = self.store.put(PNG)
+
+        self.assertTrue(self.store.delete(key))
+        self.assertFalse(self.store.exists(key))
+        self.assertFalse(self.store.delete(key))
+
+
+class TestLocalStorage(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.store = ContentStore(Path(root.name) / 'media')
+        self.cache = DerivativeCache(Path(root.name) / 'derivatives', max_bytes=1_000_000)
+        self.storage = LocalStorage(self.store, "http://localhost:8000/media/", self.cache, "signing_key")
+        self.addCleanup(image_engine.shutdown)
+
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300)).save(buffer, format='JPEG')
+        self.data = buffer.getvalue()
+
+    async def test_upload(self):
+        image = await self.storage.upload(BytesIO(self.data), "ignored")
+
+        self.assertTrue(image['public_id'].endswith('.jpg'))
+        self.assertEqual(image['url'], f"http://localhost:8000/media/{image['public_id']}")
+        self.assertEqual(self.store.get(image['public_id']), self.data)
+        self.assertEqual(self.storage.url(image['public_id']), image['url'])
+
+    async def test_transform(self):
+        key = self.store.put(self.data)
+
+        result = await self.storage.transform(key, FORMAT_AVATAR)
+
+        self.assertEqual(result['format'], FORMAT_AVATAR.dict())
+        url = urlsplit(result['url'])
+        self.assertEqual(url.path, f"/media/{key}")
+        query = {name: value for name, [value] in parse_qs(url.query).items()}
+        self.assertEqual(query, {'c': 'fill', 'h': '250', 'w': '250', 's': self.storage.sign(key, FORMAT_AVATAR)})
+
+        # Rendered ahead, the request for the url is a hit
+        path = await self.storage.derivative(key, {'crop': query['c'], 'height': int(query['h']),
+                                                   'width': int(query['w'])})
+        with Image.open(path) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (250, 250)))
+        self.assertEqual((self.cache.stats()['misses'], self.cache.stats()['hits']), (1, 1))
+
+        self.assertEqual(await self.storage.transform(key), {'url': self.storage.url(key), 'format': {}})
+
+    async def test_signature(self):
+        key = self.store.put(self.data)
+        signature = self.storage.sign(key, {'crop': CropMode.FILL, 'width': 100})
+
+        self.assertTrue(self.storage.verify(key, {'crop': 'fill', 'width': 100, 'height': None}, signature))
+        self.assertFalse(self.storage.verify(key, {'crop': 'fill', 'width': 200}, signature))
+        self.assertFalse(self.storage.verify(key, {'crop': 'fill', 'width': 100}, signature[:-1] + 'x'))
+
+    def test_transformation_string(self):
+        self.assertEqual(self.storage.transformation_string(FORMAT_AVATAR), "c_fill,h_250,w_250")
+        self.assertEqual(self.storage.transformation_string({'width': 100, 'crop': CropMode.FILL, 'gravity': None}),
+                         "c_fill,w_100")
+        self.assertEqual(self.storage.transformation_string(), "")
+
+    async def test_transform_missing_image(self):
+        with self.assertRaises(ValueError):
+            await self.storage.transform("0" * 64 + ".png", FORMAT_AVATAR)
+
+    async def test_delete(self):
+        key = self.store.put(self.data)
+        other = self.store.put(self.data + b'\x00')
+        await self.storage.transform(key, FORMAT_AVATAR)
+        await self.storage.transform(other, FORMAT_AVATAR)
+
+        self.assertTrue(await self.storage.delete(key))
+
+        self.assertFalse(self.store.exists(key))
+        self.assertTrue(self.store.exists(other))
+        self.assertEqual(self.cache.stats()['size'], 1)
+        self.assertFalse(await self.storage.delete(key))
+
+    async def test_restore_after_delete_of_same_content(self):
+        file = BytesIO(self.data)
+        key = (await self.storage.upload(file))['public_id']
+
+        # The only image with the same content is deleted before the new image is committed
+        await self.storage.delete(key)
+        await self.storage.restore(file, key)
+
+        self.assertEqual(self.store.get(key), self.data)
+
+    async def test_delete_not_stored_locally(self):
+        self.assertFalse(await self.storage.delete("media/image"))
+
+
+class TestCloudinaryStorage(unittest.IsolatedAsyncioTestCase):
+    async def test_urls(self):
+        storage = CloudinaryStorage()
+
+        self.assertEqual(storage.url("image", "1"), formatting_image_url("image", version="1")['url'])
+        self.assertEqual(await storage.transform("image", FORMAT_AVATAR), formatting_image_url("image", FORMAT_AVATAR))
+        self.assertEqual(storage.transformation_string(FORMAT_AVATAR), transformation_string(FORMAT_AVATAR))
+
+    async def test_upload(self):
+        with patch('app.services.cloudinary.upload_image', return_value={'public_id': 'image'}) as upload_image:
+            self.assertEqual(await CloudinaryStorage().upload(BytesIO(b'image')),
+                             {'public_id': 'image'})
+
+        upload_image.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
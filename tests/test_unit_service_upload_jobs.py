@@ -0,0 +1,230 @@
+import asyncio
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import cloudinary.exceptions
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Image
+from app.schemas.image import UploadJobStatus
+from app.services.storage import storage
+from app.services.upload_jobs import UploadJobQueue, UploadWorker, stage_file
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+
+
+class FakeUploader:
+    """
+    Stands in for cloudinary.send_image: fails with the given errors first, then returns a public_id per file
+    """
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, file) -> dict:
+        self.calls += 1
+        assert file.read() == PNG
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'url': 'url', 'public_id': f'media/{self.calls}', 'version': '1'}
+
+
+class TestStageFile(unittest.TestCase):
+    def test_stage_file(self):
+        with tempfile.TemporaryDirectory() as staging_dir:
+            path = stage_file(BytesIO(PNG), Path(staging_dir) / 'staging')
+
+            self.assertEqual(path.read_bytes(), PNG)
+            self.assertEqual(list(path.parent.iterdir()), [path])
+
+
+class TestUploadJobQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.object(UploadJobQueue, 'redis', new=AsyncMock())
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pipe = MagicMock(execute=AsyncMock())
+        self.pipe.__aenter__.return_value = self.pipe
+        self.redis.pipeline = MagicMock(return_value=self.pipe)
+
+    async def test_get(self):
+        self.redis.hgetall.return_value = {
+            b'id': b'job', b'status': b'done', b'user_id': b'1', b'description': b'Image description',
+            b'tags': b'["tag1"]', b'path': b'staging/job', b'image_id': b'7',
+        }
+
+        job = await UploadJobQueue.get('job')
+
+        self.redis.hgetall.assert_awaited_once_with('upload-job:job')
+        self.assertEqual(job['status'], UploadJobStatus.done)
+        self.assertEqual((job['user_id'], job['tags'], job['image_id']), (1, ['tag1'], 7))
+
+    async def test_get_expired(self):
+        self.redis.hgetall.return_value = {}
+
+        self.assertIsNone(await UploadJobQueue.get('job'))
+
+    async def test_take(self):
+        self.redis.blmove.return_value = b'job1'
+        self.pipe.execute.return_value = [b'job2', b'job3'] + [None] * 7
+
+        self.assertEqual(await UploadJobQueue.take('worker', 10), ['job1', 'job2', 'job3'])
+        self.redis.blmove.assert_awaited_once_with(UploadJobQueue.QUEUE, 'upload-jobs:processing:worker', 1.0,
+                                                   'RIGHT', 'LEFT')
+        self.assertEqual(self.pipe.lmove.call_count, 9)
+        self.pipe.lmove.assert_called_with(UploadJobQueue.QUEUE, 'upload-jobs:processing:worker', 'RIGHT', 'LEFT')
+
+    async def test_take_empty(self):
+        self.redis.blmove.return_value = None
+
+        self.assertEqual(await UploadJobQueue.take('worker', 10), [])
+        self.redis.pipeline.assert_not_called()
+
+    async def test_ack(self):
+        await UploadJobQueue.ack('worker', ['job1', 'job2'])
+
+        self.assertEqual(self.pipe.lrem.call_args_list, [call('upload-jobs:processing:worker', 1, 'job1'),
+                                                         call('upload-jobs:processing:worker', 1, 'job2')])
+        self.pipe.execute.assert_awaited_once()
+
+    async def test_requeue(self):
+        self.redis.lmove.side_effect = [b'job2', b'job1', None]
+
+        self.assertEqual(await UploadJobQueue.requeue('worker'), 2)
+        self.redis.lmove.assert_awaited_with('upload-jobs:processing:worker', UploadJobQueue.QUEUE, 'LEFT', 'RIGHT')
+
+    async def test_report(self):
+        self.redis.hgetall.return_value = {b'worker': b'{"completed": 3}'}
+
+        await UploadJobQueue.report('worker', {'completed': 3})
+
+        self.assertEqual(self.redis.hset.await_args.args[:2], ('upload-jobs:workers', 'worker'))
+        self.assertEqual(await UploadJobQueue.workers(), {'worker': {'completed': 3}})
+
+
+class TestUploadWorker(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        staging_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(staging_dir.cleanup)
+        self.jobs = [
+            {'id': f'job{i}', 'user_id': 1, 'description': 'Image description', 'tags': ['tag1'],
+             'path': str(stage_file(BytesIO(PNG), Path(staging_dir.name)))}
+            for i in range(3)
+        ]
+
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.__aenter__.return_value = self.session
+
+        patcher = patch.object(UploadJobQueue, 'update', new=AsyncMock())
+        self.update = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch('app.repository.images.create_image', new=AsyncMock(
+            side_effect=lambda user_id, description, tags, public_id, db, commit=True:
+            Image(id=int(public_id.rsplit('/', 1)[1]), public_id=public_id)
+        ))
+        self.create_image = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(storage, 'restore', new=AsyncMock())
+        self.restore = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def worker(self, uploader: FakeUploader) -> UploadWorker:
+        worker = UploadWorker(uploader=uploader, session_factory=lambda: self.session, retries=2, retry_delay=0,
+                              worker_id='worker')
+        self.addCleanup(worker.executor.shutdown)
+        return worker
+
+    def statuses(self) -> dict:
+        return {call.args[0]: (call.args[1], call.kwargs) for call in self.update.await_args_list}
+
+    async def test_batch(self):
+        uploader = FakeUploader()
+        worker = self.worker(uploader)
+
+        await worker.process(self.jobs)
+
+        self.assertEqual(uploader.calls, 3)
+        self.assertEqual(worker.executor.stats()['completed'], 3)
+        self.assertEqual(self.create_image.await_count, 3)
+        self.assertTrue(all(call.kwargs == {'commit': False} for call in self.create_image.await_args_list))
+        # Files removed by the delete of an image with the same content are stored again before the commit
+        self.assertEqual(sorted(call.args[1] for call in self.restore.await_args_list),
+                         ['media/1', 'media/2', 'media/3'])
+        self.session.commit.assert_awaited_once()
+        self.assertEqual({job_id: status for job_id, (status, _) in self.statuses().items()},
+                         dict.fromkeys(['job0', 'job1', 'job2'], UploadJobStatus.done))
+        self.assertEqual(sorted(fields['image_id'] for _, fields in self.statuses().values()), [1, 2, 3])
+        self.assertFalse(any(Path(job['path']).exists() for job in self.jobs))
+
+    async def test_retries_transient_errors(self):
+        uploader = FakeUploader(cloudinary.exceptions.GeneralError("Server error"),
+                                cloudinary.exceptions.Error("Socket error"))
+
+        await self.worker(uploader).process(self.jobs[:1])
+
+        self.assertEqual(uploader.calls, 3)
+        self.assertEqual(self.statuses()['job0'], (UploadJobStatus.done, {'image_id': 3}))
+
+    async def test_gives_up_after_retries(self):
+        uploader = FakeUploader(*[cloudinary.exceptions.RateLimited("Rate limited")] * 3)
+
+        await self.worker(uploader).process(self.jobs[:1])
+
+        self.assertEqual(uploader.calls, 3)
+        self.assertEqual(self.statuses()['job0'], (UploadJobStatus.failed, {'detail': "Upload failed, try again later"}))
+        self.create_image.assert_not_called()
+
+    async def test_permanent_error(self):
+        uploader = FakeUploader(cloudinary.exceptions.BadRequest("Invalid image file"))
+
+        await self.worker(uploader).process(self.jobs[:2])
+
+        self.assertEqual(uploader.calls, 2)
+        self.assertEqual(sorted(status for status, _ in self.statuses().values()),
+                         [UploadJobStatus.done, UploadJobStatus.failed])
+        self.assertEqual(self.create_image.await_count, 1)
+
+    async def test_batch_falls_back_to_single_inserts(self):
+        self.session.commit.side_effect = [IntegrityError(None, None, None), None, None]
+
+        await self.worker(FakeUploader()).process(self.jobs[:2])
+
+        self.session.rollback.assert_awaited_once()
+        self.assertEqual(self.create_image.await_count, 4)
+        self.assertEqual(self.restore.await_count, 4)
+        self.assertEqual([status for status, _ in self.statuses().values()], [UploadJobStatus.done] * 2)
+
+    async def test_run(self):
+        jobs = {
+            'job0': {**self.jobs[0], 'status': 'queued'},
+            'job1': {**self.jobs[1], 'status': 'done'},
+        }
+
+        requeue, ack, report = AsyncMock(return_value=1), AsyncMock(), AsyncMock()
+        take = AsyncMock(side_effect=[['job0', 'job1', 'job2'], asyncio.CancelledError()])
+        worker = self.worker(FakeUploader())
+
+        with patch.multiple(UploadJobQueue, requeue=requeue, take=take, get=AsyncMock(side_effect=jobs.get), ack=ack,
+                            report=report):
+            with self.assertRaises(asyncio.CancelledError):
+                await worker.run()
+
+        # A job finished before a restart and an expired job are acknowledged without being processed again
+        requeue.assert_awaited_once_with('worker')
+        self.assertEqual(list(self.statuses()), ['job0'])
+        self.assertEqual(self.create_image.await_count, 1)
+        ack.assert_awaited_once_with('worker', ['job0', 'job1', 'job2'])
+        self.assertEqual(report.await_args.args, ('worker', worker.executor.stats()))
+        self.assertEqual(report.await_args.args[1]['completed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
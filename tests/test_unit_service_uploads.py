@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import unittest
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from unittest.mock import patch
+
+from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.testclient import TestClient
+
+from app.services.uploads import ImageUploader, UploadSizeLimit, sniff_image_type, validate_image
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 24
+
+
+class TestSniffImageType(unittest.TestCase):
+    def test_images(self):
+        self.assertEqual(sniff_image_type(PNG), 'image/png')
+        self.assertEqual(sniff_image_type(b'\xff\xd8\xff\xe0\x00\x10JFIF'), 'image/jpeg')
+        self.assertEqual(sniff_image_type(b'GIF89a\x01\x00'), 'image/gif')
+        self.assertEqual(sniff_image_type(b'RIFF\x24\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(sniff_image_type(b'\x00\x00\x00\x1cftypavif'), 'image/avif')
+
+    def test_not_images(self):
+        self.assertIsNone(sniff_image_type(b'image'))
+        self.assertIsNone(sniff_image_type(b'%PDF-1.7'))
+        self.assertIsNone(sniff_image_type(b'RIFF\x24\x00\x00\x00WAVEfmt '))
+        self.assertIsNone(sniff_image_type(b''))
+
+
+class TestValidateImage(unittest.IsolatedAsyncioTestCase):
+    @staticmethod
+    def upload_file(data: bytes, size: bool = True) -> UploadFile:
+        file = SpooledTemporaryFile()
+        file.write(data)
+        file.seek(0)
+        return UploadFile(file, size=len(data) if size else None)
+
+    async def test_valid(self):
+        file = self.upload_file(PNG)
+
+        self.assertEqual(await validate_image(file, max_size=100), 'image/png')
+        self.assertEqual(file.file.tell(), 0)
+
+    async def test_too_large(self):
+        for size in (True, False):
+            with self.assertRaises(HTTPException) as e:
+                await validate_image(self.upload_file(PNG + b'\x00' * 100, size=size), max_size=100)
+
+            self.assertEqual(e.exception.status_code, 413)
+
+    async def test_not_image(self):
+        with self.assertRaises(HTTPException) as e:
+            await validate_image(self.upload_file(b'image'), max_size=100)
+
+        self.assertEqual(e.exception.status_code, 422)
+        self.assertEqual(e.exception.detail, "Invalid image file")
+
+
+class TestUploadSizeLimit(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(UploadSizeLimit, max_body_size=1024)
+
+        @app.post("/upload")
+        async def upload(file: UploadFile = File()):
+            return {"size": len(await file.read())}
+
+        self.client = TestClient(app)
+
+    def test_small_body(self):
+        response = self.client.post("/upload", files={"file": ("test.png", PNG, "image/png")})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"size": len(PNG)})
+
+    def test_content_length_too_large(self):
+        response = self.client.post("/upload", files={"file": ("test.png", PNG * 100, "image/png")})
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {"detail": "File is too large"})
+
+    def test_streamed_body_too_large(self):
+        def chunks():
+            yield b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="test.png"\r\n\r\n'
+            for _ in range(10):
+                yield PNG * 10
+
+        response = self.client.post("/upload", content=chunks(),
+                                    headers={"Content-Type": "multipart/form-data; boundary=boundary"})
+
+        self.assertEqual(response.status_code, 413)
+
+
+class TestImageUploader(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.uploader = ImageUploader(workers=1, max_queue=1)
+        self.addCleanup(self.uploader.shutdown)
+
+    async def test_upload(self):
+        result = {'url': 'url', 'public_id': 'public_id', 'version': '1'}
+        threads = []
+
+        def upload_image(*args):
+            threads.append(threading.current_thread().name)
+            return result
+
+        with patch('app.services.cloudinary.upload_image', side_effect=upload_image) as mock_upload_image:
+            file = BytesIO(PNG)
+            self.assertEqual(await self.uploader.upload(file, 'public_id'), result)
+
+        mock_upload_image.assert_called_once_with(file, 'public_id')
+        self.assertTrue(threads[0].startswith('image-upload'))
+        self.assertEqual(self.uploader.stats()['completed'], 1)
+
+    async def test_rejects_when_saturated(self):
+        release = threading.Event()
+
+        with patch('app.services.cloudinary.upload_image', side_effect=lambda *args: release.wait()):
+            blocked = [asyncio.ensure_future(self.uploader.upload(BytesIO(PNG))) for _ in range(2)]
+            await asyncio.sleep(0)
+
+            with self.assertRaises(HTTPException) as e:
+                await self.uploader.upload(BytesIO(PNG))
+
+            release.set()
+            await asyncio.gather(*blocked)
+
+        self.assertEqual(e.exception.status_code, 429)
+        self.assertEqual(self.uploader.stats()['rejected'], 1)
+        self.assertEqual(self.uploader.stats()['pending'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.database.models import Tag
+from app.utils.pagination import Cursor, decode_cursor, encode_cursor, get_cursor, next_cursor, paginate
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        created_at = datetime(2023, 4, 10, 18, 17, 49, 346865)
+
+        cursor = encode_cursor(created_at, 42)
+
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), Cursor(created_at, 42))
+
+    def test_invalid_cursor(self):
+        for cursor in ("", "not a cursor", encode_cursor(datetime.now(), 1)[:-3]):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+        with self.assertRaises(HTTPException) as e:
+            get_cursor("not a cursor")
+        self.assertEqual(e.exception.status_code, 400)
+
+    def test_next_cursor(self):
+        tags = [Tag(id=1, created_at=datetime(2023, 1, 1)), Tag(id=2, created_at=datetime(2023, 1, 2))]
+
+        self.assertIsNone(next_cursor(tags, limit=3))
+        self.assertIsNone(next_cursor([], limit=3))
+        self.assertEqual(decode_cursor(next_cursor(tags, limit=2)), Cursor(datetime(2023, 1, 2), 2))
+
+
+class TestPaginate(unittest.TestCase):
+    @staticmethod
+    def compile(statement) -> str:
+        return str(statement.compile(dialect=postgresql.dialect()))
+
+    def test_offset(self):
+        query = self.compile(paginate(select(Tag), Tag, skip=20, limit=10))
+
+        self.assertIn("ORDER BY tags.created_at, tags.id", query)
+        self.assertIn("OFFSET", query)
+        self.assertNotIn("WHERE", query)
+
+    def test_keyset(self):
+        cursor = Cursor(datetime(2023, 1, 2), 2)
+
+        query = self.compile(paginate(select(Tag), Tag, skip=20, limit=10, cursor=cursor))
+
+        self.assertIn("WHERE (tags.created_at, tags.id) > (", query)
+        self.assertIn("ORDER BY tags.created_at, tags.id", query)
+        self.assertNotIn("OFFSET", query)
+
+
+if __name__ == '__main__':
+    unittest.main()
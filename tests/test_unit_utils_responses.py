@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from io import BytesIO
+
+from app.utils.responses import ZeroCopyFileResponse, etag_matches, zip_chunks
+
+
+class TestEtagMatches(unittest.TestCase):
+    def test_etag_matches(self):
+        cases = (
+            ('"abc"', True),
+            ('W/"abc"', True),
+            ('"other", W/"abc"', True),
+            ('"other",W/"abc"', True),
+            ('*', True),
+            ('"other"', False),
+            ('abc', False),
+            ('', False),
+            (None, False),
+        )
+        for if_none_match, expected in cases:
+            with self.subTest(if_none_match=if_none_match):
+                self.assertIs(etag_matches(if_none_match, '"abc"'), expected)
+
+        self.assertTrue(etag_matches('"abc"', 'W/"abc"'))
+
+
+class TestZeroCopyFileResponse(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, b'x' * 100_000)
+        os.close(fd)
+        self.addCleanup(os.unlink, self.path)
+
+    async def call(self, extensions: dict) -> list[dict]:
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        response = ZeroCopyFileResponse(self.path, stat_result=os.stat(self.path), media_type="image/png")
+        await response({'type': 'http', 'method': 'GET', 'extensions': extensions}, None, send)  # noqa
+
+        return messages
+
+    async def test_pathsend(self):
+        messages = await self.call({'http.response.pathsend': {}})
+
+        self.assertEqual([message['type'] for message in messages], ['http.response.start', 'http.response.pathsend'])
+        self.assertEqual(messages[1]['path'], self.path)
+
+    async def test_zerocopy(self):
+        messages = await self.call({'http.response.zerocopy': {}})
+
+        self.assertEqual(messages[1]['type'], 'http.response.zerocopy')
+        self.assertEqual(messages[1]['count'], 100_000)
+
+    async def test_chunks_without_extension(self):
+        messages = await self.call({})
+
+        self.assertEqual(messages[0]['type'], 'http.response.start')
+        self.assertEqual(b''.join(message['body'] for message in messages[1:]), b'x' * 100_000)
+
+
+
+class TestZipChunks(unittest.TestCase):
+    def test_archive(self):
+        files = [('image-1/format-1.svg', b'<svg/>' * 100), ('image-1/format-2.png', b'\x89PNG')]
+
+        chunks = list(zip_chunks(files, zipfile.ZIP_DEFLATED))
+
+        # One chunk per member and the central directory
+        self.assertEqual(len(chunks), 3)
+        with zipfile.ZipFile(BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual([(name, archive.read(name)) for name in archive.namelist()], files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+from pytest import mark, fixture
+from sqlalchemy import func, select
+
+from app.database.connect import AsyncSessionLocal
+from app.database.models import Image, Tag, User
+from app.schemas.image import UploadJobStatus
+from app.services.upload_jobs import UploadJobQueue, UploadWorker
+
+
+@fixture(scope="module")
+def upload_user() -> dict:
+    return {
+        "username": "upload_worker_user",
+        "email": "upload.worker@test.com",
+        "password": "test_pwd",
+        "first_name": "Upload",
+        "last_name": "Worker",
+    }
+
+
+@mark.asyncio
+class TestUploadWorkerSave:
+    async def test_batch_creates_new_tags(self, session, upload_user, mocker):
+        update = mocker.patch.object(UploadJobQueue, 'update', new=mocker.AsyncMock())
+        user = User(**upload_user)
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
+        uploaded = [
+            ({'id': 'job0', 'user_id': user.id, 'description': "First", 'tags': ["batch tag", "first tag"]},
+             {'public_id': 'batch/0'}),
+            ({'id': 'job1', 'user_id': user.id, 'description': "Second", 'tags': ["Batch Tag"]},
+             {'public_id': 'batch/1'}),
+        ]
+
+        await UploadWorker(session_factory=AsyncSessionLocal).save(uploaded)
+
+        statuses = {call.args[0]: (call.args[1], call.kwargs) for call in update.await_args_list}
+        assert [status for status, _ in statuses.values()] == [UploadJobStatus.done] * 2
+
+        session.expire_all()
+        images = (await session.scalars(
+            select(Image).filter(Image.public_id.in_(['batch/0', 'batch/1'])).order_by(Image.public_id)
+        )).all()
+        assert [image.id for image in images] == [statuses['job0'][1]['image_id'], statuses['job1'][1]['image_id']]
+        assert [sorted(tag.name for tag in image.tags) for image in images] == [["batch tag", "first tag"],
+                                                                              ["batch tag"]]
+        assert await session.scalar(select(func.count(Tag.id)).filter(Tag.name == "batch tag")) == 1